@@ -0,0 +1,250 @@
+"""Load-aware admission control for ansible-playbook runs."""
+
+import asyncio
+import logging
+import math
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROC = pathlib.Path("/proc")
+# ansible-playbook's own default when --forks is not given
+DEFAULT_FORKS = 5
+
+# Runs admitted by this process that have not finished yet. Admission checks
+# and reserves under the lock, so concurrent runs cannot all take the last
+# slot before any of them has started a controller.
+_reserved = 0
+_reserved_lock = threading.Lock()
+
+
+@dataclass
+class SystemLoad:
+    """Snapshot of the control node's load."""
+
+    load_per_cpu: float
+    # Fraction of memory available; None where /proc/meminfo is missing
+    mem_available: Optional[float]
+    active_runs: int
+
+
+def _mem_available() -> Optional[float]:
+    try:
+        text = (PROC / "meminfo").read_text(encoding="ascii")
+    except OSError:
+        return None
+    values = {}
+    for line in text.splitlines():
+        key, _, rest = line.partition(":")
+        values[key] = int(rest.split()[0]) if rest.split() else 0
+    if not values.get("MemTotal") or "MemAvailable" not in values:
+        return None
+    return values["MemAvailable"] / values["MemTotal"]
+
+
+def _parent(pid: int) -> Optional[int]:
+    try:
+        with open(PROC / str(pid) / "stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    return int(stat[stat.rfind(b")") + 2 :].split()[1])
+
+
+def _descends_from(pid: int, ancestor: int) -> bool:
+    seen = set()
+    while pid > 1 and pid not in seen:
+        if pid == ancestor:
+            return True
+        seen.add(pid)
+        pid = _parent(pid) or 0
+    return False
+
+
+def active_runs(exclude_children_of: Optional[int] = None) -> int:
+    """
+    Count running ansible-playbook controllers on this host.
+
+    Worker processes forked by a controller share its command line, so only
+    processes whose parent is not itself ansible-playbook are counted.
+
+    Args:
+        exclude_children_of: Don't count controllers started (directly or
+            through a wrapper) by this process.
+
+    Returns:
+        int: Number of controllers (0 where /proc is unavailable).
+    """
+    if not PROC.is_dir():
+        return 0
+    parents = {}
+    for entry in os.scandir(PROC):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(os.path.join(entry.path, "cmdline"), "rb") as f:
+                argv = f.read().split(b"\0")[:2]
+            if not any(arg.endswith(b"ansible-playbook") for arg in argv):
+                continue
+            with open(os.path.join(entry.path, "stat"), "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue  # exited while scanning
+        parents[int(entry.name)] = int(stat[stat.rfind(b")") + 2 :].split()[1])
+    return sum(
+        1
+        for ppid in parents.values()
+        if ppid not in parents
+        and not (exclude_children_of and _descends_from(ppid, exclude_children_of))
+    )
+
+
+def system_load() -> SystemLoad:
+    """
+    Return the current load, memory pressure and number of active runs.
+
+    Runs of this process are counted through their reservations rather than
+    their controllers, which only show up some time after admission.
+    """
+    try:
+        load = os.getloadavg()[0]
+    except OSError:
+        load = 0.0
+    return SystemLoad(
+        load_per_cpu=load / (os.cpu_count() or 1),
+        mem_available=_mem_available(),
+        active_runs=active_runs(exclude_children_of=os.getpid()),
+    )
+
+
+def release() -> None:
+    """Give back the slot reserved by `admit` once the run has finished."""
+    global _reserved  # pylint: disable=global-statement
+    with _reserved_lock:
+        _reserved = max(0, _reserved - 1)
+
+
+def _reserve(load: SystemLoad, settings: dict, force: bool = False) -> Optional[float]:
+    """Reserve a slot unless the pressure, counting reservations, is too high."""
+    global _reserved  # pylint: disable=global-statement
+    with _reserved_lock:
+        load = replace(load, active_runs=load.active_runs + _reserved)
+        level = pressure(load, settings)
+        if level >= 1 and not force:
+            return None
+        _reserved += 1
+        return level
+
+
+def pressure(load: SystemLoad, settings: dict) -> float:
+    """
+    Express the load relative to the configured thresholds.
+
+    Args:
+        load: Current system load.
+        settings: `admission` config section.
+
+    Returns:
+        float: 0 when idle, 1.0 or more once any threshold is reached.
+    """
+    levels = [0.0]
+    max_load = settings.get("max_load_per_cpu", 0)
+    if max_load:
+        levels.append(load.load_per_cpu / max_load)
+    min_mem = settings.get("min_mem_available", 0)
+    if min_mem and load.mem_available is not None:
+        levels.append(min_mem / max(load.mem_available, 1e-6))
+    max_runs = settings.get("max_active_runs", 0)
+    if max_runs:
+        # Pressure reaches 1.0 when starting this run would exceed the limit
+        levels.append((load.active_runs + 1) / (max_runs + 1))
+    return max(levels)
+
+
+def scaled_forks(forks: Optional[int], level: float, settings: dict) -> Optional[int]:
+    """
+    Scale forks down as pressure rises above half of the thresholds.
+
+    Args:
+        forks: Requested forks (None for ansible-playbook's default).
+        level: Pressure as returned by `pressure`.
+        settings: `admission` config section.
+
+    Returns:
+        Optional[int]: Forks to pass; unchanged while pressure is low.
+    """
+    if level <= 0.5:
+        return forks
+    min_forks = max(1, settings.get("min_forks", 1))
+    factor = max(0.0, 2 * (1 - level))
+    return max(min_forks, math.ceil((forks or DEFAULT_FORKS) * factor))
+
+
+async def admit(settings: dict, forks: Optional[int]) -> Optional[int]:
+    """
+    Wait until the control node has capacity for a run and size its forks.
+
+    The start is delayed while any threshold is exceeded, for at most
+    `max_wait` seconds; after that the run starts anyway with `min_forks`.
+    A slot is reserved before returning, and must be given back with
+    `release` when the run finishes.
+
+    Args:
+        settings: `admission` config section.
+        forks: Requested forks (None for ansible-playbook's default).
+
+    Returns:
+        Optional[int]: Forks to run with.
+    """
+    max_wait = settings.get("max_wait", 300)
+    interval = settings.get("poll_interval", 5.0)
+    deadline = time.monotonic() + max_wait
+    loop = asyncio.get_running_loop()
+    waited = False
+
+    while True:
+        # Scanning /proc is file I/O; keep it off the event loop
+        load = await loop.run_in_executor(None, system_load)
+        level = _reserve(load, settings)
+        if level is not None:
+            admitted = scaled_forks(forks, level, settings)
+            if admitted != forks:
+                logger.info(
+                    "Control node under load (pressure %.2f), forks %s -> %d",
+                    level,
+                    forks or DEFAULT_FORKS,
+                    admitted,
+                )
+            elif waited:
+                logger.info("Control node load dropped, starting run")
+            return admitted
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            _reserve(load, settings, force=True)
+            min_forks = max(1, settings.get("min_forks", 1))
+            logger.warning(
+                "Control node still saturated after %ds, starting with %d forks",
+                max_wait,
+                min_forks,
+            )
+            return min_forks
+
+        if not waited:
+            logger.info(
+                "Delaying run: load %.2f/cpu, %s memory available, %d active runs",
+                load.load_per_cpu,
+                (
+                    "unknown"
+                    if load.mem_available is None
+                    else f"{load.mem_available:.0%}"
+                ),
+                load.active_runs + _reserved,
+            )
+            waited = True
+        await asyncio.sleep(min(interval, remaining))
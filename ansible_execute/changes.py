@@ -0,0 +1,235 @@
+"""Change-targeted runs: only the tags of roles changed since the last success."""
+
+import hashlib
+import json
+import logging
+import pathlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ansible_execute import inventory, playbooks, utils
+
+logger = logging.getLogger(__name__)
+
+# Role subdirectories whose content only affects the role's own tasks. Role
+# vars, defaults and modules are visible to the rest of the play, so changes
+# to them cannot be narrowed to the role.
+ROLE_SCOPED_DIRS = ("tasks", "handlers", "templates", "files", "meta")
+
+
+@dataclass
+class ChangePlan:
+    """What a change-targeted run has to do."""
+
+    # State of the dependencies to record once the run has succeeded
+    snapshot: dict
+    # Files added, modified or removed since the last successful run
+    changed: List[str] = field(default_factory=list)
+    # Tags to run; None runs the whole playbook
+    tags: Optional[List[str]] = None
+    # Why the whole playbook has to run
+    reason: Optional[str] = None
+
+    @property
+    def up_to_date(self) -> bool:
+        """Whether nothing changed since the last successful run."""
+        return self.reason is None and not self.changed
+
+
+def snapshot_path(settings: dict, env: str, playbook: str) -> pathlib.Path:
+    """
+    Return where the snapshot of the last successful run is kept.
+
+    Args:
+        settings: Resolved config for the environment.
+        env: Environment name.
+        playbook: Playbook name.
+
+    Returns:
+        pathlib.Path: Snapshot file.
+    """
+    return utils.state_dir(settings) / "snapshots" / f"{env}-{playbook}.json"
+
+
+def _file_hashes(files) -> Dict[str, str]:
+    hashes = {}
+    for path in sorted(set(files)):
+        try:
+            hashes[str(path)] = hashlib.sha256(path.read_bytes()).hexdigest()
+        except OSError:
+            continue
+    return hashes
+
+
+def take_snapshot(
+    playbook: str,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    scanner: Optional[playbooks.DependencyScanner] = None,
+    hosts: Optional[List[str]] = None,
+    inventory_fingerprint: Optional[str] = None,
+) -> dict:
+    """
+    Hash every file a playbook depends on.
+
+    Args:
+        playbook: Playbook name.
+        extra_vars_file: Extra-vars bundle of the run (content-addressed).
+        scanner: Scanner to use, for callers that inspect its roles afterwards.
+        hosts: Hosts of the environment, if known.
+        inventory_fingerprint: `inventory.fingerprint` of the inventory sources.
+
+    Returns:
+        dict: Snapshot to pass to `save_snapshot`.
+    """
+    files, exact = playbooks.dependencies(playbook, scanner)
+    return {
+        "playbook": playbook,
+        "exact": exact,
+        "extra_vars": extra_vars_file.name if extra_vars_file else None,
+        "hosts": sorted(hosts) if hosts is not None else None,
+        "inventory": inventory_fingerprint,
+        "files": _file_hashes(files),
+    }
+
+
+def load_snapshot(path: pathlib.Path) -> Optional[dict]:
+    """
+    Load a snapshot written by `save_snapshot`.
+
+    Args:
+        path: Snapshot file.
+
+    Returns:
+        Optional[dict]: Snapshot, or None if missing or unreadable.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Ignoring unreadable snapshot at %s", path)
+        return None
+    return data if isinstance(data, dict) and "files" in data else None
+
+
+def save_snapshot(path: pathlib.Path, snapshot: dict) -> None:
+    """
+    Persist the snapshot of a successful run.
+
+    Args:
+        path: Snapshot file.
+        snapshot: Snapshot from `take_snapshot`, taken before the run started.
+    """
+    utils.write_json_atomic(path, snapshot)
+
+
+def changed_files(previous: Dict[str, str], current: Dict[str, str]) -> List[str]:
+    """
+    Compare the file hashes of two snapshots.
+
+    Args:
+        previous: File hashes of the last successful run.
+        current: File hashes now.
+
+    Returns:
+        List[str]: Files added, modified or removed, sorted.
+    """
+    return sorted(
+        path
+        for path in set(previous) | set(current)
+        if previous.get(path) != current.get(path)
+    )
+
+
+def _role_of(path: str, scanner: playbooks.DependencyScanner) -> Optional[str]:
+    """Return the role a changed file is scoped to, if any."""
+    for name, role_dir in scanner.role_dirs.items():
+        try:
+            parts = pathlib.Path(path).relative_to(role_dir).parts
+        except ValueError:
+            continue
+        return name if parts and parts[0] in ROLE_SCOPED_DIRS else None
+    return None
+
+
+def _tags_for(
+    changed: List[str], scanner: playbooks.DependencyScanner
+) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Map changed files to tags, or explain why they cannot be mapped."""
+    roles = set()
+    for path in changed:
+        role = _role_of(path, scanner)
+        if role is None:
+            return None, f"{path} is not scoped to a single role"
+        roles.add(role)
+
+    tags = set()
+    for role in sorted(roles):
+        # Applications tagged `never` do not run in a full run either
+        applied = [each for each in scanner.applied_tags(role) if "never" not in each]
+        if not applied or not all(applied):
+            return None, f"role {role} is applied without tags"
+        for each in applied:
+            tags.update(each)
+    return sorted(tags), None
+
+
+def plan(
+    env: str,
+    playbook: str,
+    settings: dict,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    hosts: Optional[List[str]] = None,
+) -> ChangePlan:
+    """
+    Work out what changed since the last successful run of `env`.
+
+    Changed files inside a role's tasks, handlers, templates, files or meta
+    are mapped to the tags the role is applied with (directly, or through a
+    role depending on it). Anything else makes the plan a full run: no
+    previous snapshot, changed extra-vars, changed inventory sources or
+    hosts, dependencies that cannot be resolved statically, changes to
+    playbooks, shared vars or role vars, or a changed role that runs
+    somewhere without tags.
+
+    Args:
+        env: Environment name.
+        playbook: Playbook name.
+        settings: Resolved config for the environment.
+        extra_vars_file: Extra-vars bundle of the run.
+        hosts: Hosts of the environment; None if unknown, which makes the
+            plan a full run unless the last run's hosts were unknown too.
+
+    Returns:
+        ChangePlan: Snapshot to record, changed files and tags to run.
+    """
+    scanner = playbooks.DependencyScanner()
+    current = take_snapshot(
+        playbook,
+        extra_vars_file,
+        scanner,
+        hosts=hosts,
+        inventory_fingerprint=inventory.fingerprint(
+            inventory.inventory_sources(settings)
+        ),
+    )
+    previous = load_snapshot(snapshot_path(settings, env, playbook))
+
+    if previous is None:
+        return ChangePlan(current, reason="no successful run recorded")
+    changed = changed_files(previous["files"], current["files"])
+    if previous.get("extra_vars") != current["extra_vars"]:
+        return ChangePlan(current, changed, reason="extra-vars changed")
+    if previous.get("hosts") != current["hosts"]:
+        return ChangePlan(current, changed, reason="hosts changed")
+    if previous.get("inventory") != current["inventory"]:
+        return ChangePlan(current, changed, reason="inventory changed")
+    if not changed:
+        return ChangePlan(current)
+    if not scanner.exact:
+        return ChangePlan(
+            current, changed, reason="dependencies cannot be resolved statically"
+        )
+
+    tags, reason = _tags_for(changed, scanner)
+    return ChangePlan(current, changed, tags=tags, reason=reason)
@@ -0,0 +1,198 @@
+"""Progress checkpoints of playbook runs, for resuming where a run failed."""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+import time
+from typing import List, Optional
+
+from ansible_execute import events, utils
+
+logger = logging.getLogger(__name__)
+
+
+def checkpoint_path(settings: dict, env: str, playbook: str) -> pathlib.Path:
+    """
+    Return where the checkpoint of a run is kept.
+
+    Args:
+        settings: Resolved config for the environment.
+        env: Environment name.
+        playbook: Playbook name.
+
+    Returns:
+        pathlib.Path: Checkpoint file.
+    """
+    return utils.state_dir(settings) / "checkpoints" / f"{env}-{playbook}.json"
+
+
+def fingerprint(snapshot: dict) -> str:
+    """
+    Identify the playbook content and variables a checkpoint applies to.
+
+    Args:
+        snapshot: Dependency snapshot from `changes.take_snapshot`.
+
+    Returns:
+        str: Hash of the dependency files and the extra-vars bundle.
+    """
+    canonical = json.dumps(
+        {"files": snapshot["files"], "extra_vars": snapshot.get("extra_vars")},
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """Progress of a run, persisted as it advances and cleared on success."""
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        env: str,
+        playbook: str,
+        fingerprint: str,  # pylint: disable=redefined-outer-name
+        limit: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Initialize a checkpoint for a run that is about to start.
+
+        Args:
+            path: JSON file the checkpoint is persisted to.
+            env: Environment name.
+            playbook: Playbook name.
+            fingerprint: Value of `fingerprint` when the run started.
+            limit: Hosts the run is limited to, if any.
+            tags: Tags the run is limited to, if any.
+        """
+        self.path = path
+        self.env = env
+        self.playbook = playbook
+        self.fingerprint = fingerprint
+        self.limit = limit
+        self.tags = tags
+        self.last_completed: Optional[dict] = None
+        # Where a resumed run starts: a task name (None for the first task)
+        # and the hosts still to do (None for all hosts of the run)
+        self.start_at: Optional[str] = None
+        self.hosts: Optional[List[str]] = limit
+        self.updated_at = 0.0
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> Optional["Checkpoint"]:
+        """
+        Load a checkpoint written by `save`.
+
+        Args:
+            path: Checkpoint file.
+
+        Returns:
+            Optional[Checkpoint]: Checkpoint, or None if missing or unreadable.
+        """
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            checkpoint = cls(
+                path,
+                data["env"],
+                data["playbook"],
+                data["fingerprint"],
+                limit=data.get("limit"),
+                tags=data.get("tags"),
+            )
+            checkpoint.last_completed = data.get("last_completed")
+            checkpoint.start_at = data.get("start_at")
+            checkpoint.hosts = data.get("hosts")
+            checkpoint.updated_at = data.get("updated_at", 0.0)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.warning("Ignoring unreadable checkpoint at %s", path)
+            return None
+        return checkpoint
+
+    def update(
+        self,
+        tracker: events.ProgressTracker,
+        failed_hosts: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Record the progress of the run and where to resume it.
+
+        While the run is going (or when it ended without a recap), resuming
+        restarts all hosts of the run at the earliest of the task in progress
+        and the tasks hosts failed at. Once the recap lists the failed hosts,
+        only those restart, at the earliest task one of them failed at.
+
+        Args:
+            tracker: Progress of the run.
+            failed_hosts: Failed and unreachable hosts from the recap.
+        """
+        if tracker.last_completed:
+            self.last_completed = {
+                **dataclasses.asdict(tracker.last_completed),
+                "hosts": tracker.completed_hosts,
+            }
+
+        if failed_hosts is None:
+            self.hosts = self.limit
+            candidates = list(tracker.failures.values())
+            if tracker.current:
+                candidates.append(tracker.current)
+        else:
+            self.hosts = sorted(failed_hosts)
+            candidates = [tracker.failures.get(host) for host in self.hosts]
+        start = (
+            min(candidates, key=lambda task: task.index)
+            if candidates and all(candidates)
+            else None
+        )
+        # Facts and handlers cannot be started at; rerun the hosts in full
+        self.start_at = start.task if start and start.selectable else None
+        self.save()
+
+    def finish(self, result, tracker: events.ProgressTracker) -> None:
+        """
+        Clear the checkpoint of a successful run, or record where to resume.
+
+        Args:
+            result: `executor.PlaybookResult` of the run.
+            tracker: Progress of the run.
+        """
+        if result.ok:
+            self.clear()
+            return
+        # Without failed hosts in the recap, the run stopped before finishing
+        self.update(tracker, result.failed_hosts or None)
+        logger.info(
+            "Checkpoint saved: `ansible-execute -e %s -p %s resume` restarts %s%s",
+            self.env,
+            self.playbook,
+            f"{len(self.hosts)} hosts" if self.hosts is not None else "all hosts",
+            f" at task '{self.start_at}'" if self.start_at else "",
+        )
+
+    def save(self) -> None:
+        """Persist the checkpoint to disk."""
+        self.updated_at = time.time()
+        data = {
+            "env": self.env,
+            "playbook": self.playbook,
+            "fingerprint": self.fingerprint,
+            "limit": self.limit,
+            "tags": self.tags,
+            "last_completed": self.last_completed,
+            "start_at": self.start_at,
+            "hosts": self.hosts,
+            "updated_at": self.updated_at,
+        }
+        utils.write_json_atomic(self.path, data)
+
+    def clear(self) -> None:
+        """Remove the checkpoint."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
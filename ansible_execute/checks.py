@@ -0,0 +1,214 @@
+"""Cached syntax-check and task-list validation used by --test."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from ansible_execute import executor, extravars, inventory, playbooks, utils
+
+logger = logging.getLogger(__name__)
+
+CHECKS = {
+    "syntax": ["--syntax-check"],
+    "tasks": ["--list-tasks"],
+}
+
+
+@dataclass
+class CheckResult:
+    """Outcome of validating one playbook for one environment."""
+
+    env: str
+    playbook: str
+    ok: bool
+    cached: bool
+    duration: float
+    output: List[str] = field(default_factory=list)
+
+
+def cache_key(
+    env: str,
+    playbook: str,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    inventory_sources: Optional[List[str]] = None,
+) -> str:
+    """
+    Hash everything a check result depends on.
+
+    That is the environment, the content of the playbook's dependency tree,
+    the ansible-playbook binary in use, the extra-vars and the inventory.
+
+    Args:
+        env: Environment name.
+        playbook: Playbook name.
+        extra_vars_file: Content-addressed extra-vars bundle, if any.
+        inventory_sources: Inventory sources the checks read, if known.
+
+    Returns:
+        str: Hex digest used as the cache file name.
+    """
+    files, _ = playbooks.dependencies(playbook)
+    binary = shutil.which("ansible-playbook") or ""
+    try:
+        binary_stamp = str(os.stat(binary).st_mtime_ns) if binary else ""
+    except OSError:
+        binary_stamp = ""
+
+    parts = (
+        env,
+        playbook,
+        binary,
+        binary_stamp,
+        playbooks.content_hash(files),
+        # The bundle is named after the hash of its content
+        extra_vars_file.name if extra_vars_file else "",
+        inventory.fingerprint(inventory_sources) if inventory_sources else "",
+    )
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+async def check_playbook(
+    env: str,
+    playbook: str,
+    cache_dir: Optional[pathlib.Path],
+    verbosity: int = 0,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    inventory_sources: Optional[List[str]] = None,
+) -> CheckResult:
+    """
+    Run --syntax-check and --list-tasks for one playbook, or reuse a cached result.
+
+    Only passing results are cached. A failure may come from something the
+    cache key does not cover, such as a missing collection, so it is checked
+    again next time.
+
+    Args:
+        env: Environment name.
+        playbook: Playbook name.
+        cache_dir: Directory for cached results (None disables caching).
+        verbosity: Verbosity level from CLI.
+        extra_vars_file: Extra-vars bundle from `extravars`, passed to the checks.
+        inventory_sources: Inventory sources, so that edits invalidate the cache.
+
+    Returns:
+        CheckResult: Whether both checks passed, with their output.
+    """
+    started = time.monotonic()
+    cache_path = None
+    if cache_dir:
+        # Hashing the playbook tree is file I/O; keep it off the event loop
+        key = await asyncio.get_running_loop().run_in_executor(
+            None, cache_key, env, playbook, extra_vars_file, inventory_sources
+        )
+        cache_path = cache_dir / f"{key}.json"
+
+    if cache_path:
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+            return CheckResult(
+                env=env,
+                playbook=playbook,
+                ok=cached["ok"],
+                cached=True,
+                duration=time.monotonic() - started,
+                output=cached["output"],
+            )
+        except (OSError, ValueError, KeyError):
+            pass
+
+    lines: dict = {name: [] for name in CHECKS}
+    results = await asyncio.gather(
+        *(
+            executor.run_playbook(
+                env,
+                playbook,
+                verbosity=verbosity,
+                extra_args=extra_args,
+                extra_vars_file=extra_vars_file,
+                on_output=lines[name].append,
+                report_failures=False,
+            )
+            for name, extra_args in CHECKS.items()
+        )
+    )
+    ok = all(result.ok for result in results)
+    output = [f"[{name}] {line}" for name in CHECKS for line in lines[name]]
+
+    if cache_path and ok:
+        try:
+            utils.write_json_atomic(cache_path, {"ok": ok, "output": output})
+        except OSError as exc:
+            logger.debug("Could not write check cache %s: %s", cache_path, exc)
+
+    return CheckResult(
+        env=env,
+        playbook=playbook,
+        ok=ok,
+        cached=False,
+        duration=time.monotonic() - started,
+        output=output,
+    )
+
+
+async def run_checks(
+    targets: List[tuple],
+    cache_dir_for: Callable[[str], Optional[pathlib.Path]],
+    concurrency: int,
+    verbosity: int = 0,
+    settings_for: Optional[Callable[[str], dict]] = None,
+) -> List[CheckResult]:
+    """
+    Validate several (env, playbook) pairs in parallel.
+
+    Args:
+        targets: (env, playbook) pairs.
+        cache_dir_for: Returns the cache directory for an environment.
+        concurrency: Maximum number of pairs checked at once.
+        verbosity: Verbosity level from CLI.
+        settings_for: Returns the resolved config for an environment, used
+            for its extra-vars and inventory (None checks without either).
+
+    Returns:
+        List[CheckResult]: Results in the order of `targets`.
+
+    Raises:
+        ConfigError: If the extra-vars of an environment cannot be built.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # Built up front so that a broken extra-vars file fails before any check
+    env_inputs = {}
+    for env in dict.fromkeys(env for env, _ in targets):
+        if settings_for:
+            settings = settings_for(env)
+            env_inputs[env] = (
+                extravars.bundle(env, settings),
+                inventory.inventory_sources(settings),
+            )
+        else:
+            env_inputs[env] = (None, None)
+
+    async def _bounded(env: str, playbook: str) -> CheckResult:
+        vars_file, sources = env_inputs[env]
+        async with semaphore:
+            return await check_playbook(
+                env,
+                playbook,
+                cache_dir_for(env),
+                verbosity=verbosity,
+                extra_vars_file=vars_file,
+                inventory_sources=sources,
+            )
+
+    return list(
+        await asyncio.gather(*(_bounded(env, playbook) for env, playbook in targets))
+    )
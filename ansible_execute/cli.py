@@ -3,6 +3,33 @@
 import argparse
 import pathlib
 from argparse import Namespace
+from typing import Callable, Optional
+
+from ansible_execute import logquery
+
+
+class _Repeatable(argparse.Action):
+    """Store the first value in `dest` and every distinct value in `<dest>s`."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        collected = list(getattr(namespace, f"{self.dest}s", None) or [])
+        if not collected:
+            setattr(namespace, self.dest, values)
+        if values not in collected:
+            collected.append(values)
+        setattr(namespace, f"{self.dest}s", collected)
+
+
+def _time_bound(end: bool = False) -> Callable[[str], Optional[str]]:
+    """Return an argparse type normalising a --since/--until time."""
+
+    def _parse(value: str) -> Optional[str]:
+        try:
+            return logquery.parse_time(value, end=end)
+        except ValueError as exc:
+            raise argparse.ArgumentTypeError(str(exc)) from exc
+
+    return _parse
 
 
 def parse_args() -> Namespace:
@@ -11,7 +38,8 @@ def parse_args() -> Namespace:
 
     Returns:
         Namespace: Parsed arguments including environment, config, test mode,
-                   validation and generation options.
+                   validation and generation options, and the subcommand
+                   (`command`) with its options, if one was given.
     """
     parser = argparse.ArgumentParser(
         description="Ansible execution CLI for homelab environments"
@@ -30,21 +58,60 @@ def parse_args() -> Namespace:
         "--env",
         default="prod",
         choices=["dev", "staging", "prod"],
-        help="Target environment (default: prod)",
+        action=_Repeatable,
+        help="Target environment, repeatable (default: prod)",
     )
 
     parser.add_argument(
         "-p",
         "--playbook",
         default="master",
-        help="Playbook name to run (default: master)",
+        action=_Repeatable,
+        help="Playbook name to run, repeatable (default: master)",
     )
 
     parser.add_argument(
         "-t",
         "--test",
         action="store_true",
-        help="Run in test mode (does not execute Ansible commands)",
+        help="Run in test mode (syntax-check and list tasks, without executing)",
+    )
+
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Probe host reachability before running (also enabled via config)",
+    )
+
+    parser.add_argument(
+        "--rolling",
+        action="store_true",
+        help="Roll out in canary batches (resumes an interrupted rollout)",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="Split hosts across this many parallel controllers (overrides config)",
+    )
+
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Only run the tags of roles changed since the last successful run",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Re-run whenever files under the ansible tree change (Ctrl-C to stop)",
+    )
+
+    parser.add_argument(
+        "--refresh-inventory",
+        action="store_true",
+        help="Ignore the cached inventory and re-run ansible-inventory",
     )
 
     parser.add_argument(
@@ -75,4 +142,142 @@ def parse_args() -> Namespace:
         help="Validate the provided config file against the schema definition",
     )
 
-    return parser.parse_args()
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    logs = subparsers.add_parser(
+        "logs", help="Query or follow the JSON log files using a sidecar index"
+    )
+    logs.add_argument(
+        "--dir",
+        dest="log_dir",
+        type=pathlib.Path,
+        default=None,
+        help="Log directory (default: logging.dir from the config)",
+    )
+    logs.add_argument(
+        "--since",
+        type=_time_bound(),
+        default=None,
+        help="Only records at or after this time (YYYY-MM-DD[THH:MM:SS])",
+    )
+    logs.add_argument(
+        "--until",
+        # A bare date includes the whole day
+        type=_time_bound(end=True),
+        default=None,
+        help="Only records at or before this time (YYYY-MM-DD[THH:MM:SS])",
+    )
+    logs.add_argument(
+        "--level",
+        dest="log_level",
+        type=str.upper,
+        default=None,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="Only records at or above this level",
+    )
+    logs.add_argument(
+        "--env",
+        dest="log_env",
+        default=None,
+        help="Only records written for this environment",
+    )
+    logs.add_argument(
+        "--contains",
+        default=None,
+        help="Only records whose message contains this text",
+    )
+    logs.add_argument(
+        "-f",
+        "--follow",
+        action="store_true",
+        help="Keep printing new matching records as they are written",
+    )
+
+    resume = subparsers.add_parser(
+        "resume",
+        help="Resume the failed run of -e/-p from its last checkpoint",
+    )
+    resume.add_argument(
+        "--force",
+        action="store_true",
+        help="Resume even if the playbook or its vars changed since the checkpoint",
+    )
+
+    coordinator = subparsers.add_parser(
+        "coordinator",
+        help="Hand out the -e/-p runs to worker agents and merge their results",
+    )
+    coordinator.add_argument(
+        "--listen",
+        default=None,
+        help="Address to listen on, host:port, a port on 127.0.0.1 or unix:/path "
+        "(default: distributed.listen)",
+    )
+
+    agent = subparsers.add_parser(
+        "agent", help="Run jobs handed out by a coordinator until it is done"
+    )
+    agent.add_argument(
+        "--coordinator",
+        default=None,
+        help="Coordinator address (default: distributed.coordinator)",
+    )
+    agent.add_argument(
+        "--name",
+        dest="agent_name",
+        default=None,
+        help="Name reported to the coordinator (default: hostname-pid)",
+    )
+
+    load_test = subparsers.add_parser(
+        "load-test",
+        help="Drive concurrent runs against a simulated ansible-playbook "
+        "and report throughput, latency and memory",
+    )
+    load_test.add_argument(
+        "--runs", type=int, default=10, help="Simulated runs (default: 10)"
+    )
+    load_test.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Runs in flight at once (default: 10)",
+    )
+    load_test.add_argument(
+        "--hosts", type=int, default=100, help="Simulated hosts per run (default: 100)"
+    )
+    load_test.add_argument(
+        "--tasks", type=int, default=5, help="Tasks per run (default: 5)"
+    )
+    load_test.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds each batch of forks hosts takes per task (default: 0)",
+    )
+    load_test.add_argument(
+        "--fail-rate",
+        type=float,
+        default=0.0,
+        help="Chance a host fails a task (default: 0)",
+    )
+    load_test.add_argument(
+        "--unreachable-rate",
+        type=float,
+        default=0.0,
+        help="Chance a host is unreachable at a task (default: 0)",
+    )
+    load_test.add_argument(
+        "--output-bytes",
+        type=int,
+        default=0,
+        help="Result payload printed per host and task (default: 0)",
+    )
+    load_test.add_argument(
+        "--seed", type=int, default=0, help="Seed of the simulated outcomes"
+    )
+
+    args = parser.parse_args()
+    args.envs = getattr(args, "envs", None) or [args.env]
+    args.playbooks = getattr(args, "playbooks", None) or [args.playbook]
+    return args
@@ -0,0 +1,725 @@
+"""Distributed runs: a coordinator hands host shards to worker agents.
+
+Agents connect to the coordinator and pull one job at a time over a
+newline-delimited JSON protocol. A job is a chunk of the hosts of an
+(env, playbook) run, or the whole run. Chunks are sized from each agent's
+observed throughput, output is streamed back as it is produced, and the
+results of all chunks are merged into one run record per (env, playbook).
+
+Messages, agent to coordinator: `hello` (name, nonce, version), `auth`
+(proof), `ready`, `output` (job, line), `result` (job, result) and `error`
+(message). Coordinator to agent: `challenge` (nonce, proof), `welcome`
+(name), `job`, `done` and `error` (message).
+
+Both sides prove that they know the shared token without sending it: each
+sends an HMAC of both nonces, keyed with the token and labelled with its role,
+so neither a rogue agent nor a rogue coordinator gets any work done.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import os
+import pathlib
+import secrets
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ansible_execute import (
+    exceptions,
+    executor,
+    extravars,
+    playbooks,
+    sharding,
+    vector,
+)
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 2
+# Coordinators listen on the loopback interface unless told otherwise
+DEFAULT_LISTEN = "127.0.0.1:7700"
+# Messages carry whole lines of playbook output
+MESSAGE_LIMIT = 2 * executor.STREAM_LIMIT
+# Weight of the latest job in an agent's throughput estimate
+THROUGHPUT_ALPHA = 0.5
+
+
+@dataclass
+class Target:
+    """An (env, playbook) run to distribute."""
+
+    env: str
+    playbook: str
+    # Hosts to split into chunks; None hands out the run as a single job
+    hosts: Optional[List[str]]
+    extra_vars: dict = field(default_factory=dict)
+    # Content hash of the playbook's dependencies, checked by agents
+    fingerprint: str = ""
+
+
+@dataclass
+class Job:
+    """A chunk of a target handed to one agent."""
+
+    id: int
+    target: int
+    hosts: Optional[List[str]]
+    attempts: int = 0
+
+
+@dataclass
+class AgentStats:
+    """Work done by one agent and its observed throughput."""
+
+    name: str
+    jobs: int = 0
+    hosts: int = 0
+    busy: float = 0.0
+    # Hosts per second, smoothed over the agent's jobs
+    throughput: Optional[float] = None
+
+    def record(self, hosts: int, duration: float) -> None:
+        """Account for a finished job of `hosts` hosts."""
+        self.jobs += 1
+        self.hosts += hosts
+        self.busy += duration
+        rate = hosts / max(duration, 1e-3)
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput = (
+                THROUGHPUT_ALPHA * rate + (1 - THROUGHPUT_ALPHA) * self.throughput
+            )
+
+
+def tree_fingerprint(playbook: str) -> str:
+    """
+    Hash the files a playbook depends on, to detect agents with another tree.
+
+    Args:
+        playbook: Playbook name.
+
+    Returns:
+        str: Content hash of the playbook's dependencies.
+    """
+    files, _ = playbooks.dependencies(playbook)
+    return playbooks.content_hash(files)
+
+
+def chunk_size(
+    remaining: int,
+    throughput: Optional[float],
+    others: List[Optional[float]],
+    min_chunk: int = 1,
+    max_chunk: int = 0,
+) -> int:
+    """
+    Size the next chunk for an agent.
+
+    Each request takes half of the agent's throughput-weighted share of the
+    remaining hosts (guided self-scheduling), so faster agents get larger
+    chunks and chunks shrink towards the end of the run, where a slow agent
+    would otherwise hold everyone up. Agents without a measurement yet are
+    assumed to be as fast as the average measured agent.
+
+    Args:
+        remaining: Hosts not yet handed out.
+        throughput: The requesting agent's hosts per second, if measured.
+        others: Throughput of the other connected agents.
+        min_chunk: Smallest chunk to hand out.
+        max_chunk: Largest chunk to hand out (0 for no limit).
+
+    Returns:
+        int: Number of hosts for the next chunk.
+    """
+    known = [rate for rate in [throughput, *others] if rate]
+    default = sum(known) / len(known) if known else 1.0
+    own = throughput or default
+    total = own + sum(rate or default for rate in others)
+    # Rounded so float noise in the share cannot push the chunk up by one
+    size = max(math.ceil(round(remaining * own / total / 2, 6)), min_chunk, 1)
+    if max_chunk:
+        size = min(size, max_chunk)
+    return min(size, remaining)
+
+
+def _proof(token: str, role: str, agent_nonce: str, nonce: str) -> str:
+    """Return the HMAC by which `role` proves it knows the token."""
+    message = f"{role}:{agent_nonce}:{nonce}".encode("utf-8")
+    return hmac.new(token.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def _require_token(token: str) -> None:
+    if not token:
+        raise exceptions.DistributedError(
+            "[Distributed] A shared token is required (set distributed.token)"
+        )
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[dict]:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+    except ValueError as exc:
+        raise exceptions.DistributedError(
+            f"[Distributed] Malformed message: {exc}"
+        ) from exc
+    if not isinstance(message, dict):
+        raise exceptions.DistributedError("[Distributed] Malformed message")
+    return message
+
+
+async def _open(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    family, target = vector.parse_address(address)
+    if family == socket.AF_UNIX:
+        return await asyncio.open_unix_connection(target, limit=MESSAGE_LIMIT)
+    return await asyncio.open_connection(*target, limit=MESSAGE_LIMIT)
+
+
+class Coordinator:
+    """Hands out jobs to agents and merges their results per target."""
+
+    def __init__(
+        self,
+        targets: List[Target],
+        token: str,
+        min_chunk: int = 1,
+        max_chunk: int = 0,
+        max_attempts: int = 2,
+        job_options: Optional[dict] = None,
+        on_output: Optional[executor.OutputCallback] = None,
+    ) -> None:
+        """
+        Initialize the coordinator.
+
+        Args:
+            targets: Runs to distribute.
+            token: Shared secret agents must prove they know.
+            min_chunk: Smallest number of hosts per job.
+            max_chunk: Largest number of hosts per job (0 for no limit).
+            max_attempts: Times a job is handed out before its hosts are
+                given up on when agents keep disconnecting.
+            job_options: verbosity, forks and timeout of every job.
+            on_output: Called with every line of agent output, prefixed by
+                the agent name.
+
+        Raises:
+            DistributedError: If the token is empty or a target has no hosts.
+        """
+        _require_token(token)
+        for target in targets:
+            if target.hosts is not None and not target.hosts:
+                raise exceptions.DistributedError(
+                    f"[Distributed] No hosts to distribute for '{target.env}'"
+                )
+            target.fingerprint = target.fingerprint or tree_fingerprint(target.playbook)
+        self.targets = targets
+        self.token = token
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.max_attempts = max(1, max_attempts)
+        self.job_options = job_options or {}
+        self.on_output = on_output
+        self.agents: Dict[str, AgentStats] = {}
+        self.results: Dict[Tuple[str, str], executor.PlaybookResult] = {}
+        self.address: Optional[str] = None
+
+        # Target index -> hosts not yet handed out (None: the whole run)
+        self._pending: Dict[int, Optional[List[str]]] = {
+            index: list(target.hosts) if target.hosts is not None else None
+            for index, target in enumerate(targets)
+        }
+        self._retry: List[Job] = []
+        # Job id -> (agent, job, dispatch time)
+        self._in_flight: Dict[int, Tuple[str, Job, float]] = {}
+        self._parts: Dict[int, List[Tuple[str, executor.PlaybookResult]]] = {
+            index: [] for index in range(len(targets))
+        }
+        self._connected: Dict[str, asyncio.StreamWriter] = {}
+        self._ids = itertools.count(1)
+        self._changed: Optional[asyncio.Condition] = None
+        self._done: Optional[asyncio.Event] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set["asyncio.Task"] = set()
+
+    async def start(self, address: str = DEFAULT_LISTEN) -> str:
+        """
+        Start listening for agents.
+
+        Args:
+            address: `host:port` (port 0 picks a free port), a bare port on
+                the loopback interface, or `unix:/path`.
+
+        Returns:
+            str: Address agents can connect to.
+        """
+        self._changed = asyncio.Condition()
+        self._done = asyncio.Event()
+        if address.isdigit():
+            address = f"127.0.0.1:{address}"
+        family, target = vector.parse_address(address)
+        if family == socket.AF_UNIX:
+            self._server = await asyncio.start_unix_server(
+                self._handle, target, limit=MESSAGE_LIMIT
+            )
+            self.address = address
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, *target, limit=MESSAGE_LIMIT
+            )
+            host, port = self._server.sockets[0].getsockname()[:2]
+            self.address = f"{host}:{port}"
+        logger.info(
+            "Coordinator listening on %s for %d runs", self.address, len(self.targets)
+        )
+        return self.address
+
+    async def wait(self) -> Dict[Tuple[str, str], executor.PlaybookResult]:
+        """Wait until every target has finished and return the merged results."""
+        await self._done.wait()
+        return self.results
+
+    async def close(self, grace: float = 5.0) -> None:
+        """
+        Stop listening and disconnect the agents.
+
+        Args:
+            grace: Seconds connected agents get to receive `done` and leave.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=grace)
+        for writer in list(self._connected.values()):
+            writer.close()
+
+    async def run(
+        self, address: str = DEFAULT_LISTEN
+    ) -> Dict[Tuple[str, str], executor.PlaybookResult]:
+        """
+        Listen on `address` until every target has finished.
+
+        Args:
+            address: Address to listen on, as for `start`.
+
+        Returns:
+            Dict[Tuple[str, str], PlaybookResult]: Merged result per
+            (env, playbook).
+        """
+        await self.start(address)
+        try:
+            return await self.wait()
+        finally:
+            await self.close()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        name = None
+        try:
+            hello = await _receive(reader)
+            if not hello or hello.get("type") != "hello":
+                return
+            if hello.get("version") != PROTOCOL_VERSION:
+                logger.warning(
+                    "Rejected agent %s: protocol version %s",
+                    hello.get("name"),
+                    hello.get("version"),
+                )
+                await _send(
+                    writer,
+                    {
+                        "type": "error",
+                        "message": f"protocol version {PROTOCOL_VERSION} required",
+                    },
+                )
+                return
+            agent_nonce = str(hello.get("nonce", ""))
+            nonce = secrets.token_hex(16)
+            await _send(
+                writer,
+                {
+                    "type": "challenge",
+                    "nonce": nonce,
+                    "proof": _proof(self.token, "coordinator", agent_nonce, nonce),
+                },
+            )
+            auth = await _receive(reader)
+            if auth is None:
+                logger.warning("Agent %s left during the handshake", hello.get("name"))
+                return
+            expected = _proof(self.token, "agent", agent_nonce, nonce)
+            if auth.get("type") != "auth" or not hmac.compare_digest(
+                str(auth.get("proof", "")), expected
+            ):
+                logger.warning("Rejected agent %s: invalid token", hello.get("name"))
+                await _send(writer, {"type": "error", "message": "invalid token"})
+                return
+            name = self._unique_name(str(hello.get("name") or "agent"))
+            self.agents.setdefault(name, AgentStats(name))
+            self._connected[name] = writer
+            await _send(writer, {"type": "welcome", "name": name})
+            logger.info("Agent %s joined", name)
+            await self._serve(name, reader, writer)
+        except (ConnectionError, ValueError, exceptions.DistributedError) as exc:
+            logger.warning("Lost agent %s: %s", name or "(unregistered)", exc)
+        finally:
+            if name is not None:
+                self._connected.pop(name, None)
+                await self._requeue(name)
+            writer.close()
+            self._handlers.discard(task)
+
+    def _unique_name(self, name: str) -> str:
+        unique = name
+        for number in itertools.count(2):
+            if unique not in self._connected:
+                return unique
+            unique = f"{name}-{number}"
+        return unique  # pragma: no cover
+
+    async def _serve(
+        self, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        while True:
+            message = await _receive(reader)
+            if message is None:
+                return
+            kind = message.get("type")
+            if kind == "ready":
+                job = await self._next_job(name)
+                if job is None:
+                    await _send(writer, {"type": "done"})
+                    return
+                await _send(writer, self._job_message(job))
+            elif kind == "output":
+                line = str(message.get("line", ""))
+                logger.debug("[%s] %s", name, line)
+                if self.on_output:
+                    self.on_output(f"[{name}] {line}")
+            elif kind == "result":
+                await self._complete(name, message)
+            elif kind == "error":
+                logger.warning("Agent %s gave up: %s", name, message.get("message"))
+                return
+
+    def _job_message(self, job: Job) -> dict:
+        target = self.targets[job.target]
+        return {
+            "type": "job",
+            "id": job.id,
+            "env": target.env,
+            "playbook": target.playbook,
+            "hosts": job.hosts,
+            "extra_vars": target.extra_vars,
+            "fingerprint": target.fingerprint,
+            **self.job_options,
+        }
+
+    async def _next_job(self, name: str) -> Optional[Job]:
+        """Wait for work for `name`; None once everything has finished."""
+        async with self._changed:
+            while True:
+                job = self._take(name)
+                if job is not None or self._done.is_set():
+                    return job
+                await self._changed.wait()
+
+    def _take(self, name: str) -> Optional[Job]:
+        if self._retry:
+            job = self._retry.pop(0)
+        else:
+            for index, hosts in list(self._pending.items()):
+                if hosts is None:
+                    del self._pending[index]
+                    job = Job(next(self._ids), index, None)
+                    break
+                size = chunk_size(
+                    len(hosts),
+                    self.agents[name].throughput,
+                    [self.agents[other].throughput for other in self._others(name)],
+                    min_chunk=self.min_chunk,
+                    max_chunk=self.max_chunk,
+                )
+                job = Job(next(self._ids), index, hosts[:size])
+                if size < len(hosts):
+                    self._pending[index] = hosts[size:]
+                else:
+                    del self._pending[index]
+                break
+            else:
+                return None
+        job.attempts += 1
+        self._in_flight[job.id] = (name, job, time.monotonic())
+        target = self.targets[job.target]
+        logger.debug(
+            "Job %d (%s/%s, %s hosts) -> %s",
+            job.id,
+            target.env,
+            target.playbook,
+            len(job.hosts) if job.hosts is not None else "all",
+            name,
+        )
+        return job
+
+    def _others(self, name: str) -> List[str]:
+        return [other for other in self._connected if other != name]
+
+    async def _complete(self, name: str, message: dict) -> None:
+        async with self._changed:
+            entry = self._in_flight.pop(message.get("job"), None)
+            if entry is None:
+                logger.warning("Agent %s sent a result for an unknown job", name)
+                return
+            _, job, dispatched = entry
+            result = executor.PlaybookResult.from_dict(message.get("result") or {})
+            hosts = len(job.hosts) if job.hosts is not None else len(result.stats)
+            self.agents[name].record(hosts, time.monotonic() - dispatched)
+            self._parts[job.target].append((name, result))
+            self._finish_target(job.target)
+            self._changed.notify_all()
+
+    async def _requeue(self, name: str) -> None:
+        """Hand the jobs of a departed agent to the others."""
+        async with self._changed:
+            for job_id, (agent, job, _) in list(self._in_flight.items()):
+                if agent != name:
+                    continue
+                del self._in_flight[job_id]
+                target = self.targets[job.target]
+                if job.attempts < self.max_attempts:
+                    logger.warning(
+                        "Agent %s left during job %d, handing it out again",
+                        name,
+                        job.id,
+                    )
+                    self._retry.append(job)
+                    continue
+                logger.error(
+                    "Giving up on job %d of %s/%s after %d attempts",
+                    job.id,
+                    target.env,
+                    target.playbook,
+                    job.attempts,
+                )
+                now = time.time()
+                self._parts[job.target].append(
+                    (
+                        name,
+                        executor.PlaybookResult(
+                            env=target.env,
+                            playbook=target.playbook,
+                            command=[],
+                            exit_code=1,
+                            started_at=now,
+                            finished_at=now,
+                            duration=0.0,
+                            stats={
+                                host: {"unreachable": 1} for host in job.hosts or []
+                            },
+                            error=f"agent {name} disconnected",
+                        ),
+                    )
+                )
+                self._finish_target(job.target)
+            self._changed.notify_all()
+
+    def _finish_target(self, index: int) -> None:
+        """Merge and log the result of a target once all its jobs are in."""
+        if index in self._pending or any(job.target == index for job in self._retry):
+            return
+        if any(job.target == index for _, job, _ in self._in_flight.values()):
+            return
+
+        target = self.targets[index]
+        parts = self._parts[index]
+        merged = sharding.merge_results([result for _, result in parts])
+        # Chunks run one after another on each agent; report the wall time
+        merged.duration = merged.finished_at - merged.started_at
+        agents: Dict[str, dict] = {}
+        for name, result in parts:
+            summary = agents.setdefault(name, {"jobs": 0, "hosts": 0})
+            summary["jobs"] += 1
+            summary["hosts"] += len(result.stats)
+        for name, summary in agents.items():
+            throughput = self.agents[name].throughput
+            summary["hosts_per_second"] = round(throughput, 3) if throughput else None
+        logger.info(
+            "Distributed run finished",
+            extra={"data": {**merged.record(), "agents": agents}},
+        )
+        self.results[(target.env, target.playbook)] = merged
+        if len(self.results) == len(self.targets):
+            self._done.set()
+
+
+def _valid_playbook(name) -> bool:
+    return (
+        isinstance(name, str)
+        and bool(name)
+        and pathlib.PurePath(name).name == name
+        and not name.startswith(".")
+    )
+
+
+async def _run_job(
+    job: dict,
+    writer: asyncio.StreamWriter,
+    settings: dict,
+    on_output: Optional[executor.OutputCallback],
+) -> executor.PlaybookResult:
+    """Run one job from the coordinator, streaming its output back."""
+    playbook = job.get("playbook")
+    if not _valid_playbook(playbook):
+        reason = f"refusing playbook name {playbook!r}"
+    elif tree_fingerprint(playbook) != job.get("fingerprint"):
+        reason = f"ansible tree for {playbook} differs from the coordinator's"
+    else:
+        reason = None
+    if reason:
+        await _send(writer, {"type": "error", "message": reason})
+        raise exceptions.DistributedError(f"[Distributed] Agent is {reason}")
+
+    async def _forward(line: str) -> None:
+        if on_output:
+            on_output(line)
+        # Waiting for the coordinator to take the output pauses reading it
+        await _send(writer, {"type": "output", "job": job["id"], "line": line})
+
+    env = job["env"]
+    vars_file = extravars.store(job.get("extra_vars") or {"nodes": [env]}, settings)
+    result = await executor.run_playbook(
+        env,
+        playbook,
+        verbosity=job.get("verbosity") or 0,
+        forks=job.get("forks"),
+        timeout=job.get("timeout"),
+        limit=job.get("hosts"),
+        on_output=_forward,
+        sample_interval=settings.get("resources", {}).get("sample_interval", 0),
+        admission=settings.get("admission"),
+        extra_vars_file=vars_file,
+    )
+    return result
+
+
+async def run_agent(
+    address: str,
+    token: str,
+    name: Optional[str] = None,
+    settings_for: Optional[Callable[[str], dict]] = None,
+    on_output: Optional[executor.OutputCallback] = None,
+) -> int:
+    """
+    Register with a coordinator and run the jobs it hands out until it is done.
+
+    Args:
+        address: Coordinator address, `host:port` or `unix:/path`.
+        token: Shared secret the coordinator and this agent prove they know.
+        name: Name reported to the coordinator (default: hostname-pid).
+        settings_for: Returns this node's config for an environment; used for
+            the state dir, resource sampling and admission control.
+        on_output: Called with every line of local playbook output.
+
+    Returns:
+        int: Number of jobs run.
+
+    Raises:
+        DistributedError: If the token is empty, the coordinator is
+            unreachable, does not know the token or refuses the agent, or a
+            job does not match this node's ansible tree.
+    """
+    _require_token(token)
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    settings_for = settings_for or (lambda env: {})
+    try:
+        reader, writer = await _open(address)
+    except (OSError, ValueError) as exc:
+        raise exceptions.DistributedError(
+            f"[Distributed] Cannot reach coordinator at {address}: {exc}"
+        ) from exc
+
+    jobs = 0
+    try:
+        nonce = secrets.token_hex(16)
+        await _send(
+            writer,
+            {
+                "type": "hello",
+                "name": name,
+                "nonce": nonce,
+                "version": PROTOCOL_VERSION,
+            },
+        )
+        challenge = await _receive(reader)
+        if not challenge or challenge.get("type") != "challenge":
+            reason = challenge.get("message") if challenge else "connection closed"
+            raise exceptions.DistributedError(
+                f"[Distributed] Coordinator refused agent {name}: {reason}"
+            )
+        theirs = str(challenge.get("nonce", ""))
+        if not hmac.compare_digest(
+            str(challenge.get("proof", "")),
+            _proof(token, "coordinator", nonce, theirs),
+        ):
+            raise exceptions.DistributedError(
+                f"[Distributed] Coordinator at {address} does not know the token"
+            )
+        await _send(
+            writer, {"type": "auth", "proof": _proof(token, "agent", nonce, theirs)}
+        )
+        reply = await _receive(reader)
+        if not reply or reply.get("type") != "welcome":
+            reason = reply.get("message") if reply else "connection closed"
+            raise exceptions.DistributedError(
+                f"[Distributed] Coordinator refused agent {name}: {reason}"
+            )
+        name = reply.get("name", name)
+        logger.info("Registered with coordinator %s as %s", address, name)
+
+        while True:
+            await _send(writer, {"type": "ready"})
+            message = await _receive(reader)
+            if message is None or message.get("type") == "done":
+                break
+            if message.get("type") != "job":
+                continue
+            logger.info(
+                "Job %s: %s/%s on %s hosts",
+                message.get("id"),
+                message.get("env"),
+                message.get("playbook"),
+                len(message["hosts"]) if message.get("hosts") else "all",
+            )
+            result = await _run_job(
+                message, writer, settings_for(message.get("env")), on_output
+            )
+            await _send(
+                writer,
+                {"type": "result", "job": message["id"], "result": result.as_dict()},
+            )
+            jobs += 1
+    except ConnectionError as exc:
+        raise exceptions.DistributedError(
+            f"[Distributed] Lost coordinator at {address}: {exc}"
+        ) from exc
+    finally:
+        writer.close()
+    return jobs
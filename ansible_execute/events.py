@@ -0,0 +1,167 @@
+"""Parsing of ansible-playbook console output."""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+RECAP_HEADER = re.compile(r"^PLAY RECAP\b")
+RECAP_LINE = re.compile(r"^(?P<host>\S+)\s+:\s+(?P<counters>(?:\w+=\d+\s*)+)$")
+COUNTER = re.compile(r"(\w+)=(\d+)")
+
+
+def strip_ansi(line: str) -> str:
+    """
+    Remove ANSI colour escapes from a line of output.
+
+    Args:
+        line: Raw output line.
+
+    Returns:
+        str: Line without escape sequences.
+    """
+    return ANSI_ESCAPE.sub("", line)
+
+
+class RecapParser:
+    """Incrementally collects per-host counters from the PLAY RECAP section."""
+
+    def __init__(self) -> None:
+        """Initialize with no stats collected."""
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._in_recap = False
+
+    def feed(self, line: str) -> Optional[Dict[str, int]]:
+        """
+        Consume one line of output.
+
+        Args:
+            line: Output line without trailing newline.
+
+        Returns:
+            Optional[Dict[str, int]]: Counters if the line was a recap entry.
+        """
+        line = strip_ansi(line).strip()
+        if RECAP_HEADER.match(line):
+            self._in_recap = True
+            return None
+        if not self._in_recap or not line:
+            return None
+
+        match = RECAP_LINE.match(line)
+        if not match:
+            self._in_recap = False
+            return None
+
+        counters = {
+            key: int(value) for key, value in COUNTER.findall(match["counters"])
+        }
+        # A playbook with several plays prints one recap; later ones replace it
+        self.stats[match["host"]] = counters
+        return counters
+
+
+PLAY_LINE = re.compile(r"^PLAY \[(?P<name>.*)\]\s*\**$")
+TASK_LINE = re.compile(r"^(?P<kind>TASK|RUNNING HANDLER) \[(?P<name>.*)\]\s*\**$")
+HOST_LINE = re.compile(
+    r"^(?P<status>ok|changed|skipping|fatal|failed|unreachable|rescued|ignored):"
+    r" \[(?P<host>[^\]\s]+)(?: -> [^\]]*)?\]"
+)
+INCLUDED_LINE = re.compile(r"^included: .+ for (?P<hosts>.+)$")
+FAILED_STATUSES = ("fatal", "failed", "unreachable")
+# Implicit task that --start-at-task cannot select
+GATHERING_FACTS = "Gathering Facts"
+
+
+@dataclass(frozen=True)
+class TaskPosition:
+    """A task of a run, numbered in the order the tasks started."""
+
+    index: int
+    play: str
+    task: str
+    handler: bool = False
+
+    @property
+    def selectable(self) -> bool:
+        """Whether --start-at-task can start at this task."""
+        return not self.handler and self.task != GATHERING_FACTS
+
+
+class ProgressTracker:
+    """Follows which task a run is at and where each host failed."""
+
+    def __init__(self) -> None:
+        """Initialize before the first play."""
+        self.current: Optional[TaskPosition] = None
+        self.last_completed: Optional[TaskPosition] = None
+        # Hosts that completed `last_completed` without failing
+        self.completed_hosts: List[str] = []
+        # Host -> task it last failed at (dropped again when ignored)
+        self.failures: Dict[str, TaskPosition] = {}
+        self._play = ""
+        self._hosts: Set[str] = set()
+        self._last_failed: Optional[str] = None
+
+    def feed(self, line: str) -> bool:
+        """
+        Consume one line of output.
+
+        Args:
+            line: Output line without trailing newline.
+
+        Returns:
+            bool: Whether the line completed a task.
+        """
+        line = strip_ansi(line).strip()
+        match = PLAY_LINE.match(line)
+        if match:
+            completed = self._complete()
+            self._play = match["name"]
+            return completed
+        match = TASK_LINE.match(line)
+        if match:
+            completed = self._complete()
+            self.current = TaskPosition(
+                index=self.current.index + 1 if self.current else 1,
+                play=self._play,
+                task=match["name"],
+                handler=match["kind"] != "TASK",
+            )
+            return completed
+        if RECAP_HEADER.match(line):
+            return self._complete()
+        if self.current is None:
+            return False
+
+        if line == "...ignoring" and self._last_failed:
+            # ignore_errors: the host carries on with the next task
+            self.failures.pop(self._last_failed, None)
+            self._hosts.add(self._last_failed)
+            self._last_failed = None
+            return False
+        match = HOST_LINE.match(line)
+        if match:
+            if match["status"] in FAILED_STATUSES:
+                self.failures[match["host"]] = self.current
+                self._last_failed = match["host"]
+            else:
+                self._hosts.add(match["host"])
+            return False
+        match = INCLUDED_LINE.match(line)
+        if match:
+            self._hosts.update(host.strip() for host in match["hosts"].split(","))
+        return False
+
+    def _complete(self) -> bool:
+        if self.current is None or self.current == self.last_completed:
+            return False
+        failed = {h for h, task in self.failures.items() if task == self.current}
+        hosts = self._hosts - failed
+        self._hosts = set()
+        self._last_failed = None
+        if not hosts:
+            return False
+        self.last_completed = self.current
+        self.completed_hosts = sorted(hosts)
+        return True
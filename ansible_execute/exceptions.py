@@ -7,3 +7,19 @@ the ansible-execute CLI tool.
 
 class ConfigError(Exception):
     """Raised when configuration validation fails or is improperly structured."""
+
+
+class InventoryError(Exception):
+    """Raised when the Ansible inventory cannot be resolved or parsed."""
+
+
+class PreflightError(Exception):
+    """Raised when the pre-flight reachability probe aborts a run."""
+
+
+class RolloutError(Exception):
+    """Raised when a rolling batch exceeds its failure threshold."""
+
+
+class DistributedError(Exception):
+    """Raised when a coordinator or worker agent cannot take part in a run."""
@@ -1,40 +1,501 @@
 """Playbook execution logic."""
 
-import logging
-import subprocess
+import asyncio
+import contextlib
 import json
+import logging
+import os
+import pathlib
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from ansible_execute import admission as admission_control
+from ansible_execute import checkpoints, events, failures, playbooks, resources
+from ansible_execute import logger as log_setup
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for a single line of ansible-playbook output
+STREAM_LIMIT = 1024 * 1024
+# Seconds a terminated run gets to exit before it is killed
+TERMINATE_GRACE = 5.0
+
+# May return an awaitable, which is awaited before the next line is read
+OutputCallback = Callable[[str], Optional[Awaitable[None]]]
+
+
+@dataclass
+class PlaybookResult:
+    """Outcome of a single ansible-playbook run."""
+
+    env: str
+    playbook: str
+    command: List[str]
+    exit_code: int
+    started_at: float
+    finished_at: float
+    duration: float
+    stats: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    timed_out: bool = False
+    error: Optional[str] = None
+    usage: Optional[resources.ResourceUsage] = None
+    # Seconds the start was delayed by admission control
+    queued: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Whether the run completed with exit code 0."""
+        return self.exit_code == 0 and not self.timed_out
+
+    @property
+    def failed_hosts(self) -> List[str]:
+        """Hosts reported as failed or unreachable in the recap."""
+        return [
+            host
+            for host, counters in self.stats.items()
+            if counters.get("failed", 0) or counters.get("unreachable", 0)
+        ]
+
+    def record(self) -> dict:
+        """Return the structured completion record of the run."""
+        return {
+            "env": self.env,
+            "playbook": self.playbook,
+            "exit_code": self.exit_code,
+            "ok": self.ok,
+            "timed_out": self.timed_out,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": round(self.duration, 3),
+            "queued": round(self.queued, 3),
+            "hosts": len(self.stats),
+            "failed_hosts": self.failed_hosts,
+            "resources": self.usage.as_dict() if self.usage else None,
+        }
+
+    def as_dict(self) -> dict:
+        """Return the full result as a JSON-serialisable dict."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlaybookResult":
+        """Rebuild a result from `as_dict` output, ignoring unknown keys."""
+        known = cls.__dataclass_fields__  # pylint: disable=no-member
+        values = {key: value for key, value in data.items() if key in known}
+        if values.get("usage"):
+            values["usage"] = resources.ResourceUsage.from_dict(values["usage"])
+        return cls(**values)
 
-def run_ansible_playbook(env: str, playbook: str, verbosity: int = 0) -> None:
+
+def build_command(
+    env: str,
+    playbook: str,
+    verbosity: int = 0,
+    forks: Optional[int] = None,
+    limit: Optional[List[str]] = None,
+    extra_args: Optional[List[str]] = None,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    tags: Optional[List[str]] = None,
+) -> List[str]:
     """
-    Run the ansible playbook, passing the environment as the 'nodes' variable.
+    Build the ansible-playbook command line.
 
     Args:
         env (str): Environment (dev, staging, prod), passed as --extra-vars nodes.
+        playbook (str): Playbook name under ansible/playbooks.
         verbosity (int): Verbosity level from CLI (-v, -vv, etc).
-    """
-    logger.info("Starting execution for environment: %s", env)
+        forks (int, optional): Parallel forks passed to ansible-playbook.
+        limit (List[str], optional): Hosts passed to --limit.
+        extra_args (List[str], optional): Additional ansible-playbook arguments.
+        extra_vars_file (Path, optional): Extra-vars bundle passed as @file
+            instead of the inline nodes variable.
+        tags (List[str], optional): Only run tasks with these tags.
 
-    vars_json = json.dumps({"nodes": [env]})
+    Returns:
+        List[str]: Command and arguments.
+    """
+    if extra_vars_file:
+        extra_vars = f"@{extra_vars_file}"
+    else:
+        extra_vars = json.dumps({"nodes": [env]})
     cmd = [
         "ansible-playbook",
-        f"ansible/playbooks/{playbook}.yml",
+        str(playbooks.playbook_path(playbook)),
         "--extra-vars",
-        vars_json,
+        extra_vars,
     ]
 
+    if extra_args:
+        cmd.extend(extra_args)
+
+    if tags:
+        cmd.extend(["--tags", ",".join(tags)])
+
+    if forks:
+        cmd.extend(["--forks", str(forks)])
+
+    if limit:
+        cmd.extend(["--limit", ",".join(limit)])
+
     if verbosity > 0:
         cmd.append("-" + "v" * verbosity)
 
-    logger.debug("Running command: %r", cmd)
+    return cmd
+
+
+async def run_playbook(
+    env: str,
+    playbook: str,
+    verbosity: int = 0,
+    forks: Optional[int] = None,
+    timeout: Optional[int] = None,
+    limit: Optional[List[str]] = None,
+    on_output: Optional[OutputCallback] = None,
+    extra_env: Optional[Dict[str, str]] = None,
+    extra_args: Optional[List[str]] = None,
+    sample_interval: float = 0,
+    admission: Optional[dict] = None,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    tags: Optional[List[str]] = None,
+    checkpoint: Optional[checkpoints.Checkpoint] = None,
+    context_lines: int = 50,
+    failure_dir: Optional[pathlib.Path] = None,
+    report_failures: bool = True,
+) -> PlaybookResult:
+    """
+    Run ansible-playbook as an asyncio subprocess and stream its output.
+
+    Never raises for a failed run; inspect the returned result instead. The
+    child is terminated if the calling task is cancelled. Where supported, the
+    child runs under the `resources` wrapper so the rusage of its whole process
+    tree is attached to the result, and the completion record is logged. The
+    most recent output and events are kept in fixed-size buffers; if the run
+    fails, a failure report built from them is logged too. Records logged
+    during the run are stamped with `env`.
+
+    Args:
+        env (str): Environment (dev, staging, prod), passed as --extra-vars nodes.
+        playbook (str): Playbook name under ansible/playbooks.
+        verbosity (int): Verbosity level from CLI (-v, -vv, etc).
+        forks (int, optional): Parallel forks passed to ansible-playbook.
+        timeout (int, optional): Seconds before the run is killed (0 disables).
+        limit (List[str], optional): Hosts passed to --limit.
+        on_output (Callable, optional): Called with every line of output; if
+            it returns an awaitable, reading pauses until it completes.
+        extra_env (Dict[str, str], optional): Environment variables for the child.
+        extra_args (List[str], optional): Additional ansible-playbook arguments.
+        sample_interval (float): Seconds between samples of the live process
+            tree's CPU and RSS (0 disables sampling).
+        admission (dict, optional): `admission` config section; when enabled,
+            the start waits for capacity and forks are scaled to the load.
+        extra_vars_file (Path, optional): Extra-vars bundle from `extravars`.
+        tags (List[str], optional): Only run tasks with these tags.
+        checkpoint (Checkpoint, optional): Updated as tasks complete, then
+            cleared on success or left pointing at where to resume.
+        context_lines (int): Output lines kept for the failure report.
+        failure_dir (Path, optional): Directory to also write failure reports to.
+        report_failures (bool): Log a failure report for failed runs; off for
+            runs whose failure is an expected answer, such as checks.
+
+    Returns:
+        PlaybookResult: Exit code, timings, parsed recap stats and resource usage.
+    """
+    with log_setup.env_context(env), contextlib.ExitStack() as cleanup:
+        queued = time.monotonic()
+        if admission and admission.get("enabled"):
+            forks = await admission_control.admit(admission, forks)
+            cleanup.callback(admission_control.release)
+        queued = time.monotonic() - queued
+
+        cmd = build_command(
+            env,
+            playbook,
+            verbosity=verbosity,
+            forks=forks,
+            limit=limit,
+            extra_args=extra_args,
+            extra_vars_file=extra_vars_file,
+            tags=tags,
+        )
+        logger.debug("Running command: %r", cmd)
+
+        recap = events.RecapParser()
+        progress = events.ProgressTracker()
+        context = failures.FailureContext(lines=context_lines)
+        usage = resources.ResourceUsage()
+        usage_file = None
+        spawn_cmd = cmd
+        child_path = (extra_env or {}).get("PATH")
+        if resources.accounting_supported() and shutil.which(cmd[0], path=child_path):
+            fd, name = tempfile.mkstemp(
+                prefix="ansible-execute-rusage-", suffix=".json"
+            )
+            os.close(fd)
+            usage_file = pathlib.Path(name)
+            spawn_cmd = resources.wrap_command(cmd, usage_file)
+
+        started_at = time.time()
+        started = time.monotonic()
+
+        def _result(exit_code: int, **kwargs) -> PlaybookResult:
+            if usage_file:
+                total = resources.read_usage(usage_file)
+                usage_file.unlink(missing_ok=True)
+                if total:
+                    total.samples = usage.samples
+                    total.peak_tree_rss_kb = usage.peak_tree_rss_kb
+                    kwargs["usage"] = total
+            result = PlaybookResult(
+                env=env,
+                playbook=playbook,
+                command=cmd,
+                exit_code=exit_code,
+                started_at=started_at,
+                finished_at=time.time(),
+                duration=time.monotonic() - started,
+                stats=recap.stats,
+                queued=queued,
+                **kwargs,
+            )
+            logger.info("Playbook run finished", extra={"data": result.record()})
+            if not result.ok and report_failures:
+                _report_failure(context.report(result), failure_dir)
+            if checkpoint:
+                checkpoint.finish(result, progress)
+            return result
+
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *spawn_cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=STREAM_LIMIT,
+                env={**os.environ, **extra_env} if extra_env else None,
+                # Own process group, so termination reaches the rusage wrapper,
+                # ansible-playbook and its workers alike
+                start_new_session=True,
+            )
+        except OSError as exc:
+            logger.error("Could not start ansible-playbook: %s", exc)
+            return _result(127, error=str(exc))
+
+        sampler = None
+        if sample_interval:
+            sampler = asyncio.ensure_future(
+                resources.sample_periodically(proc.pid, sample_interval, usage)
+            )
+
+        async def _stream() -> int:
+            async for raw in proc.stdout:
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                recap.feed(line)
+                context.feed(line)
+                if checkpoint and progress.feed(line):
+                    checkpoint.update(progress)
+                logger.debug("[%s] %s", env, line)
+                if on_output:
+                    pending = on_output(line)
+                    if pending is not None:
+                        await pending
+            return await proc.wait()
+
+        try:
+            exit_code = await asyncio.wait_for(_stream(), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            await _terminate(proc)
+            logger.error("Playbook execution timed out after %ds", timeout)
+            return _result(proc.returncode, timed_out=True)
+        except BaseException:
+            # Cancelled, or an output callback failed (e.g. a closed pipe):
+            # the child runs in its own session and would outlive us
+            await _terminate(proc)
+            if usage_file:
+                usage_file.unlink(missing_ok=True)
+            raise
+        finally:
+            if sampler:
+                sampler.cancel()
+
+        return _result(exit_code)
+
+
+def _report_failure(report: dict, directory: Optional[pathlib.Path]) -> None:
+    """
+    Log the failure report of a run and write it to its own file.
+
+    Args:
+        report: Report from `FailureContext.report`.
+        directory: Directory to write the report to, if any.
+    """
+    failure = report["first_failure"]
+    logger.error(
+        "Playbook run failed%s",
+        f" on {failure['host']} at task '{failure['task']}'" if failure else "",
+        extra={"data": report},
+    )
+    if directory is None:
+        return
+    try:
+        path = failures.write_report(report, directory)
+    except OSError as exc:
+        logger.warning("Could not write the failure report: %s", exc)
+        return
+    logger.error("Failure report written to %s", path)
+
+
+async def _terminate(
+    proc: asyncio.subprocess.Process, grace: Optional[float] = None
+) -> None:
+    """
+    Stop a child's process group, escalating from SIGTERM to SIGKILL.
+
+    Signalling the whole group matters when the child is the `resources`
+    wrapper: SIGKILL cannot be forwarded, so killing only the wrapper would
+    leave an ansible-playbook that ignores SIGTERM running.
+
+    Args:
+        proc: Running child process, started in its own session.
+        grace: Seconds to wait after SIGTERM before killing
+            (default: TERMINATE_GRACE).
+    """
+    if proc.returncode is not None:
+        return
+    if not _signal_group(proc, signal.SIGTERM):
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=grace or TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        _signal_group(proc, signal.SIGKILL)
+        await proc.wait()
+    # Workers that outlived the leader are stopped with it
+    _signal_group(proc, signal.SIGKILL)
+
 
+def _signal_group(proc: asyncio.subprocess.Process, signum: int) -> bool:
+    """Signal the process group led by `proc`; False if it is already gone."""
     try:
-        subprocess.run(cmd, check=True)
-        logger.info("Playbook executed successfully")
-    except subprocess.CalledProcessError as exc:
-        logger.error(
-            "Playbook execution failed with exit code %d", exc.returncode, exc_info=True
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signum)
+        else:  # pragma: no cover - no process groups
+            proc.send_signal(signum)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def run_playbooks(
+    runs: Iterable[dict], concurrency: int = 1
+) -> List[PlaybookResult]:
+    """
+    Run several playbooks on the current event loop.
+
+    Args:
+        runs: Keyword arguments for `run_playbook`, one dict per run.
+        concurrency: Maximum number of runs in flight at once.
+
+    Returns:
+        List[PlaybookResult]: Results in the order the runs were given.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _bounded(kwargs: dict) -> PlaybookResult:
+        async with semaphore:
+            return await run_playbook(**kwargs)
+
+    return list(await asyncio.gather(*(_bounded(kwargs) for kwargs in runs)))
+
+
+def echo_output(line: str) -> None:
+    """Write a line of playbook output to stdout."""
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def run_ansible_playbook(
+    env: str,
+    playbook: str,
+    verbosity: int = 0,
+    forks: Optional[int] = None,
+    timeout: Optional[int] = None,
+    limit: Optional[List[str]] = None,
+    sample_interval: float = 0,
+    admission: Optional[dict] = None,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    tags: Optional[List[str]] = None,
+    extra_args: Optional[List[str]] = None,
+    checkpoint: Optional[checkpoints.Checkpoint] = None,
+    context_lines: int = 50,
+    failure_dir: Optional[pathlib.Path] = None,
+) -> PlaybookResult:
+    """
+    Run the ansible playbook, passing the environment as the 'nodes' variable.
+
+    Synchronous CLI wrapper around `run_playbook` that exits on failure.
+
+    Args:
+        env (str): Environment (dev, staging, prod), passed as --extra-vars nodes.
+        verbosity (int): Verbosity level from CLI (-v, -vv, etc).
+        forks (int, optional): Parallel forks passed to ansible-playbook.
+        timeout (int, optional): Seconds before the run is aborted (0 disables).
+        limit (List[str], optional): Hosts passed to --limit.
+        sample_interval (float): Seconds between process tree samples.
+        admission (dict, optional): `admission` config section.
+        extra_vars_file (Path, optional): Extra-vars bundle from `extravars`.
+        tags (List[str], optional): Only run tasks with these tags.
+        extra_args (List[str], optional): Additional ansible-playbook arguments.
+        checkpoint (Checkpoint, optional): Progress checkpoint of the run.
+        context_lines (int): Output lines kept for the failure report.
+        failure_dir (Path, optional): Directory failure reports are written to.
+
+    Returns:
+        PlaybookResult: Result of the successful run.
+    """
+    logger.info("Starting execution for environment: %s", env)
+
+    result = asyncio.run(
+        run_playbook(
+            env,
+            playbook,
+            verbosity=verbosity,
+            forks=forks,
+            timeout=timeout,
+            limit=limit,
+            on_output=echo_output,
+            sample_interval=sample_interval,
+            admission=admission,
+            extra_vars_file=extra_vars_file,
+            tags=tags,
+            extra_args=extra_args,
+            checkpoint=checkpoint,
+            context_lines=context_lines,
+            failure_dir=failure_dir,
         )
-        raise SystemExit(exc.returncode) from exc
+    )
+    return check_result(result)
+
+
+def check_result(result: PlaybookResult) -> PlaybookResult:
+    """
+    Log the outcome of a run and exit the process if it failed.
+
+    Args:
+        result: Result returned by `run_playbook`.
+
+    Returns:
+        PlaybookResult: The same result, if the run succeeded.
+    """
+    if result.timed_out:
+        raise SystemExit(1)
+
+    if result.exit_code != 0:
+        logger.error("Playbook execution failed with exit code %d", result.exit_code)
+        raise SystemExit(result.exit_code)
+
+    logger.info("Playbook executed successfully")
+    return result
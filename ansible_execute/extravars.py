@@ -0,0 +1,133 @@
+"""Per-environment extra-vars bundles passed to ansible-playbook as files."""
+
+import hashlib
+import json
+import logging
+import pathlib
+from typing import Dict, Tuple
+
+import yaml
+
+from ansible_execute import exceptions, utils
+
+logger = logging.getLogger(__name__)
+
+# Inputs fingerprint -> bundle file, so repeated runs skip re-serialising
+_bundles: Dict[Tuple, pathlib.Path] = {}
+
+
+def var_files(env: str, settings: dict) -> list:
+    """
+    Return the configured extra-vars files for `env`.
+
+    Args:
+        env: Environment name, substituted for `{env}` in each path.
+        settings: Resolved config for the environment.
+
+    Returns:
+        list: Paths in merge order.
+    """
+    files = settings.get("extra_vars", {}).get("files") or []
+    return [pathlib.Path(str(path).replace("{env}", env)) for path in files]
+
+
+def collect(env: str, settings: dict) -> dict:
+    """
+    Build the extra-vars of a run.
+
+    Files are merged in order, then `extra_vars.values` (which environment
+    overlays can extend), and finally `nodes`, which always targets `env`.
+
+    Args:
+        env: Environment name.
+        settings: Resolved config for the environment.
+
+    Returns:
+        dict: Variables passed to ansible-playbook.
+
+    Raises:
+        ConfigError: If a file is missing or does not contain a mapping.
+    """
+    merged: dict = {}
+    for path in var_files(env, settings):
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = yaml.safe_load(f)  # JSON is valid YAML
+        except (OSError, yaml.YAMLError) as exc:
+            raise exceptions.ConfigError(
+                f"[Config] Could not read extra_vars file '{path}': {exc}"
+            ) from exc
+        if data is None:
+            continue
+        if not isinstance(data, dict):
+            raise exceptions.ConfigError(
+                f"[Config] extra_vars file '{path}' must contain a mapping"
+            )
+        merged = utils.deep_merge(merged, data)
+
+    merged = utils.deep_merge(
+        merged, settings.get("extra_vars", {}).get("values") or {}
+    )
+    merged["nodes"] = [env]
+    return merged
+
+
+def _fingerprint(env: str, settings: dict) -> Tuple:
+    stamps = []
+    for path in var_files(env, settings):
+        try:
+            stat = path.stat()
+            stamps.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append((str(path), None, None))
+    values = json.dumps(
+        settings.get("extra_vars", {}).get("values") or {}, sort_keys=True, default=str
+    )
+    return env, str(utils.state_dir(settings)), values, tuple(stamps)
+
+
+def bundle(env: str, settings: dict) -> pathlib.Path:
+    """
+    Return a content-addressed JSON file holding the extra-vars of `env`.
+
+    The file name is the hash of its content, so identical inputs share one
+    file across runs and parallel children, and changed inputs get a new one.
+    Within a process, unchanged inputs (same files by mtime and size, same
+    values) are not read or serialised again.
+
+    Args:
+        env: Environment name.
+        settings: Resolved config for the environment.
+
+    Returns:
+        pathlib.Path: File to pass as `--extra-vars @<file>`.
+    """
+    key = _fingerprint(env, settings)
+    cached = _bundles.get(key)
+    if cached is not None and cached.is_file():
+        return cached
+
+    path = store(collect(env, settings), settings)
+    logger.debug("Extra-vars bundle for %s: %s", env, path)
+    _bundles[key] = path
+    return path
+
+
+def store(data: dict, settings: dict) -> pathlib.Path:
+    """
+    Write extra-vars to their content-addressed file, unless already there.
+
+    Args:
+        data: Variables, e.g. from `collect`.
+        settings: Config giving the state directory.
+
+    Returns:
+        pathlib.Path: File to pass as `--extra-vars @<file>`.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    path = utils.state_dir(settings) / "extra-vars" / f"{digest}.json"
+    if not path.is_file():
+        # Values json cannot encode are written as the strings that were hashed
+        utils.write_json_atomic(path, json.loads(canonical))
+    return path
@@ -0,0 +1,178 @@
+"""Bounded context of recent playbook output, reported when a run fails."""
+
+import itertools
+import logging
+import pathlib
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from ansible_execute import events, utils
+
+logger = logging.getLogger(__name__)
+
+# Lines longer than this are truncated before they are kept
+MAX_LINE = 1024
+
+
+def report_dir(settings: dict) -> pathlib.Path:
+    """
+    Return where failure reports are written.
+
+    Args:
+        settings: Resolved config for the environment.
+
+    Returns:
+        pathlib.Path: Value of `failures.dir`, or `failures` under the state dir.
+    """
+    configured = settings.get("failures", {}).get("dir")
+    return (
+        pathlib.Path(configured)
+        if configured
+        else utils.state_dir(settings) / "failures"
+    )
+
+
+class FailureContext:
+    """
+    Ring buffers of the most recent output lines and parsed events of a run.
+
+    Memory stays constant however long the run is: only the last `lines`
+    lines, the last `max_events` events and failures, and the first failure
+    are kept.
+    """
+
+    def __init__(self, lines: int = 50, max_events: int = 50) -> None:
+        """
+        Initialize empty buffers.
+
+        Args:
+            lines: Output lines to keep.
+            max_events: Parsed events (plays, tasks, host results) and host
+                failures to keep.
+        """
+        self.lines: Deque[Tuple[float, str]] = deque(maxlen=max(1, lines))
+        self.events: Deque[dict] = deque(maxlen=max(1, max_events))
+        self.failures: Deque[dict] = deque(maxlen=max(1, max_events))
+        self.first_failure: Optional[dict] = None
+        self.current_task: Optional[dict] = None
+        self.lines_seen = 0
+        self.last_output = 0.0
+        self._play = ""
+        self._started = time.monotonic()
+
+    def feed(self, line: str) -> None:
+        """
+        Consume one line of output.
+
+        Args:
+            line: Output line without trailing newline.
+        """
+        at = round(time.monotonic() - self._started, 3)
+        self.lines_seen += 1
+        self.last_output = at
+        if len(line) > MAX_LINE:
+            line = line[:MAX_LINE] + "..."
+        self.lines.append((at, line))
+
+        line = events.strip_ansi(line).strip()
+        match = events.PLAY_LINE.match(line)
+        if match:
+            self._play = match["name"]
+            self.events.append({"at": at, "event": "play", "name": self._play})
+            return
+        match = events.TASK_LINE.match(line)
+        if match:
+            kind = "task" if match["kind"] == "TASK" else "handler"
+            self.current_task = {
+                "at": at,
+                "event": kind,
+                "play": self._play,
+                "name": match["name"],
+            }
+            self.events.append(self.current_task)
+            return
+        if line == "...ignoring" and self.failures:
+            failure = self.failures.pop()
+            failure["status"] = "ignored"
+            if self.first_failure is failure:
+                self.first_failure = None
+            return
+        match = events.HOST_LINE.match(line)
+        if match:
+            event = {
+                "at": at,
+                "event": "host",
+                "host": match["host"],
+                "status": match["status"],
+                "play": self._play,
+                "task": self.current_task["name"] if self.current_task else None,
+            }
+            self.events.append(event)
+            if match["status"] in events.FAILED_STATUSES:
+                self.failures.append(event)
+                if self.first_failure is None:
+                    self.first_failure = event
+
+    def report(self, result) -> dict:
+        """
+        Build the structured report of a failed run.
+
+        Args:
+            result: `executor.PlaybookResult` of the run.
+
+        Returns:
+            dict: Failing host and task, recent failures and events, the last
+            output lines and the timings of the run.
+        """
+        current = self.current_task
+        return {
+            "env": result.env,
+            "playbook": result.playbook,
+            "exit_code": result.exit_code,
+            "timed_out": result.timed_out,
+            "error": result.error,
+            "failed_hosts": result.failed_hosts,
+            "first_failure": self.first_failure,
+            "failures": list(self.failures),
+            "last_task": current,
+            "timings": {
+                "started_at": result.started_at,
+                "finished_at": result.finished_at,
+                "duration": round(result.duration, 3),
+                "queued": round(result.queued, 3),
+                "first_failure_after": (
+                    self.first_failure["at"] if self.first_failure else None
+                ),
+                "last_task_after": current["at"] if current else None,
+                "last_output_after": self.last_output,
+            },
+            "events": list(self.events),
+            "lines_seen": self.lines_seen,
+            "output": [line for _, line in self.lines],
+        }
+
+
+def write_report(report: dict, directory: pathlib.Path) -> pathlib.Path:
+    """
+    Write a failure report to its own file.
+
+    Args:
+        report: Report from `FailureContext.report`.
+        directory: Directory the reports are kept in.
+
+    Returns:
+        pathlib.Path: File written.
+    """
+    started_at = report["timings"]["started_at"]
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(started_at))
+    millis = int(started_at * 1000) % 1000
+    name = f"{report['env']}-{report['playbook']}-{stamp}.{millis:03d}"
+    path = directory / f"{name}.json"
+    # Shards of a run can start within the same millisecond
+    for number in itertools.count(2):
+        if not path.exists():
+            break
+        path = directory / f"{name}-{number}.json"
+    utils.write_json_atomic(path, report)
+    return path
@@ -0,0 +1,286 @@
+"""Inventory resolution via ansible-inventory."""
+
+import configparser
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ansible_execute import exceptions, utils
+
+logger = logging.getLogger(__name__)
+
+
+class Inventory:
+    """Group-to-host mapping and host vars parsed from `ansible-inventory --list`."""
+
+    def __init__(self, data: dict) -> None:
+        """
+        Initialize from the JSON document produced by `ansible-inventory --list`.
+
+        Args:
+            data: Parsed inventory JSON.
+        """
+        if not isinstance(data, dict):
+            raise exceptions.InventoryError(
+                "[Inventory] Top-level inventory must be a dictionary"
+            )
+
+        self.hostvars: Dict[str, dict] = data.get("_meta", {}).get("hostvars", {})
+        self.groups: Dict[str, dict] = {
+            name: group
+            for name, group in data.items()
+            if name != "_meta" and isinstance(group, dict)
+        }
+
+    def hosts_for(self, group: str) -> List[str]:
+        """
+        Return every host in `group`, including hosts of nested child groups.
+
+        Args:
+            group: Group name (usually the environment).
+
+        Returns:
+            List[str]: Host names in inventory order, without duplicates.
+        """
+        if group not in self.groups:
+            raise exceptions.InventoryError(f"[Inventory] Unknown group '{group}'")
+
+        hosts: Dict[str, None] = {}
+        seen = set()
+        pending = [group]
+        while pending:
+            name = pending.pop(0)
+            if name in seen:
+                continue
+            seen.add(name)
+            entry = self.groups.get(name, {})
+            for host in entry.get("hosts", []):
+                hosts[host] = None
+            pending.extend(entry.get("children", []))
+        return list(hosts)
+
+    def host_address(
+        self, host: str, default_port: Optional[int] = None
+    ) -> Tuple[str, Optional[int]]:
+        """
+        Return the connection address for a host.
+
+        Args:
+            host: Inventory host name.
+            default_port: Port used when the host does not set `ansible_port`.
+
+        Returns:
+            Tuple[str, Optional[int]]: `ansible_host` (or the name) and port;
+            the default port when `ansible_port` is not a number (e.g. a
+            Jinja template only ansible can render).
+        """
+        host_vars = self.hostvars.get(host, {})
+        address = host_vars.get("ansible_host", host)
+        port = host_vars.get("ansible_port", default_port)
+        try:
+            return str(address), int(port) if port is not None else None
+        except (TypeError, ValueError):
+            logger.debug(
+                "Host %s has ansible_port %r, using %s", host, port, default_port
+            )
+            return str(address), default_port
+
+
+ANSIBLE_CFG_LOCATIONS = [
+    pathlib.Path("ansible.cfg"),
+    pathlib.Path.home() / ".ansible.cfg",
+    pathlib.Path("/etc/ansible/ansible.cfg"),
+]
+DEFAULT_SOURCE = "/etc/ansible/hosts"
+
+# Inventories resolved by this process, keyed by source fingerprint
+_resolved: Dict[str, Inventory] = {}
+
+
+def _ansible_cfg() -> Optional[pathlib.Path]:
+    """Return the ansible.cfg Ansible would use, following its search order."""
+    configured = os.environ.get("ANSIBLE_CONFIG")
+    candidates = [pathlib.Path(configured)] if configured else []
+    for path in candidates + ANSIBLE_CFG_LOCATIONS:
+        if path.is_file():
+            return path
+    return None
+
+
+def inventory_sources(settings: dict) -> List[str]:
+    """
+    Work out which inventory sources ansible-inventory will read.
+
+    Args:
+        settings: Resolved config for the environment.
+
+    Returns:
+        List[str]: `inventory.sources` from the config, else ANSIBLE_INVENTORY,
+        else the `inventory` setting of ansible.cfg, else Ansible's default.
+    """
+    configured = settings.get("inventory", {}).get("sources")
+    if configured:
+        return [str(source) for source in configured]
+
+    from_env = os.environ.get("ANSIBLE_INVENTORY")
+    if from_env:
+        return [source.strip() for source in from_env.split(",") if source.strip()]
+
+    cfg_path = _ansible_cfg()
+    if cfg_path:
+        parser = configparser.ConfigParser(interpolation=None)
+        try:
+            parser.read(cfg_path, encoding="utf-8")
+        except configparser.Error:
+            logger.debug("Could not parse %s", cfg_path)
+        value = parser.get("defaults", "inventory", fallback="")
+        if value:
+            base = cfg_path.parent
+            return [
+                str(base / os.path.expanduser(source.strip()))
+                for source in value.split(",")
+                if source.strip()
+            ]
+
+    return [DEFAULT_SOURCE]
+
+
+def fingerprint(sources: List[str]) -> str:
+    """
+    Hash the inventory sources by path, size and modification time.
+
+    Directories are walked so that edits to any group_vars or host_vars file
+    invalidate the cache. Dynamic sources are covered by the cache TTL.
+
+    Args:
+        sources: Inventory source paths (or host lists).
+
+    Returns:
+        str: Hex digest identifying the current state of the sources.
+    """
+    digest = hashlib.sha256()
+    cfg_path = _ansible_cfg()
+    extra = [str(cfg_path)] if cfg_path else []
+    for source in sorted(sources) + extra:
+        digest.update(source.encode("utf-8") + b"\0")
+        path = pathlib.Path(source)
+        if path.is_dir():
+            files = sorted(
+                pathlib.Path(root) / name
+                for root, _, names in os.walk(path)
+                for name in names
+            )
+        else:
+            files = [path]
+        for file in files:
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+
+def resolve(settings: dict, refresh: bool = False) -> Inventory:
+    """
+    Return the inventory, served from cache while the sources are unchanged.
+
+    Results are memoized in-process and cached on disk under
+    `state.dir/inventory`, keyed by the source fingerprint and kept for
+    `inventory.cache_ttl` seconds (0 disables the on-disk cache).
+
+    Args:
+        settings: Resolved config for the environment.
+        refresh: Ignore cached results and re-run ansible-inventory.
+
+    Returns:
+        Inventory: Parsed inventory.
+    """
+    inventory_settings = settings.get("inventory", {})
+    sources = inventory_sources(settings)
+    key = fingerprint(sources)
+    ttl = inventory_settings.get("cache_ttl", 300)
+
+    if not refresh and key in _resolved:
+        return _resolved[key]
+
+    cache_dir = utils.state_dir(settings) / "inventory"
+    cache_path = cache_dir / f"{key}.json"
+    data = None
+    if ttl and not refresh:
+        data = _read_cache(cache_path, ttl)
+
+    if data is None:
+        explicit = sources if inventory_settings.get("sources") else None
+        data = _list_inventory(explicit)
+        if ttl:
+            _write_cache(cache_dir, cache_path, data, ttl)
+    else:
+        logger.debug("Using cached inventory %s", cache_path)
+
+    _resolved[key] = Inventory(data)
+    return _resolved[key]
+
+
+def _read_cache(path: pathlib.Path, ttl: int) -> Optional[dict]:
+    """Return cached inventory data if present and younger than `ttl`."""
+    try:
+        cached = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or time.time() - cached.get("created", 0) > ttl:
+        return None
+    return cached.get("data")
+
+
+def _write_cache(cache_dir: pathlib.Path, path: pathlib.Path, data: dict, ttl: int):
+    """Store inventory data and prune entries that have expired."""
+    try:
+        utils.write_json_atomic(path, {"created": time.time(), "data": data})
+        for stale in cache_dir.glob("*.json"):
+            if stale != path and time.time() - stale.stat().st_mtime > ttl:
+                stale.unlink(missing_ok=True)
+    except OSError as exc:
+        logger.debug("Could not write inventory cache %s: %s", path, exc)
+
+
+def load_inventory(sources: Optional[List[str]] = None) -> Inventory:
+    """
+    Run `ansible-inventory --list` and parse its output.
+
+    Args:
+        sources: Inventory sources passed with -i (Ansible's default if None).
+
+    Returns:
+        Inventory: Parsed inventory.
+    """
+    return Inventory(_list_inventory(sources))
+
+
+def _list_inventory(sources: Optional[List[str]] = None) -> dict:
+    """Run `ansible-inventory --list` and return the parsed JSON document."""
+    cmd = ["ansible-inventory", "--list"]
+    for source in sources or []:
+        cmd.extend(["-i", source])
+    logger.debug("Running command: %r", cmd)
+
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except (subprocess.CalledProcessError, OSError) as exc:
+        raise exceptions.InventoryError(
+            "[Inventory] Could not list inventory with ansible-inventory"
+        ) from exc
+
+    try:
+        data = json.loads(result.stdout)
+    except json.JSONDecodeError as exc:
+        raise exceptions.InventoryError(
+            "[Inventory] ansible-inventory returned invalid JSON"
+        ) from exc
+
+    return data
@@ -0,0 +1,190 @@
+"""Load tests of the executor against the simulated ansible-playbook."""
+
+import asyncio
+import dataclasses
+import logging
+import math
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from ansible_execute import executor, simulator
+
+logger = logging.getLogger(__name__)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """
+    Summarise a latency distribution.
+
+    Args:
+        values: Measurements in seconds.
+
+    Returns:
+        Dict[str, Optional[float]]: p50, p95, p99 and max (nearest rank),
+        or None for each if there are no measurements.
+    """
+    ordered = sorted(values)
+    summary: Dict[str, Optional[float]] = {}
+    for name, rank in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+        if not ordered:
+            summary[name] = None
+            continue
+        index = max(0, math.ceil(rank * len(ordered)) - 1)
+        summary[name] = round(ordered[index], 3)
+    return summary
+
+
+def _peak_rss_kb() -> Optional[int]:
+    """Peak RSS of this process in KiB, or None where rusage is unavailable."""
+    try:
+        # Unix only; imported here so that the CLI still loads on Windows
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _Stream:
+    """Counts the output of one run without keeping it."""
+
+    def __init__(self) -> None:
+        self.first_line_at: Optional[float] = None
+        self.lines = 0
+        self.bytes = 0
+
+    def __call__(self, line: str) -> None:
+        if self.first_line_at is None:
+            self.first_line_at = time.time()
+        self.lines += 1
+        self.bytes += len(line) + 1
+
+
+async def run_load_test(
+    sim: simulator.SimulatorSettings,
+    runs: int = 10,
+    concurrency: int = 10,
+    forks: Optional[int] = None,
+    timeout: Optional[int] = None,
+    sample_interval: float = 0,
+) -> dict:
+    """
+    Drive concurrent runs of the executor against the simulator.
+
+    Each run is a separate simulated environment (`load-1`, `load-2`, ...)
+    going through `executor.run_playbook` exactly as a real run would, with
+    the simulator shim first on the child's PATH. Runs are seeded from
+    `sim.seed` plus their index, so they fail on different hosts.
+
+    Args:
+        sim: Shape of the simulated fleet of every run.
+        runs: Number of runs.
+        concurrency: Runs in flight at once.
+        forks: Forks passed to each run.
+        timeout: Seconds before a run is killed (0 or None disables).
+        sample_interval: Seconds between process tree samples of each run.
+
+    Returns:
+        dict: Run outcomes, throughput, latency percentiles and memory use.
+    """
+    with tempfile.TemporaryDirectory(prefix="ansible-execute-sim-") as tmp:
+        shim_dir = pathlib.Path(tmp)
+        simulator.install(shim_dir)
+        path = os.pathsep.join([str(shim_dir), os.environ.get("PATH", "")])
+        streams = [_Stream() for _ in range(runs)]
+        kwargs = [
+            {
+                "env": f"load-{index + 1}",
+                "playbook": "site",
+                "forks": forks,
+                "timeout": timeout,
+                "on_output": stream,
+                "extra_env": {
+                    **dataclasses.replace(sim, seed=sim.seed + index).as_env(),
+                    "PATH": path,
+                },
+                "sample_interval": sample_interval,
+            }
+            for index, stream in enumerate(streams)
+        ]
+        started = time.monotonic()
+        results = await executor.run_playbooks(kwargs, concurrency=concurrency)
+        wall = time.monotonic() - started
+
+    hosts = sum(len(result.stats) for result in results)
+    lines = sum(stream.lines for stream in streams)
+    volume = sum(stream.bytes for stream in streams)
+    children = [result.usage for result in results if result.usage]
+    return {
+        "runs": runs,
+        "concurrency": concurrency,
+        "simulator": sim.as_env(),
+        "ok": sum(1 for result in results if result.ok),
+        "failed": sum(1 for result in results if not result.ok),
+        "timed_out": sum(1 for result in results if result.timed_out),
+        "failed_hosts": sum(len(result.failed_hosts) for result in results),
+        "wall_time": round(wall, 3),
+        "throughput": {
+            "runs_per_second": round(runs / wall, 3) if wall else None,
+            "hosts_per_second": round(hosts / wall, 3) if wall else None,
+            "lines_per_second": round(lines / wall, 3) if wall else None,
+            "bytes_per_second": round(volume / wall, 3) if wall else None,
+        },
+        "latency": {
+            "run": percentiles([result.duration for result in results]),
+            # From the start of the child, excluding time queued for a slot
+            "first_output": percentiles(
+                [
+                    stream.first_line_at - result.started_at
+                    for stream, result in zip(streams, results)
+                    if stream.first_line_at is not None
+                ]
+            ),
+        },
+        "output": {"lines": lines, "bytes": volume},
+        "memory": {
+            "controller_peak_rss_kb": _peak_rss_kb(),
+            "run_peak_rss_kb": max(
+                (usage.max_rss_kb for usage in children), default=None
+            ),
+            # Only measured with a sample interval
+            "run_peak_tree_rss_kb": max(
+                (usage.peak_tree_rss_kb for usage in children), default=0
+            )
+            or None,
+        },
+    }
+
+
+def load_test(sim: simulator.SimulatorSettings, **kwargs) -> dict:
+    """
+    Run a load test and log its report.
+
+    Args:
+        sim: Shape of the simulated fleet of every run.
+        **kwargs: Options of `run_load_test`.
+
+    Returns:
+        dict: Report from `run_load_test`.
+    """
+    logger.info(
+        "Load test: %d runs of %d simulated hosts, %d at a time",
+        kwargs.get("runs", 10),
+        sim.hosts,
+        kwargs.get("concurrency", 10),
+    )
+    report = asyncio.run(run_load_test(sim, **kwargs))
+    logger.info(
+        "Load test finished: %d/%d runs ok in %.2fs, %s hosts/s, run p95 %ss",
+        report["ok"],
+        report["runs"],
+        report["wall_time"],
+        report["throughput"]["hosts_per_second"],
+        report["latency"]["run"]["p95"],
+        extra={"data": report},
+    )
+    return report
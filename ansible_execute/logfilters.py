@@ -0,0 +1,172 @@
+"""Filters that keep repetitive log records from flooding the handlers."""
+
+import atexit
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Templates tracked by the rate limiter before the least recent is forgotten
+MAX_TEMPLATES = 1024
+
+# Duplicate filters flushed at exit; weak so replaced handlers can go away
+_pending_flush = weakref.WeakSet()  # type: ignore[var-annotated]
+_flush_registered = False
+
+
+def _template_key(record: logging.LogRecord) -> Tuple[str, int, str]:
+    return record.name, record.levelno, str(record.msg)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token-bucket rate limit per message template (the unformatted msg)."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Initialize the filter.
+
+        Args:
+            rate: Records per second allowed for each template.
+            burst: Records a template may emit at once before it is limited.
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1, burst)
+        # template -> (tokens, last refill, suppressed since last pass)
+        self._buckets: "OrderedDict[tuple, List[float]]" = OrderedDict()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Pass the record if its template has a token left."""
+        now = time.monotonic()
+        key = _template_key(record)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now, 0]
+            self._buckets[key] = bucket
+            if len(self._buckets) > MAX_TEMPLATES:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = int(bucket[2])
+            bucket[2] = 0
+        return True
+
+
+class DuplicateFilter(logging.Filter):
+    """
+    Collapse consecutive identical records.
+
+    The first record passes; repeats are held back and reported as one copy
+    of the record carrying a `repeated` count once a different record
+    arrives (or on `flush`).
+    """
+
+    def __init__(self, handler: logging.Handler) -> None:
+        """
+        Initialize the filter.
+
+        Args:
+            handler: Handler the filter is attached to; receives the summary.
+        """
+        super().__init__()
+        self.handler = handler
+        self._last: Optional[logging.LogRecord] = None
+        self._last_key: Optional[tuple] = None
+        self._repeats = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Drop the record if it repeats the previous one."""
+        key = (record.name, record.levelno, record.getMessage())
+        if key == self._last_key:
+            self._repeats += 1
+            self._last = record
+            return False
+        self.flush()
+        self._last, self._last_key = record, key
+        return True
+
+    def flush(self) -> None:
+        """Emit the summary of held-back repeats, if any."""
+        if not self._repeats or self._last is None:
+            return
+        summary = logging.makeLogRecord(self._last.__dict__)
+        summary.repeated = self._repeats
+        self._repeats = 0
+        # Bypass the filters: the summary stands for records that passed them
+        self.handler.acquire()
+        try:
+            self.handler.emit(summary)
+        finally:
+            self.handler.release()
+
+
+class DebugSampler(logging.Filter):
+    """Pass a fixed fraction of DEBUG records, evenly spaced."""
+
+    def __init__(self, rate: float) -> None:
+        """
+        Initialize the filter.
+
+        Args:
+            rate: Fraction of DEBUG records to keep (0..1).
+        """
+        super().__init__()
+        self.rate = rate
+        self._credit = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Pass every non-DEBUG record and every 1/rate-th DEBUG record."""
+        if record.levelno > logging.DEBUG:
+            return True
+        self._credit += self.rate
+        if self._credit >= 1:
+            self._credit -= 1
+            return True
+        return False
+
+
+def attach_filters(handler: logging.Handler, settings: Optional[dict]) -> None:
+    """
+    Add the filters configured in `logging.filters` to a handler.
+
+    Sampling runs first so dropped DEBUG records do not use rate-limit tokens,
+    and deduplication runs last so it only sees records that will be written.
+
+    Args:
+        handler: Handler to filter.
+        settings: `logging.filters` config section.
+    """
+    settings = settings or {}
+    sample_rate = settings.get("debug_sample_rate", 1.0)
+    if sample_rate < 1:
+        handler.addFilter(DebugSampler(sample_rate))
+    rate = settings.get("rate_limit", 0)
+    if rate:
+        handler.addFilter(RateLimitFilter(rate, settings.get("rate_burst", 20)))
+    if settings.get("dedupe", False):
+        dedupe = DuplicateFilter(handler)
+        handler.addFilter(dedupe)
+        _flush_at_exit(dedupe)
+
+
+def _flush_at_exit(dedupe: DuplicateFilter) -> None:
+    global _flush_registered  # pylint: disable=global-statement
+    _pending_flush.add(dedupe)
+    if not _flush_registered:
+        # Runs before logging's own shutdown, which closes the handlers
+        atexit.register(_flush_all)
+        _flush_registered = True
+
+
+def _flush_all() -> None:
+    for dedupe in list(_pending_flush):
+        dedupe.flush()
@@ -1,17 +1,61 @@
 """Structured logging setup for ansible-execute CLI."""
 
+import contextlib
+import contextvars
 import logging
 import pathlib
 import json
 import os
 import time
 from datetime import datetime
-from typing import Optional
+from typing import Iterator, Optional
+
+from ansible_execute import logfilters
+from ansible_execute import vector as vector_handler
+
+# Environment of the run being executed; concurrent runs each set their own
+current_env = contextvars.ContextVar("ansible_execute_env", default=None)
+
+
+@contextlib.contextmanager
+def env_context(env: Optional[str]) -> Iterator[None]:
+    """
+    Stamp the records logged inside the block with an environment.
+
+    Args:
+        env: Environment name.
+    """
+    token = current_env.set(env)
+    try:
+        yield
+    finally:
+        current_env.reset(token)
+
+
+class _EnvFilter(logging.Filter):
+    """Records the environment of the current run on each record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "env", None) is None:
+            env = current_env.get()
+            if env is not None:
+                record.env = env
+        return True
 
 
 class JSONFormatter(logging.Formatter):
     """Format logs as JSON for Vector or other structured log systems."""
 
+    def __init__(self, env: Optional[str] = None) -> None:
+        """
+        Initialize the formatter.
+
+        Args:
+            env: Environment name added to every record, if given.
+        """
+        super().__init__()
+        self.env = env
+
     def format(self, record: logging.LogRecord) -> str:
         log_entry = {
             "timestamp": time.strftime(
@@ -23,6 +67,15 @@ class JSONFormatter(logging.Formatter):
             "line": record.lineno,
             "message": record.getMessage(),
         }
+        env = getattr(record, "env", None) or self.env
+        if env:
+            log_entry["env"] = env
+        for counter in ("repeated", "suppressed"):
+            if getattr(record, counter, None):
+                log_entry[counter] = getattr(record, counter)
+        data = getattr(record, "data", None)
+        if data is not None:
+            log_entry["data"] = data
         return json.dumps(log_entry)
 
 
@@ -31,20 +84,37 @@ def configure_logging(
     log_directory: Optional[pathlib.Path] = None,
     non_interactive: bool = False,
     enable_console: bool = True,
+    env: Optional[str] = None,
+    vector: Optional[dict] = None,
+    filters: Optional[dict] = None,
 ) -> None:
     """
-    Configure structured JSON logging to stdout and optional log file.
+    Configure structured JSON logging to stdout, optional log file and Vector.
 
     Args:
         verbosity: Verbosity level from CLI (-v, -vv, -vvv).
         log_directory: Path to log directory (required for non-interactive mode).
         non_interactive: Whether to suppress console output and force file logging.
         enable_console: If False, disables console output even in interactive mode.
+        env: Environment name stamped on records logged outside `env_context`.
+        vector: `logging.vector` config section; records are also shipped to
+            Vector's socket source if it sets an address.
+        filters: `logging.filters` config section (rate limiting, duplicate
+            collapsing and DEBUG sampling), applied to every handler.
+
+    Raises:
+        ConfigError: If the Vector settings are invalid; no handler is added.
+        ValueError: In non-interactive mode without a log directory.
     """
+    # Fail before adding any handler, so a caller can retry without duplicates
+    if non_interactive and not log_directory:
+        raise ValueError("In non-interactive mode, a log directory must be provided.")
+    socket_handler = vector_handler.from_settings(vector or {})
+
     level = _verbosity_to_level(verbosity)
     logger = logging.getLogger()
     logger.setLevel(level)
-    formatter = JSONFormatter()
+    formatter = JSONFormatter(env=env)
 
     os.environ["ANSIBLE_EXECUTE_LOG_DIR"] = str(log_directory)
     os.environ["ANSIBLE_EXECUTE_VERBOSITY"] = str(verbosity)
@@ -54,12 +124,10 @@ def configure_logging(
         stream_handler = logging.StreamHandler()
         stream_handler.setFormatter(formatter)
         stream_handler.setLevel(level)
+        stream_handler.addFilter(_EnvFilter())
+        logfilters.attach_filters(stream_handler, filters)
         logger.addHandler(stream_handler)
 
-    # File logging is required in non-interactive mode
-    if non_interactive and not log_directory:
-        raise ValueError("In non-interactive mode, a log directory must be provided.")
-
     if log_directory:
         log_directory.mkdir(parents=True, exist_ok=True)
         date_str = datetime.now().strftime("%Y-%m-%d")
@@ -69,8 +137,17 @@ def configure_logging(
         file_handler = logging.FileHandler(log_path, encoding="utf-8")
         file_handler.setFormatter(formatter)
         file_handler.setLevel(level)
+        file_handler.addFilter(_EnvFilter())
+        logfilters.attach_filters(file_handler, filters)
         logger.addHandler(file_handler)
 
+    if socket_handler:
+        socket_handler.setFormatter(formatter)
+        socket_handler.setLevel(level)
+        socket_handler.addFilter(_EnvFilter())
+        logfilters.attach_filters(socket_handler, filters)
+        logger.addHandler(socket_handler)
+
 
 def _verbosity_to_level(verbosity: int) -> int:
     """
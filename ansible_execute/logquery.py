@@ -0,0 +1,323 @@
+"""Indexed queries over the daily JSON log files."""
+
+import json
+import logging
+import mmap
+import pathlib
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ansible_execute import utils
+
+logger = logging.getLogger(__name__)
+
+LOG_GLOB = "*_ansible-execute.log"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+# Records per index block; a query reads whole blocks that may match
+BLOCK_RECORDS = 512
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def parse_time(value: Optional[str], end: bool = False) -> Optional[str]:
+    """
+    Normalise a CLI time bound to the timestamp format used in the logs.
+
+    Args:
+        value: `YYYY-MM-DD` or `YYYY-MM-DDTHH:MM[:SS]`, or None.
+        end: Expand a bare date to the end of that day instead of the start.
+
+    Returns:
+        Optional[str]: Timestamp comparable with the `timestamp` log field.
+    """
+    if not value:
+        return None
+    for fmt in (TIME_FORMAT, "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end:
+            return parsed.strftime("%Y-%m-%dT23:59:59")
+        return parsed.strftime(TIME_FORMAT)
+    raise ValueError(f"Invalid time '{value}', expected YYYY-MM-DD[THH:MM:SS]")
+
+
+class LogQuery:
+    """Filters applied to log records."""
+
+    def __init__(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        level: Optional[str] = None,
+        env: Optional[str] = None,
+        contains: Optional[str] = None,
+    ) -> None:
+        """
+        Initialize the filters; every filter left as None matches everything.
+
+        Args:
+            since: Earliest timestamp (inclusive).
+            until: Latest timestamp (inclusive).
+            level: Minimum level name.
+            env: Environment name.
+            contains: Substring of the message.
+        """
+        self.since = since
+        self.until = until
+        self.levels = set(LEVELS[LEVELS.index(level) :]) if level else None
+        self.env = env
+        self.contains = contains
+
+    def skips_file(self, path: pathlib.Path) -> bool:
+        """
+        Whether no record of a log file can lie within the time range.
+
+        A file is named after the day its process started, but the process
+        keeps writing to it past midnight. So only `until` is checked against
+        the name; `since` is checked against the time of the last write.
+        """
+        day = path.name.split("_", 1)[0]
+        if self.until and day > self.until[:10]:
+            return True
+        if not self.since:
+            return False
+        try:
+            modified = time.localtime(path.stat().st_mtime)
+        except OSError:
+            return False
+        return time.strftime(TIME_FORMAT, modified) < self.since
+
+    def skips_block(self, block: dict) -> bool:
+        """Whether no record summarised by an index block can match."""
+        if self.since and block["last"] < self.since:
+            return True
+        if self.until and block["first"] > self.until:
+            return True
+        if self.levels is not None and not self.levels.intersection(block["levels"]):
+            return True
+        return self.env is not None and self.env not in block["envs"]
+
+    def matches(self, record: dict) -> bool:
+        """Whether a single parsed record matches every filter."""
+        timestamp = record.get("timestamp", "")
+        if self.since and timestamp < self.since:
+            return False
+        if self.until and timestamp > self.until:
+            return False
+        if self.levels is not None and record.get("level") not in self.levels:
+            return False
+        if self.env is not None and record.get("env") != self.env:
+            return False
+        return not (self.contains and self.contains not in record.get("message", ""))
+
+
+def _parse(line: bytes) -> Optional[dict]:
+    """Parse one log line, returning None for anything that is not a record."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _index_path(log_path: pathlib.Path) -> pathlib.Path:
+    return log_path.with_name(log_path.name + INDEX_SUFFIX)
+
+
+def update_index(log_path: pathlib.Path) -> List[dict]:
+    """
+    Bring the sidecar index of a log file up to date and return its blocks.
+
+    Only bytes appended since the last update are scanned. Each block records
+    its byte range, first and last timestamp, and the levels and envs seen.
+
+    Args:
+        log_path: Daily JSON log file.
+
+    Returns:
+        List[dict]: Index blocks in file order.
+    """
+    index_path = _index_path(log_path)
+    size = log_path.stat().st_size
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        if index.get("version") != INDEX_VERSION or index["size"] > size:
+            raise ValueError("stale index")
+    except (OSError, ValueError, KeyError):
+        index = {"version": INDEX_VERSION, "size": 0, "blocks": []}
+
+    if index["size"] == size or size == 0:
+        return index["blocks"]
+
+    blocks: List[dict] = index["blocks"]
+    # Re-scan the last block, which may not have been full
+    start = blocks.pop()["start"] if blocks else 0
+
+    with log_path.open("rb") as f, mmap.mmap(
+        f.fileno(), size, access=mmap.ACCESS_READ
+    ) as data:
+        block: Optional[dict] = None
+        offset = start
+        while offset < size:
+            newline = data.find(b"\n", offset, size)
+            if newline == -1:
+                break  # partial record still being written
+            record = _parse(data[offset:newline])
+            if block is None or block["count"] >= BLOCK_RECORDS:
+                block = {
+                    "start": offset,
+                    "end": offset,
+                    "first": None,
+                    "last": None,
+                    "levels": [],
+                    "envs": [],
+                    "count": 0,
+                }
+                blocks.append(block)
+            offset = newline + 1
+            block["end"] = offset
+            block["count"] += 1
+            if record is None:
+                continue
+            timestamp = record.get("timestamp", "")
+            block["first"] = min(block["first"] or timestamp, timestamp)
+            block["last"] = max(block["last"] or timestamp, timestamp)
+            if record.get("level") not in block["levels"]:
+                block["levels"].append(record.get("level"))
+            if record.get("env") and record["env"] not in block["envs"]:
+                block["envs"].append(record["env"])
+
+    for block in blocks:
+        block["first"] = block["first"] or ""
+        block["last"] = block["last"] or ""
+    index["size"] = blocks[-1]["end"] if blocks else 0
+    index["blocks"] = blocks
+    try:
+        utils.write_json_atomic(index_path, index)
+    except OSError as exc:
+        logger.debug("Could not write log index %s: %s", index_path, exc)
+    return blocks
+
+
+def query_file(log_path: pathlib.Path, query: LogQuery) -> Iterator[str]:
+    """
+    Yield matching lines of one log file, reading only candidate blocks.
+
+    Args:
+        log_path: Daily JSON log file.
+        query: Filters to apply.
+
+    Yields:
+        str: Matching raw JSON lines.
+    """
+    blocks = update_index(log_path)
+    candidates = [block for block in blocks if not query.skips_block(block)]
+    if not candidates:
+        return
+
+    with log_path.open("rb") as f, mmap.mmap(
+        f.fileno(), candidates[-1]["end"], access=mmap.ACCESS_READ
+    ) as data:
+        for block in candidates:
+            yield from _matching(
+                data[block["start"] : block["end"]].splitlines(), query
+            )
+
+
+def log_files(directory: pathlib.Path) -> List[pathlib.Path]:
+    """Return the daily log files in a directory, oldest first."""
+    return sorted(directory.glob(LOG_GLOB))
+
+
+def search(
+    directory: pathlib.Path,
+    query: LogQuery,
+    follow: bool = False,
+    poll_interval: float = 0.5,
+) -> Iterator[str]:
+    """
+    Yield matching lines from every log file in `directory`.
+
+    With `follow`, keeps polling the newest file (switching to the next day's
+    file when it appears) and yields matching records as they are appended.
+
+    Args:
+        directory: Log directory.
+        query: Filters to apply.
+        follow: Keep waiting for new records.
+        poll_interval: Seconds between checks for new data while following.
+
+    Yields:
+        str: Matching raw JSON lines.
+    """
+    files = log_files(directory)
+    for path in files:
+        if not query.skips_file(path):
+            yield from query_file(path, query)
+
+    if not follow:
+        return
+
+    current = files[-1] if files else None
+    offset = _indexed_size(current) if current else 0
+    pending = b""
+    while True:
+        newest = log_files(directory)
+        rotated = bool(newest) and newest[-1] != current
+        if current is not None:
+            lines, offset, pending = _read_appended(current, offset, pending)
+            yield from _matching(lines, query)
+        if rotated:
+            # Drained the old file above; start the new day's file from the top
+            current, offset, pending = newest[-1], 0, b""
+            continue
+        time.sleep(poll_interval)
+
+
+def _indexed_size(path: pathlib.Path) -> int:
+    """Byte offset up to which `path` has been indexed (complete lines only)."""
+    blocks = update_index(path)
+    return blocks[-1]["end"] if blocks else 0
+
+
+def _read_appended(
+    path: pathlib.Path, offset: int, pending: bytes
+) -> Tuple[List[bytes], int, bytes]:
+    """
+    Read complete lines appended to `path` since `offset`.
+
+    Args:
+        path: Log file being followed.
+        offset: Byte offset already consumed.
+        pending: Incomplete trailing line from the previous read.
+
+    Returns:
+        Tuple[List[bytes], int, bytes]: New lines, new offset and the new
+        incomplete trailing line.
+    """
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return [], offset, pending
+    if size < offset:
+        offset, pending = 0, b""  # truncated
+    if size == offset:
+        return [], offset, pending
+
+    with path.open("rb") as f:
+        f.seek(offset)
+        chunk = pending + f.read(size - offset)
+    *lines, pending = chunk.split(b"\n")
+    return lines, size, pending
+
+
+def _matching(lines: Iterable[bytes], query: LogQuery) -> Iterator[str]:
+    """Yield the lines whose parsed record matches `query`."""
+    for line in lines:
+        record = _parse(line)
+        if record is not None and query.matches(record):
+            yield line.decode("utf-8", errors="replace")
@@ -1,9 +1,37 @@
 """Entry point for Ansible execution tool."""
 
+import asyncio
+import json
 import logging
+import os
+import pathlib
+import sys
+from argparse import Namespace
+from typing import Callable, List, Optional
+
 import yaml
 
-from ansible_execute import cli, executor, logger as log_setup, utils
+from ansible_execute import (
+    changes,
+    checkpoints,
+    checks,
+    cli,
+    distributed,
+    exceptions,
+    executor,
+    extravars,
+    failures,
+    inventory,
+    loadtest,
+    logger as log_setup,
+    logquery,
+    preflight,
+    rollout,
+    sharding,
+    simulator,
+    utils,
+    watcher,
+)
 
 
 def main() -> None:
@@ -12,10 +40,12 @@ def main() -> None:
 
     # Always try to load config first
     config = None
+    settings: dict = {}
     log_dir = None
     try:
         config = utils.Config(config_path=args.config)
-        log_dir_value = config.config_data.get("logging", {}).get("dir")
+        settings = config.for_env(args.env) if args.env else config.config_data
+        log_dir_value = settings.get("logging", {}).get("dir")
         if log_dir_value:
             log_dir = utils.pathlib.Path(log_dir_value)
     except (utils.exceptions.ConfigError, FileNotFoundError, yaml.YAMLError, OSError):
@@ -23,16 +53,42 @@ def main() -> None:
         pass
 
     # Configure structured logging based on CLI args and/or config
-    log_setup.configure_logging(
-        verbosity=args.verbose,
-        log_directory=log_dir,
-        non_interactive=getattr(args, "non_interactive", False),
-    )
+    logging_options = {
+        "verbosity": args.verbose,
+        "log_directory": log_dir,
+        "non_interactive": getattr(args, "non_interactive", False),
+        # With several -e, each run stamps its own records instead
+        "env": (
+            args.env if len(getattr(args, "envs", None) or [args.env]) == 1 else None
+        ),
+        "filters": settings.get("logging", {}).get("filters"),
+    }
+    try:
+        log_setup.configure_logging(
+            vector=_vector_settings(settings), **logging_options
+        )
+    except utils.exceptions.ConfigError as exc:
+        log_setup.configure_logging(**logging_options)
+        logging.getLogger(__name__).error("Invalid logging config: %s", exc)
+        raise SystemExit(1) from exc
     logger = logging.getLogger(__name__)
 
     for key, value in vars(args).items():
         logger.debug(f"Arg {key}: {value}")
 
+    # Handle subcommands
+    if getattr(args, "command", None) == "logs":
+        _query_logs(args, log_dir)
+        return
+
+    if getattr(args, "command", None) == "load-test":
+        _load_test(args, settings)
+        return
+
+    if getattr(args, "command", None) == "resume":
+        _resume(args, settings)
+        return
+
     # Handle --generate-config
     if args.generate_config:
         logger.info(f"Generating default config at: {args.generate_config}")
@@ -46,14 +102,633 @@ def main() -> None:
         logger.info("Configuration is valid.")
         return
 
+    envs = getattr(args, "envs", None) or [args.env]
+    playbooks = getattr(args, "playbooks", None) or [args.playbook]
+
+    if getattr(args, "command", None) == "coordinator":
+        _coordinate(args, config, envs, playbooks, settings)
+        return
+
+    if getattr(args, "command", None) == "agent":
+        _agent(args, config, settings)
+        return
+
+    if getattr(args, "watch", False):
+        _watch(args, config, envs, playbooks, settings)
+        return
+
     # Normal execution path
     if not args.test:
         logger.info("Running Ansible playbook...")
-        executor.run_ansible_playbook(
-            env=args.env, verbosity=args.verbose, playbook=args.playbook
-        )
+        for env in envs:
+            for playbook in playbooks:
+                target = Namespace(**{**vars(args), "env": env, "playbook": playbook})
+                with log_setup.env_context(env):
+                    _run_playbook(target, _settings_for(config, env, settings))
     else:
-        logger.info(f"Test mode enabled, skipping playbook execution for {args.env}.")
+        logger.info(f"Test mode enabled, validating playbooks for {', '.join(envs)}.")
+        _run_checks(args, config, envs, playbooks, settings)
+
+
+def _vector_settings(settings: dict) -> dict:
+    """Return `logging.vector`, spooling below the state dir by default."""
+    vector = dict(settings.get("logging", {}).get("vector") or {})
+    if vector.get("address") and not vector.get("spool_dir"):
+        vector["spool_dir"] = str(utils.state_dir(settings) / "vector-spool")
+    return vector
+
+
+def _settings_for(config: Optional[utils.Config], env: str, fallback: dict) -> dict:
+    """Return the config resolved for `env`, or `fallback` without a config."""
+    return config.for_env(env) if config else fallback
+
+
+def _run_checks(
+    args: Namespace,
+    config: Optional[utils.Config],
+    envs: List[str],
+    playbooks: List[str],
+    settings: dict,
+) -> None:
+    """
+    Syntax-check and list the tasks of every requested env and playbook.
+
+    Args:
+        args: Parsed CLI arguments.
+        config: Loaded config, if any.
+        envs: Environments to validate.
+        playbooks: Playbooks to validate.
+        settings: Config resolved for `args.env`.
+    """
+    concurrency = settings.get("testing", {}).get("concurrency") or os.cpu_count()
+    try:
+        results = asyncio.run(
+            checks.run_checks(
+                [(env, playbook) for env in envs for playbook in playbooks],
+                _check_cache_dirs(config, settings),
+                concurrency=concurrency or 1,
+                verbosity=args.verbose,
+                settings_for=lambda env: _settings_for(config, env, settings),
+            )
+        )
+    except exceptions.ConfigError as exc:
+        logging.getLogger(__name__).error("Could not build extra-vars: %s", exc)
+        raise SystemExit(1) from exc
+    if not _report_checks(results):
+        raise SystemExit(1)
+
+
+def _check_cache_dirs(
+    config: Optional[utils.Config], settings: dict
+) -> Callable[[str], Optional[pathlib.Path]]:
+    """Return a function mapping an environment to its check cache directory."""
+
+    def cache_dir_for(env: str) -> Optional[pathlib.Path]:
+        env_settings = _settings_for(config, env, settings)
+        if not env_settings.get("testing", {}).get("cache", True):
+            return None
+        return utils.state_dir(env_settings) / "checks"
+
+    return cache_dir_for
+
+
+def _report_checks(results: List[checks.CheckResult]) -> bool:
+    """Log the outcome of every check and return whether all passed."""
+    logger = logging.getLogger(__name__)
+    for result in results:
+        if result.ok:
+            logger.info(
+                "Checks passed for %s/%s in %.2fs%s",
+                result.env,
+                result.playbook,
+                result.duration,
+                " (cached)" if result.cached else "",
+            )
+        else:
+            logger.error(
+                "Checks failed for %s/%s:\n%s",
+                result.env,
+                result.playbook,
+                "\n".join(result.output),
+            )
+    return all(result.ok for result in results)
+
+
+def _watch(
+    args: Namespace,
+    config: Optional[utils.Config],
+    envs: List[str],
+    playbooks: List[str],
+    settings: dict,
+) -> None:
+    """
+    Run (or, with --test, validate) the playbooks again on every file change.
+
+    Args:
+        args: Parsed CLI arguments.
+        config: Loaded config, if any.
+        envs: Environments to run.
+        playbooks: Playbooks to run.
+        settings: Config resolved for `args.env`.
+    """
+    logger = logging.getLogger(__name__)
+    if not watcher.WATCH_ROOT.is_dir():
+        logger.error("Nothing to watch: %s is not a directory", watcher.WATCH_ROOT)
+        raise SystemExit(1)
+    watch_settings = settings.get("watch", {})
+    targets = [(env, playbook) for env in envs for playbook in playbooks]
+
+    async def run_once() -> None:
+        if args.test:
+            concurrency = settings.get("testing", {}).get("concurrency")
+            try:
+                results = await checks.run_checks(
+                    targets,
+                    _check_cache_dirs(config, settings),
+                    concurrency=concurrency or os.cpu_count() or 1,
+                    verbosity=args.verbose,
+                    settings_for=lambda env: _settings_for(config, env, settings),
+                )
+            except exceptions.ConfigError as exc:
+                logger.error("Could not build extra-vars: %s", exc)
+                return
+            _report_checks(results)
+        else:
+            for env, playbook in targets:
+                env_settings = _settings_for(config, env, settings)
+                execution = env_settings.get("execution", {})
+                try:
+                    vars_file = extravars.bundle(env, env_settings)
+                except exceptions.ConfigError as exc:
+                    logger.error("Could not build extra-vars: %s", exc)
+                    continue
+                result = await executor.run_playbook(
+                    env,
+                    playbook,
+                    verbosity=args.verbose,
+                    forks=execution.get("forks"),
+                    timeout=execution.get("timeout"),
+                    on_output=executor.echo_output,
+                    sample_interval=env_settings.get("resources", {}).get(
+                        "sample_interval", 0
+                    ),
+                    admission=env_settings.get("admission"),
+                    extra_vars_file=vars_file,
+                    context_lines=env_settings.get("failures", {}).get(
+                        "context_lines", 50
+                    ),
+                    failure_dir=failures.report_dir(env_settings),
+                )
+                if result.ok:
+                    logger.info("Playbook %s succeeded for %s", playbook, env)
+                else:
+                    logger.error(
+                        "Playbook %s failed for %s with exit code %d",
+                        playbook,
+                        env,
+                        result.exit_code,
+                    )
+        logger.info("Waiting for changes...")
+
+    try:
+        asyncio.run(
+            watcher.watch_and_run(
+                watcher.WATCH_ROOT,
+                run_once,
+                debounce=watch_settings.get("debounce", 0.5),
+                backend=watch_settings.get("backend", "auto"),
+                poll_interval=watch_settings.get("poll_interval", 1.0),
+            )
+        )
+    except KeyboardInterrupt:
+        logger.info("Watch mode stopped")
+
+
+def _coordinate(
+    args: Namespace,
+    config: Optional[utils.Config],
+    envs: List[str],
+    playbooks: List[str],
+    settings: dict,
+) -> None:
+    """
+    Distribute the requested runs to worker agents and report the results.
+
+    Args:
+        args: Parsed CLI arguments.
+        config: Loaded config, if any.
+        envs: Environments to run.
+        playbooks: Playbooks to run.
+        settings: Config resolved for `args.env`.
+    """
+    logger = logging.getLogger(__name__)
+    dist = settings.get("distributed", {})
+    if not dist.get("token"):
+        logger.error("A shared token is required (set distributed.token)")
+        raise SystemExit(1)
+    targets = []
+    for env in envs:
+        env_settings = _settings_for(config, env, settings)
+        env_args = Namespace(**{**vars(args), "env": env})
+        try:
+            hosts = (
+                _env_hosts(env_args, env_settings)
+                if dist.get("split_hosts", True)
+                else None
+            )
+            extra_vars = extravars.collect(env, env_settings)
+        except (exceptions.InventoryError, exceptions.ConfigError) as exc:
+            logger.error("Cannot distribute %s: %s", env, exc)
+            raise SystemExit(1) from exc
+        targets.extend(
+            distributed.Target(env, playbook, hosts, extra_vars)
+            for playbook in playbooks
+        )
+
+    execution = settings.get("execution", {})
+    try:
+        coordinator = distributed.Coordinator(
+            targets,
+            token=dist["token"],
+            min_chunk=dist.get("min_chunk", 1),
+            max_chunk=dist.get("max_chunk", 0),
+            max_attempts=dist.get("max_attempts", 2),
+            job_options={
+                "verbosity": args.verbose,
+                "forks": execution.get("forks"),
+                "timeout": execution.get("timeout"),
+            },
+            on_output=executor.echo_output,
+        )
+        results = asyncio.run(
+            coordinator.run(
+                args.listen or dist.get("listen", distributed.DEFAULT_LISTEN)
+            )
+        )
+    except (exceptions.DistributedError, OSError, ValueError) as exc:
+        logger.error("Distributed run failed: %s", exc)
+        raise SystemExit(1) from exc
+
+    failed = [result for result in results.values() if not result.ok]
+    for result in failed:
+        logger.error(
+            "Playbook %s failed for %s on %d hosts: %s",
+            result.playbook,
+            result.env,
+            len(result.failed_hosts),
+            ", ".join(result.failed_hosts) or result.error or "no recap",
+        )
+    if failed:
+        raise SystemExit(max((result.exit_code for result in failed), key=abs) or 1)
+    logger.info("Distributed run finished on %d agents", len(coordinator.agents))
+
+
+def _agent(args: Namespace, config: Optional[utils.Config], settings: dict) -> None:
+    """
+    Work for a coordinator until it has no more jobs.
+
+    Args:
+        args: Parsed CLI arguments.
+        config: Loaded config, if any.
+        settings: Config resolved for `args.env`.
+    """
+    logger = logging.getLogger(__name__)
+    dist = settings.get("distributed", {})
+    address = args.coordinator or dist.get("coordinator")
+    if not address:
+        logger.error(
+            "No coordinator address (use --coordinator or set distributed.coordinator)"
+        )
+        raise SystemExit(1)
+    if not dist.get("token"):
+        logger.error("A shared token is required (set distributed.token)")
+        raise SystemExit(1)
+    try:
+        jobs = asyncio.run(
+            distributed.run_agent(
+                address,
+                name=args.agent_name,
+                token=dist["token"],
+                settings_for=lambda env: _settings_for(config, env, settings),
+                on_output=executor.echo_output,
+            )
+        )
+    except exceptions.DistributedError as exc:
+        logger.error("Agent stopped: %s", exc)
+        raise SystemExit(1) from exc
+    logger.info("Coordinator is done after %d jobs on this agent", jobs)
+
+
+def _run_playbook(args: Namespace, settings: dict) -> None:
+    """
+    Run the requested playbook for one environment.
+
+    Args:
+        args: Parsed CLI arguments.
+        settings: Config resolved for `args.env`.
+    """
+    logger = logging.getLogger(__name__)
+    execution = settings.get("execution", {})
+    preflight_settings = settings.get("preflight", {})
+    sample_interval = settings.get("resources", {}).get("sample_interval", 0)
+    try:
+        vars_file = extravars.bundle(args.env, settings)
+    except exceptions.ConfigError as exc:
+        logger.error("Could not build extra-vars: %s", exc)
+        raise SystemExit(1) from exc
+
+    plan = None
+    tags = None
+    if getattr(args, "changed_only", False) or execution.get("changed_only"):
+        try:
+            hosts = _env_hosts(args, settings)
+        except exceptions.InventoryError as exc:
+            logger.warning("Could not resolve the hosts of %s: %s", args.env, exc)
+            hosts = None
+        plan = changes.plan(args.env, args.playbook, settings, vars_file, hosts)
+        if plan.up_to_date:
+            logger.info(
+                "No changes to %s for %s since the last successful run, skipping",
+                args.playbook,
+                args.env,
+            )
+            return
+        if plan.tags is None:
+            logger.info("Running all of %s: %s", args.playbook, plan.reason)
+        else:
+            tags = plan.tags
+            logger.info(
+                "%d files changed, running %s with tags: %s",
+                len(plan.changed),
+                args.playbook,
+                ", ".join(tags),
+            )
+
+    limit = None
+    if getattr(args, "preflight", False) or preflight_settings.get("enabled"):
+        try:
+            limit = preflight.run_preflight(
+                args.env,
+                preflight_settings,
+                inv=_resolve_inventory(args, settings),
+            )
+        except (
+            exceptions.PreflightError,
+            exceptions.InventoryError,
+            exceptions.ConfigError,
+        ) as exc:
+            logger.error("Pre-flight check failed: %s", exc)
+            raise SystemExit(1) from exc
+
+    if getattr(args, "rolling", False):
+        try:
+            hosts = limit or _env_hosts(args, settings)
+            state = rollout.run_rollout(
+                args.env,
+                args.playbook,
+                hosts,
+                settings,
+                verbosity=args.verbose,
+                tags=tags,
+            )
+        except (
+            exceptions.RolloutError,
+            exceptions.InventoryError,
+            exceptions.ConfigError,
+        ) as exc:
+            logger.error("Rollout failed: %s", exc)
+            raise SystemExit(1) from exc
+        if not state.failed:
+            _record_success(args, settings, plan, limit)
+        return
+
+    shards = getattr(args, "shards", None) or execution.get("shards", 1)
+    if shards > 1:
+        try:
+            hosts = limit or _env_hosts(args, settings)
+            result = asyncio.run(
+                sharding.run_sharded(
+                    args.env,
+                    args.playbook,
+                    hosts,
+                    shards,
+                    utils.state_dir(settings) / "shards" / args.env,
+                    verbosity=args.verbose,
+                    forks=execution.get("forks"),
+                    timeout=execution.get("timeout"),
+                    on_output=executor.echo_output,
+                    sample_interval=sample_interval,
+                    admission=settings.get("admission"),
+                    extra_vars_file=vars_file,
+                    tags=tags,
+                    context_lines=settings.get("failures", {}).get("context_lines", 50),
+                    failure_dir=failures.report_dir(settings),
+                )
+            )
+        except exceptions.InventoryError as exc:
+            logger.error("Sharded run failed: %s", exc)
+            raise SystemExit(1) from exc
+        executor.check_result(result)
+        _record_success(args, settings, plan, limit)
+        return
+
+    executor.run_ansible_playbook(
+        env=args.env,
+        verbosity=args.verbose,
+        playbook=args.playbook,
+        forks=execution.get("forks"),
+        timeout=execution.get("timeout"),
+        limit=limit,
+        sample_interval=sample_interval,
+        admission=settings.get("admission"),
+        extra_vars_file=vars_file,
+        tags=tags,
+        context_lines=settings.get("failures", {}).get("context_lines", 50),
+        failure_dir=failures.report_dir(settings),
+        checkpoint=checkpoints.Checkpoint(
+            checkpoints.checkpoint_path(settings, args.env, args.playbook),
+            args.env,
+            args.playbook,
+            checkpoints.fingerprint(
+                plan.snapshot
+                if plan
+                else changes.take_snapshot(args.playbook, vars_file)
+            ),
+            limit=limit,
+            tags=tags,
+        ),
+    )
+    _record_success(args, settings, plan, limit)
+
+
+def _resume(args: Namespace, settings: dict) -> None:
+    """
+    Restart a failed run from its checkpoint.
+
+    Only the hosts that did not finish are run, starting at the earliest
+    task one of them failed at. Resuming is refused if the playbook, its
+    dependencies or its extra-vars changed since the checkpoint, unless
+    --force is given.
+
+    Args:
+        args: Parsed CLI arguments.
+        settings: Config resolved for `args.env`.
+    """
+    logger = logging.getLogger(__name__)
+    path = checkpoints.checkpoint_path(settings, args.env, args.playbook)
+    saved = checkpoints.Checkpoint.load(path)
+    if saved is None:
+        logger.error("No checkpoint to resume for %s/%s", args.env, args.playbook)
+        raise SystemExit(1)
+    try:
+        vars_file = extravars.bundle(args.env, settings)
+    except exceptions.ConfigError as exc:
+        logger.error("Could not build extra-vars: %s", exc)
+        raise SystemExit(1) from exc
+
+    fingerprint = checkpoints.fingerprint(
+        changes.take_snapshot(args.playbook, vars_file)
+    )
+    if fingerprint != saved.fingerprint:
+        if not args.force:
+            logger.error(
+                "%s or its vars changed since the checkpoint; run it in full "
+                "or resume with --force",
+                args.playbook,
+            )
+            raise SystemExit(1)
+        logger.warning(
+            "%s changed since the checkpoint, resuming anyway", args.playbook
+        )
+
+    logger.info(
+        "Resuming %s for %s on %s from %s",
+        args.playbook,
+        args.env,
+        ", ".join(saved.hosts) if saved.hosts is not None else "all hosts",
+        f"task '{saved.start_at}'" if saved.start_at else "the first task",
+    )
+    execution = settings.get("execution", {})
+    executor.run_ansible_playbook(
+        env=args.env,
+        verbosity=args.verbose,
+        playbook=args.playbook,
+        forks=execution.get("forks"),
+        timeout=execution.get("timeout"),
+        limit=saved.hosts,
+        sample_interval=settings.get("resources", {}).get("sample_interval", 0),
+        admission=settings.get("admission"),
+        extra_vars_file=vars_file,
+        tags=saved.tags,
+        extra_args=["--start-at-task", saved.start_at] if saved.start_at else None,
+        context_lines=settings.get("failures", {}).get("context_lines", 50),
+        failure_dir=failures.report_dir(settings),
+        checkpoint=checkpoints.Checkpoint(
+            path,
+            args.env,
+            args.playbook,
+            fingerprint,
+            limit=saved.hosts,
+            tags=saved.tags,
+        ),
+    )
+
+
+def _record_success(
+    args: Namespace,
+    settings: dict,
+    plan: Optional[changes.ChangePlan],
+    limit: Optional[List[str]],
+) -> None:
+    """
+    Remember the dependencies of a successful --changed-only run.
+
+    Runs limited to part of the environment are not recorded, since the
+    hosts left out have not received the changes.
+
+    Args:
+        args: Parsed CLI arguments.
+        settings: Config resolved for `args.env`.
+        plan: Change plan of the run; None outside --changed-only.
+        limit: Hosts the run was limited to, if any.
+    """
+    if plan is None:
+        return
+    if limit is not None:
+        hosts = plan.snapshot.get("hosts")
+        if hosts is None or set(hosts) - set(limit):
+            return
+    changes.save_snapshot(
+        changes.snapshot_path(settings, args.env, args.playbook), plan.snapshot
+    )
+
+
+def _load_test(args: Namespace, settings: dict) -> None:
+    """
+    Run a load test against the simulator and print its report as JSON.
+
+    Args:
+        args: Parsed CLI arguments.
+        settings: Config resolved for `args.env`, for forks and timeout.
+    """
+    execution = settings.get("execution", {})
+    report = loadtest.load_test(
+        simulator.SimulatorSettings(
+            hosts=args.hosts,
+            tasks=args.tasks,
+            latency=args.latency,
+            fail_rate=args.fail_rate,
+            unreachable_rate=args.unreachable_rate,
+            output_bytes=args.output_bytes,
+            seed=args.seed,
+        ),
+        runs=args.runs,
+        concurrency=args.concurrency,
+        forks=execution.get("forks"),
+        timeout=execution.get("timeout"),
+        sample_interval=settings.get("resources", {}).get("sample_interval", 0),
+    )
+    sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    sys.stdout.flush()
+
+
+def _query_logs(args: Namespace, log_dir: Optional[pathlib.Path]) -> None:
+    """
+    Print log records matching the `logs` subcommand filters.
+
+    Args:
+        args: Parsed CLI arguments.
+        log_dir: Log directory from the config, used if --dir is not given.
+    """
+    directory = args.log_dir or log_dir
+    if not directory:
+        logging.getLogger(__name__).error(
+            "No log directory given (use --dir or set logging.dir)"
+        )
+        raise SystemExit(1)
+
+    query = logquery.LogQuery(
+        since=args.since,
+        until=args.until,
+        level=args.log_level,
+        env=args.log_env,
+        contains=args.contains,
+    )
+    for line in logquery.search(directory, query, follow=args.follow):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def _resolve_inventory(args: Namespace, settings: dict) -> inventory.Inventory:
+    """Resolve the (cached) inventory, honouring --refresh-inventory."""
+    return inventory.resolve(
+        settings, refresh=getattr(args, "refresh_inventory", False)
+    )
+
+
+def _env_hosts(args: Namespace, settings: dict) -> List[str]:
+    """Return every inventory host of the requested environment."""
+    return _resolve_inventory(args, settings).hosts_for(args.env)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,345 @@
+"""Playbook locations and the files a playbook depends on."""
+
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+ANSIBLE_ROOT = pathlib.Path("ansible")
+PLAYBOOK_DIR = ANSIBLE_ROOT / "playbooks"
+
+PLAYBOOK_IMPORTS = (
+    "import_playbook",
+    "include_playbook",
+    "ansible.builtin.import_playbook",
+)
+TASK_IMPORTS = (
+    "include_tasks",
+    "import_tasks",
+    "include",
+    "ansible.builtin.include_tasks",
+    "ansible.builtin.import_tasks",
+)
+ROLE_IMPORTS = (
+    "include_role",
+    "import_role",
+    "ansible.builtin.include_role",
+    "ansible.builtin.import_role",
+)
+TASK_SECTIONS = ("pre_tasks", "tasks", "post_tasks", "handlers")
+BLOCK_SECTIONS = ("block", "rescue", "always")
+# Files outside roles that influence how every playbook is parsed
+SHARED_PATHS = ("ansible.cfg", "group_vars", "host_vars", "library", "filter_plugins")
+
+# Tags inherited by the tasks of an import; None when the tasks cannot be
+# selected with --tags (dynamic includes do not pass their tags on)
+Tags = Optional[FrozenSet[str]]
+
+
+def playbook_path(name: str) -> pathlib.Path:
+    """
+    Return the path of a playbook by name.
+
+    Args:
+        name: Playbook name without extension (e.g. master).
+
+    Returns:
+        pathlib.Path: ansible/playbooks/<name>.yml
+    """
+    return PLAYBOOK_DIR / f"{name}.yml"
+
+
+class _Loader(yaml.SafeLoader):
+    """Safe loader that tolerates Ansible's custom tags such as !vault."""
+
+
+def _ignore_tag(loader: yaml.SafeLoader, suffix: str, node: yaml.Node):
+    # pylint: disable=unused-argument
+    if isinstance(node, yaml.ScalarNode):
+        return loader.construct_scalar(node)
+    return None
+
+
+_Loader.add_multi_constructor("!", _ignore_tag)
+
+
+def _load(path: pathlib.Path):
+    with path.open("r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_Loader)
+
+
+def _templated(value) -> bool:
+    return not isinstance(value, str) or "{{" in value or "{%" in value
+
+
+def _tags(value) -> FrozenSet[str]:
+    if isinstance(value, str):
+        return frozenset(tag.strip() for tag in value.split(",") if tag.strip())
+    if isinstance(value, list):
+        return frozenset(str(tag) for tag in value)
+    return frozenset()
+
+
+def _with_tags(inherited: Tags, value) -> Tags:
+    return None if inherited is None else inherited | _tags(value)
+
+
+def find_role(name: str, base: pathlib.Path) -> Optional[pathlib.Path]:
+    """
+    Locate a role directory the way Ansible's default roles_path would.
+
+    Args:
+        name: Role name.
+        base: Directory of the playbook referencing the role.
+
+    Returns:
+        Optional[pathlib.Path]: Role directory, or None if not found locally.
+    """
+    for candidate in (base / "roles" / name, base.parent / "roles" / name):
+        if candidate.is_dir():
+            return candidate
+    candidate = ANSIBLE_ROOT / "roles" / name
+    return candidate if candidate.is_dir() else None
+
+
+class DependencyScanner:
+    """Collects the files and roles a playbook depends on."""
+
+    def __init__(self) -> None:
+        """Initialize an empty scan."""
+        self.files: Set[pathlib.Path] = set()
+        self.roles: Set[str] = set()
+        self.role_dirs: Dict[str, pathlib.Path] = {}
+        # Tags of every place a role is applied; an empty set is untagged
+        self.role_tags: Dict[str, List[FrozenSet[str]]] = {}
+        # Roles that list a role in their meta/main.yml dependencies
+        self.role_parents: Dict[str, Set[str]] = {}
+        # False once a dependency could not be resolved statically
+        self.exact = True
+        self._scanned: Set[Tuple[pathlib.Path, Tags]] = set()
+
+    def scan_playbook(self, path: pathlib.Path, tags: Tags = frozenset()) -> None:
+        """
+        Add a playbook and everything it imports.
+
+        Args:
+            path: Playbook file.
+            tags: Tags the playbook is imported with.
+        """
+        if (path, tags) in self._scanned:
+            return
+        self._scanned.add((path, tags))
+        self.files.add(path)
+        try:
+            plays = _load(path)
+        except (OSError, yaml.YAMLError) as exc:
+            logger.debug("Could not parse %s: %s", path, exc)
+            self.exact = False
+            return
+
+        for play in plays if isinstance(plays, list) else []:
+            if not isinstance(play, dict):
+                continue
+            play_tags = _with_tags(tags, play.get("tags"))
+            for key in PLAYBOOK_IMPORTS:
+                if key in play:
+                    self._scan_path(
+                        play[key],
+                        path.parent,
+                        functools.partial(self.scan_playbook, tags=play_tags),
+                    )
+            for entry in play.get("roles", None) or []:
+                if isinstance(entry, dict):
+                    name = entry.get("role", entry.get("name"))
+                    self._scan_role(
+                        name, path.parent, _with_tags(play_tags, entry.get("tags"))
+                    )
+                else:
+                    self._scan_role(entry, path.parent, play_tags)
+            for section in TASK_SECTIONS:
+                self._scan_tasks(play.get(section), path.parent, play_tags)
+            for vars_file in play.get("vars_files", None) or []:
+                self._scan_path(vars_file, path.parent, self.files.add)
+
+    def _scan_tasks(self, tasks, base: pathlib.Path, tags: Tags) -> None:
+        for task in tasks if isinstance(tasks, list) else []:
+            if not isinstance(task, dict):
+                continue
+            task_tags = _with_tags(tags, task.get("tags"))
+            for section in BLOCK_SECTIONS:
+                self._scan_tasks(task.get(section), base, task_tags)
+            for key in TASK_IMPORTS:
+                if key in task:
+                    target = task[key]
+                    if isinstance(target, dict):
+                        target = target.get("file")
+                    scan = functools.partial(
+                        self._scan_task_file,
+                        tags=task_tags if "import" in key else None,
+                    )
+                    self._scan_path(target, base, scan)
+            for key in ROLE_IMPORTS:
+                if key in task:
+                    args = task[key]
+                    name = args.get("name") if isinstance(args, dict) else None
+                    self._scan_role(
+                        name, base, self._role_import_tags(key, task, task_tags)
+                    )
+
+    @staticmethod
+    def _role_import_tags(key: str, task: dict, tags: Tags) -> Tags:
+        """Tags a role import passes on to the role's tasks."""
+        if "import" in key or tags is None:
+            return tags
+        # include_role only runs tasks carrying both its own and `apply` tags
+        args = task[key] if isinstance(task[key], dict) else {}
+        apply = args.get("apply") if isinstance(args.get("apply"), dict) else {}
+        return tags & _tags(apply.get("tags")) or None
+
+    def _scan_task_file(self, path: pathlib.Path, tags: Tags = None) -> None:
+        if (path, tags) in self._scanned:
+            return
+        self._scanned.add((path, tags))
+        self.files.add(path)
+        try:
+            self._scan_tasks(_load(path), path.parent, tags)
+        except (OSError, yaml.YAMLError):
+            self.exact = False
+
+    def _scan_path(self, value, base: pathlib.Path, scan) -> None:
+        if _templated(value):
+            self.exact = False
+            return
+        path = base / value
+        if path.is_file():
+            scan(path)
+        else:
+            self.exact = False
+
+    def _scan_role(
+        self, name, base: pathlib.Path, tags: Tags, parent: Optional[str] = None
+    ) -> None:
+        if _templated(name):
+            self.exact = False
+            return
+        role_dir = self.role_dirs.get(name) or find_role(name, base)
+        if role_dir is None:
+            # Collection or galaxy role; not tracked in this tree
+            self.exact = False
+            return
+        if parent:
+            self.role_parents.setdefault(name, set()).add(parent)
+        else:
+            self.role_tags.setdefault(name, []).append(tags or frozenset())
+        if name in self.roles:
+            return
+        self.roles.add(name)
+        self.role_dirs[name] = role_dir
+        self.files.update(_walk(role_dir))
+
+        meta = role_dir / "meta" / "main.yml"
+        try:
+            data = _load(meta) if meta.is_file() else None
+        except (OSError, yaml.YAMLError):
+            self.exact = False
+            return
+        dependencies = data.get("dependencies", []) if isinstance(data, dict) else []
+        for dependency in dependencies or []:
+            if isinstance(dependency, dict):
+                dependency = dependency.get("role", dependency.get("name"))
+            self._scan_role(dependency, role_dir.parent.parent, None, parent=name)
+
+    def applied_tags(self, name: str) -> List[FrozenSet[str]]:
+        """
+        Return the tags of every place a role runs, including as a dependency.
+
+        A dependency runs wherever a role depending on it runs, with its tags.
+
+        Args:
+            name: Role name.
+
+        Returns:
+            List[FrozenSet[str]]: One tag set per application; an empty set
+            means the role also runs somewhere --tags cannot select.
+        """
+        applied: List[FrozenSet[str]] = []
+        seen: Set[str] = set()
+        pending = [name]
+        while pending:
+            role = pending.pop()
+            if role in seen:
+                continue
+            seen.add(role)
+            applied.extend(self.role_tags.get(role, []))
+            pending.extend(self.role_parents.get(role, ()))
+        return applied
+
+
+def _walk(directory: pathlib.Path) -> List[pathlib.Path]:
+    return [
+        pathlib.Path(root) / name
+        for root, _, names in os.walk(directory)
+        for name in names
+    ]
+
+
+def dependencies(
+    name: str, scanner: Optional[DependencyScanner] = None
+) -> Tuple[Set[pathlib.Path], bool]:
+    """
+    Return every file a playbook depends on.
+
+    Shared files (ansible.cfg, group_vars, host_vars, plugins) are always
+    included. If any import cannot be resolved statically (templated names,
+    roles from collections, unparseable YAML), the whole ansible tree is
+    returned and the result is marked inexact.
+
+    Args:
+        name: Playbook name.
+        scanner: Scanner to use, for callers that inspect its roles afterwards.
+
+    Returns:
+        Tuple[Set[pathlib.Path], bool]: Dependency files and whether the
+        dependency set is exact.
+    """
+    scanner = scanner or DependencyScanner()
+    scanner.scan_playbook(playbook_path(name))
+
+    files = set(scanner.files)
+    for shared in SHARED_PATHS:
+        for base in (ANSIBLE_ROOT, PLAYBOOK_DIR):
+            path = base / shared
+            if path.is_dir():
+                files.update(_walk(path))
+            elif path.is_file():
+                files.add(path)
+
+    if not scanner.exact and ANSIBLE_ROOT.is_dir():
+        files.update(_walk(ANSIBLE_ROOT))
+    return files, scanner.exact
+
+
+def content_hash(files: Iterable[pathlib.Path]) -> str:
+    """
+    Hash the paths and contents of a set of files.
+
+    Args:
+        files: Files to hash; missing files are hashed as missing.
+
+    Returns:
+        str: Hex digest that changes whenever any file's content changes.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(set(files)):
+        digest.update(str(path).encode("utf-8") + b"\0")
+        try:
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        except OSError:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
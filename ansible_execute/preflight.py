@@ -0,0 +1,146 @@
+"""Pre-flight reachability probe for inventory hosts."""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ansible_execute import exceptions, inventory
+
+logger = logging.getLogger(__name__)
+
+ON_UNREACHABLE_ACTIONS = ("abort", "limit")
+
+
+async def probe_host(address: str, port: int, timeout: float) -> bool:
+    """
+    Check whether a TCP connection to `address:port` can be opened.
+
+    Args:
+        address: Host name or IP address.
+        port: TCP port (usually SSH).
+        timeout: Seconds to wait for the connection.
+
+    Returns:
+        bool: True if the connection was established.
+    """
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port), timeout=timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def probe_hosts(
+    targets: Dict[str, Tuple[str, int]], timeout: float, concurrency: int
+) -> Dict[str, bool]:
+    """
+    Probe many hosts concurrently with at most `concurrency` open attempts.
+
+    Args:
+        targets: Mapping of host name to (address, port).
+        timeout: Per-host connection timeout in seconds.
+        concurrency: Maximum number of simultaneous connection attempts.
+
+    Returns:
+        Dict[str, bool]: Reachability per host name.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _bounded(address: str, port: int) -> bool:
+        async with semaphore:
+            return await probe_host(address, port, timeout)
+
+    results = await asyncio.gather(
+        *(_bounded(address, port) for address, port in targets.values())
+    )
+    return dict(zip(targets, results))
+
+
+def run_preflight(
+    env: str, settings: dict, inv: Optional[inventory.Inventory] = None
+) -> Optional[List[str]]:
+    """
+    Probe every host of `env` and decide how the run should proceed.
+
+    Hosts with `ansible_connection=local` are not probed.
+
+    Args:
+        env: Environment (inventory group) to probe.
+        settings: The `preflight` config section.
+        inv: Pre-resolved inventory; resolved via ansible-inventory if omitted.
+
+    Returns:
+        Optional[List[str]]: Hosts to pass to `--limit`, or None if the run
+        can go ahead on every host.
+
+    Raises:
+        ConfigError: If `on_unreachable` is not a known action.
+        PreflightError: If the environment has no hosts, or hosts are
+            unreachable and the run cannot go ahead.
+    """
+    action = settings.get("on_unreachable", "abort")
+    if action not in ON_UNREACHABLE_ACTIONS:
+        raise exceptions.ConfigError(
+            f"[Config] Key 'preflight.on_unreachable' must be one of "
+            f"{', '.join(ON_UNREACHABLE_ACTIONS)}, got '{action}'"
+        )
+
+    inv = inv or inventory.load_inventory()
+    port = settings.get("port", 22)
+    hosts = inv.hosts_for(env)
+    if not hosts:
+        raise exceptions.PreflightError(f"[Preflight] No hosts found for '{env}'")
+    local = [
+        host
+        for host in hosts
+        if inv.hostvars.get(host, {}).get("ansible_connection") == "local"
+    ]
+    if local:
+        logger.debug("Not probing %d local hosts: %s", len(local), ", ".join(local))
+    targets = {
+        host: inv.host_address(host, port) for host in hosts if host not in local
+    }
+
+    logger.info("Probing %d hosts for environment: %s", len(targets), env)
+    started = time.monotonic()
+    results = asyncio.run(
+        probe_hosts(
+            targets,
+            timeout=settings.get("timeout", 2.0),
+            concurrency=settings.get("concurrency", 100),
+        )
+    )
+    logger.debug("Pre-flight probe finished in %.2fs", time.monotonic() - started)
+
+    reachable = [host for host, ok in results.items() if ok]
+    unreachable = [host for host, ok in results.items() if not ok]
+
+    if not unreachable:
+        logger.info("All %d hosts reachable", len(reachable))
+        return None
+
+    logger.warning(
+        "%d of %d hosts unreachable: %s",
+        len(unreachable),
+        len(targets),
+        ", ".join(unreachable),
+    )
+
+    if action == "abort":
+        raise exceptions.PreflightError(
+            f"[Preflight] {len(unreachable)} unreachable hosts in '{env}'"
+        )
+    if not reachable and not local:
+        raise exceptions.PreflightError(f"[Preflight] No reachable hosts in '{env}'")
+
+    logger.info("Limiting run to %d reachable hosts", len(reachable) + len(local))
+    return [host for host in hosts if host not in unreachable]
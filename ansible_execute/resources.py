@@ -0,0 +1,280 @@
+"""Resource accounting for ansible-playbook process trees.
+
+Run as ``python -m ansible_execute.resources --output FILE -- CMD...`` to
+execute CMD, wait for it with wait4() and write the rusage of its whole
+(reaped) process tree to FILE as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+# Keep at most this many samples; older ones are thinned out beyond that
+MAX_SAMPLES = 720
+PROC = pathlib.Path("/proc")
+
+
+@dataclass
+class ResourceUsage:
+    """CPU, memory, context switch and block I/O usage of a process tree."""
+
+    user_cpu: float = 0.0
+    system_cpu: float = 0.0
+    max_rss_kb: int = 0
+    voluntary_switches: int = 0
+    involuntary_switches: int = 0
+    block_in: int = 0
+    block_out: int = 0
+    # Largest summed RSS of the live tree seen while sampling
+    peak_tree_rss_kb: int = 0
+    samples: List[Dict[str, float]] = field(default_factory=list)
+
+    @classmethod
+    def from_rusage(cls, usage) -> "ResourceUsage":
+        """
+        Convert a `resource.struct_rusage`.
+
+        Args:
+            usage: Value returned by os.wait4() or resource.getrusage().
+
+        Returns:
+            ResourceUsage: Usage with RSS normalised to kilobytes.
+        """
+        max_rss = usage.ru_maxrss
+        if sys.platform == "darwin":
+            max_rss //= 1024  # bytes on macOS, kilobytes elsewhere
+        return cls(
+            user_cpu=round(usage.ru_utime, 3),
+            system_cpu=round(usage.ru_stime, 3),
+            max_rss_kb=max_rss,
+            voluntary_switches=usage.ru_nvcsw,
+            involuntary_switches=usage.ru_nivcsw,
+            block_in=usage.ru_inblock,
+            block_out=usage.ru_oublock,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ResourceUsage":
+        """Rebuild usage from `as_dict` output, ignoring unknown keys."""
+        known = cls.__dataclass_fields__  # pylint: disable=no-member
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def as_dict(self) -> dict:
+        """Return the usage as a JSON-serialisable dict."""
+        return asdict(self)
+
+    def merge(self, other: "ResourceUsage") -> "ResourceUsage":
+        """
+        Combine the usage of two concurrent runs.
+
+        Counters are summed; max RSS is the larger one, since it describes a
+        single process. Samples are not merged.
+
+        Args:
+            other: Usage of the other run.
+
+        Returns:
+            ResourceUsage: Combined usage.
+        """
+        return ResourceUsage(
+            user_cpu=round(self.user_cpu + other.user_cpu, 3),
+            system_cpu=round(self.system_cpu + other.system_cpu, 3),
+            max_rss_kb=max(self.max_rss_kb, other.max_rss_kb),
+            voluntary_switches=self.voluntary_switches + other.voluntary_switches,
+            involuntary_switches=(
+                self.involuntary_switches + other.involuntary_switches
+            ),
+            block_in=self.block_in + other.block_in,
+            block_out=self.block_out + other.block_out,
+            peak_tree_rss_kb=self.peak_tree_rss_kb + other.peak_tree_rss_kb,
+        )
+
+
+def accounting_supported() -> bool:
+    """Whether child rusage can be collected on this platform."""
+    return hasattr(os, "wait4")
+
+
+def wrap_command(cmd: List[str], output: pathlib.Path) -> List[str]:
+    """
+    Wrap a command so its rusage is written to `output` when it exits.
+
+    The wrapper imports this package from wherever it was loaded (including a
+    zipapp) without touching the child's PYTHONPATH.
+
+    Args:
+        cmd: Command to run.
+        output: File the usage JSON is written to.
+
+    Returns:
+        List[str]: Wrapped command.
+    """
+    package_parent = str(pathlib.Path(__file__).resolve().parent.parent)
+    bootstrap = (
+        "import sys; sys.path.insert(0, sys.argv.pop(1)); "
+        "from ansible_execute.resources import main; sys.exit(main())"
+    )
+    return [
+        sys.executable,
+        "-c",
+        bootstrap,
+        package_parent,
+        "--output",
+        str(output),
+        "--",
+        *cmd,
+    ]
+
+
+def read_usage(path: pathlib.Path) -> Optional[ResourceUsage]:
+    """Read the usage written by the wrapper, or None if there is none."""
+    try:
+        return ResourceUsage.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _proc_stats() -> Dict[int, tuple]:
+    """Return (ppid, cpu ticks, rss pages) of every process in /proc."""
+    stats = {}
+    for entry in os.scandir(PROC):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(os.path.join(entry.path, "stat"), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue  # exited while scanning
+        # The command name may contain spaces; fields follow the last ")"
+        fields = data[data.rfind(b")") + 2 :].split()
+        stats[int(entry.name)] = (
+            int(fields[1]),
+            int(fields[11]) + int(fields[12]),
+            int(fields[21]),
+        )
+    return stats
+
+
+def sample_tree(root_pid: int) -> Optional[Dict[str, float]]:
+    """
+    Sum the CPU time and RSS of a live process and all its descendants.
+
+    Args:
+        root_pid: Process at the top of the tree.
+
+    Returns:
+        Optional[Dict[str, float]]: Process count, CPU seconds and RSS in
+        kilobytes, or None if /proc is unavailable or the process is gone.
+    """
+    if not PROC.is_dir():
+        return None
+    stats = _proc_stats()
+    if root_pid not in stats:
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    count, cpu, rss = 0, 0, 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        _, pid_cpu, pid_rss = stats[pid]
+        count += 1
+        cpu += pid_cpu
+        rss += pid_rss
+        pending.extend(children.get(pid, ()))
+    return {"processes": count, "cpu": round(cpu / ticks, 2), "rss_kb": rss * page_kb}
+
+
+async def sample_periodically(
+    root_pid: int, interval: float, usage: ResourceUsage
+) -> None:
+    """
+    Append a sample of the process tree to `usage` every `interval` seconds.
+
+    Runs until cancelled or the process is gone.
+
+    Args:
+        root_pid: Process at the top of the tree.
+        interval: Seconds between samples.
+        usage: Usage the samples and peak tree RSS are recorded in.
+    """
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        # Scanning /proc is file I/O; keep it off the event loop
+        sample = await loop.run_in_executor(None, sample_tree, root_pid)
+        if sample is None:
+            return
+        sample["elapsed"] = round(time.monotonic() - started, 1)
+        usage.samples.append(sample)
+        usage.peak_tree_rss_kb = max(usage.peak_tree_rss_kb, int(sample["rss_kb"]))
+        if len(usage.samples) > MAX_SAMPLES:
+            del usage.samples[::2]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run a command, forward termination signals to it and record its rusage.
+
+    Args:
+        argv: Arguments (default: sys.argv[1:]).
+
+    Returns:
+        int: The command's exit code.
+    """
+    parser = argparse.ArgumentParser(prog="ansible_execute.resources")
+    parser.add_argument("--output", type=pathlib.Path, required=True)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("no command given")
+
+    try:
+        proc = subprocess.Popen(command)  # pylint: disable=consider-using-with
+    except OSError as exc:
+        sys.stderr.write(f"{command[0]}: {exc}\n")
+        return 127
+
+    def _forward(signum, frame):  # pylint: disable=unused-argument
+        try:
+            proc.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, _forward)
+
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = status  # already reaped; keep Popen from waiting again
+
+    tmp = args.output.with_name(args.output.name + ".tmp")
+    tmp.write_text(
+        json.dumps(ResourceUsage.from_rusage(usage).as_dict()), encoding="utf-8"
+    )
+    os.replace(tmp, args.output)
+
+    if os.WIFSIGNALED(status):
+        # Die the same way so the caller sees the signal, not an exit code
+        signum = os.WTERMSIG(status)
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+    return os.WEXITSTATUS(status)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
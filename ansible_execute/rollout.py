@@ -0,0 +1,292 @@
+"""Rolling (canary) batch execution across the hosts of an environment."""
+
+import asyncio
+import json
+import logging
+import math
+import pathlib
+from typing import List, Optional, Union
+
+from ansible_execute import exceptions, executor, extravars, failures, utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGES: List[Union[int, str]] = [1, "5%", "25%", "100%"]
+
+
+def stage_size(stage: Union[int, str], total: int) -> int:
+    """
+    Convert a stage entry into a batch size.
+
+    Args:
+        stage: Absolute host count (int) or percentage of the fleet ("25%").
+        total: Number of hosts in the rollout.
+
+    Returns:
+        int: Batch size of at least one host.
+    """
+    if isinstance(stage, str) and stage.endswith("%"):
+        try:
+            percent = float(stage[:-1])
+        except ValueError as exc:
+            raise exceptions.ConfigError(
+                f"[Config] Invalid rollout stage '{stage}'"
+            ) from exc
+        return max(1, math.ceil(total * percent / 100))
+    if isinstance(stage, int) and not isinstance(stage, bool) and stage > 0:
+        return stage
+    raise exceptions.ConfigError(f"[Config] Invalid rollout stage '{stage}'")
+
+
+class RolloutState:
+    """Persisted progress of a rollout, so an interrupted run can resume."""
+
+    def __init__(self, path: pathlib.Path, hosts: List[str]) -> None:
+        """
+        Initialize a fresh rollout over `hosts`.
+
+        Args:
+            path: JSON file the state is persisted to.
+            hosts: All hosts targeted by the rollout, in order.
+        """
+        self.path = path
+        self.hosts = hosts
+        self.completed: List[str] = []
+        self.failed: List[str] = []
+        self.batches: List[dict] = []
+
+    @classmethod
+    def load(cls, path: pathlib.Path, hosts: List[str]) -> "RolloutState":
+        """
+        Resume the rollout stored at `path`, or start a new one.
+
+        A stored rollout is only resumed if it targeted the same hosts.
+
+        Args:
+            path: JSON file the state is persisted to.
+            hosts: All hosts targeted by the rollout, in order.
+
+        Returns:
+            RolloutState: Resumed or fresh state.
+        """
+        state = cls(path, hosts)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return state
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable rollout state at %s", path)
+            return state
+
+        if sorted(data.get("hosts", [])) != sorted(hosts):
+            logger.warning("Host list changed since last rollout, starting over")
+            return state
+
+        state.completed = [host for host in data.get("completed", []) if host in hosts]
+        state.batches = data.get("batches", [])
+        logger.info(
+            "Resuming rollout: %d of %d hosts already completed",
+            len(state.completed),
+            len(hosts),
+        )
+        return state
+
+    @property
+    def remaining(self) -> List[str]:
+        """
+        Hosts still to run, in rollout order.
+
+        Hosts that failed within the threshold are not retried in the same
+        session, but are retried when the rollout is resumed.
+        """
+        done = set(self.completed) | set(self.failed)
+        return [host for host in self.hosts if host not in done]
+
+    def record_batch(
+        self, hosts: List[str], failed: List[str], duration: float
+    ) -> None:
+        """
+        Record the outcome of a batch and persist the state.
+
+        Args:
+            hosts: Hosts in the batch.
+            failed: Hosts of the batch that failed or were unreachable.
+            duration: Wall-clock seconds the batch took.
+        """
+        failed_set = set(failed)
+        self.completed.extend(host for host in hosts if host not in failed_set)
+        self.failed.extend(host for host in hosts if host in failed_set)
+        self.batches.append(
+            {"hosts": hosts, "failed": sorted(failed_set), "duration": duration}
+        )
+        self.save()
+
+    def save(self) -> None:
+        """Persist the state to disk."""
+        utils.write_json_atomic(
+            self.path,
+            {
+                "hosts": self.hosts,
+                "completed": self.completed,
+                "failed": self.failed,
+                "batches": self.batches,
+            },
+        )
+
+    def clear(self) -> None:
+        """Remove the persisted state once the rollout has finished."""
+        self.path.unlink(missing_ok=True)
+
+
+def next_batch_size(
+    planned: int,
+    last_batch: Optional[dict],
+    max_failure_rate: float,
+    time_budget: int = 0,
+) -> int:
+    """
+    Adapt the planned size of the next batch to what the last batch showed.
+
+    Any failures below the threshold stop the rollout from growing, and a time
+    budget caps the batch at what the observed throughput can finish in time.
+
+    Args:
+        planned: Size from the configured stages.
+        last_batch: Recorded outcome of the previous batch, if any.
+        max_failure_rate: Failure rate at which the rollout aborts.
+        time_budget: Target seconds per batch (0 disables).
+
+    Returns:
+        int: Batch size of at least one host.
+    """
+    if not last_batch or not last_batch["hosts"]:
+        return planned
+
+    size = len(last_batch["hosts"])
+    failure_rate = len(last_batch["failed"]) / size
+    if failure_rate > 0:
+        # Still within threshold, but do not widen the blast radius
+        headroom = 1 - failure_rate / max_failure_rate if max_failure_rate else 0
+        planned = min(planned, max(1, math.floor(size * max(headroom, 0.5))))
+
+    if time_budget and last_batch["duration"] > 0:
+        throughput = size / last_batch["duration"]
+        planned = min(planned, max(1, math.floor(throughput * time_budget)))
+
+    return planned
+
+
+def state_path(settings: dict, env: str, playbook: str) -> pathlib.Path:
+    """
+    Return the file a rollout for `env` and `playbook` is persisted to.
+
+    Args:
+        settings: Resolved config for the environment.
+        env: Environment name.
+        playbook: Playbook name.
+
+    Returns:
+        pathlib.Path: Rollout state file.
+    """
+    return utils.state_dir(settings) / "rollouts" / f"{env}-{playbook}.json"
+
+
+def run_rollout(
+    env: str,
+    playbook: str,
+    hosts: List[str],
+    settings: dict,
+    verbosity: int = 0,
+    tags: Optional[List[str]] = None,
+) -> RolloutState:
+    """
+    Run `playbook` over `hosts` in successive `--limit` batches.
+
+    Each batch only starts if the previous one stayed within the configured
+    failure rate; progress is persisted after every batch. Rerunning resumes
+    at the next batch, so runs are not checkpointed task by task as plain
+    runs are; failed batches are reported like any failed run.
+
+    Args:
+        env: Environment name.
+        playbook: Playbook name.
+        hosts: Hosts to roll out to, in order.
+        settings: Resolved config for the environment.
+        verbosity: Verbosity level from CLI.
+        tags: Only run tasks with these tags.
+
+    Returns:
+        RolloutState: Final state of the finished rollout.
+
+    Raises:
+        ConfigError: If a stage is invalid; checked before any batch runs.
+        RolloutError: If a batch exceeds the failure rate.
+    """
+    rollout = settings.get("rollout", {})
+    stages = rollout.get("stages") or DEFAULT_STAGES
+    max_failure_rate = rollout.get("max_failure_rate", 0.0)
+    time_budget = rollout.get("batch_time_budget", 0)
+    execution = settings.get("execution", {})
+    for stage in stages:
+        stage_size(stage, len(hosts))
+
+    vars_file = extravars.bundle(env, settings)
+    state = RolloutState.load(state_path(settings, env, playbook), hosts)
+    total = len(hosts)
+    stage_index = min(len(state.batches), len(stages) - 1)
+
+    while state.remaining:
+        planned = stage_size(stages[stage_index], total)
+        last_batch = state.batches[-1] if state.batches else None
+        size = next_batch_size(planned, last_batch, max_failure_rate, time_budget)
+        batch = state.remaining[:size]
+
+        logger.info(
+            "Rollout batch %d: %d hosts (%d remaining)",
+            len(state.batches) + 1,
+            len(batch),
+            len(state.remaining),
+        )
+        result = asyncio.run(
+            executor.run_playbook(
+                env,
+                playbook,
+                verbosity=verbosity,
+                forks=execution.get("forks"),
+                timeout=execution.get("timeout"),
+                limit=batch,
+                on_output=executor.echo_output,
+                sample_interval=settings.get("resources", {}).get("sample_interval", 0),
+                admission=settings.get("admission"),
+                extra_vars_file=vars_file,
+                tags=tags,
+                context_lines=settings.get("failures", {}).get("context_lines", 50),
+                failure_dir=failures.report_dir(settings),
+            )
+        )
+
+        failed = [host for host in result.failed_hosts if host in batch]
+        if not result.ok and not failed:
+            # No usable recap; the whole batch is suspect
+            failed = list(batch)
+        state.record_batch(batch, failed, result.duration)
+
+        failure_rate = len(failed) / len(batch)
+        if failure_rate > max_failure_rate:
+            raise exceptions.RolloutError(
+                f"[Rollout] {len(failed)} of {len(batch)} hosts failed in batch "
+                f"{len(state.batches)} (max failure rate {max_failure_rate:.0%})"
+            )
+
+        stage_index = min(stage_index + 1, len(stages) - 1)
+
+    if state.failed:
+        logger.warning(
+            "Rollout finished with %d failed hosts (rerun to retry): %s",
+            len(state.failed),
+            ", ".join(state.failed),
+        )
+    else:
+        logger.info("Rollout finished for %d hosts", total)
+        state.clear()
+    return state
@@ -0,0 +1,180 @@
+"""Split a playbook run across several ansible-playbook controllers."""
+
+import asyncio
+import logging
+import math
+import pathlib
+from typing import Dict, List, Optional
+
+from ansible_execute import exceptions, executor
+
+logger = logging.getLogger(__name__)
+
+
+def partition_hosts(hosts: List[str], shards: int) -> List[List[str]]:
+    """
+    Split hosts into disjoint shards of near-equal size.
+
+    Hosts are dealt round-robin so members of one inventory group are spread
+    across controllers instead of landing in the same shard.
+
+    Args:
+        hosts: Hosts to split, in inventory order.
+        shards: Requested number of shards.
+
+    Returns:
+        List[List[str]]: Non-empty shards; fewer than requested for small fleets.
+    """
+    count = max(1, min(shards, len(hosts)))
+    return [part for part in (hosts[i::count] for i in range(count)) if part]
+
+
+def shard_environment(work_dir: pathlib.Path, index: int) -> Dict[str, str]:
+    """
+    Create and return per-shard fact cache and temp directories.
+
+    Args:
+        work_dir: Base directory for this sharded run.
+        index: Shard number.
+
+    Returns:
+        Dict[str, str]: Environment overrides for the shard's controller.
+    """
+    shard_dir = work_dir / f"shard-{index}"
+    facts = shard_dir / "facts"
+    tmp = shard_dir / "tmp"
+    facts.mkdir(parents=True, exist_ok=True)
+    tmp.mkdir(parents=True, exist_ok=True)
+    return {
+        "ANSIBLE_CACHE_PLUGIN_CONNECTION": str(facts),
+        "ANSIBLE_LOCAL_TEMP": str(tmp),
+    }
+
+
+def merge_results(results: List[executor.PlaybookResult]) -> executor.PlaybookResult:
+    """
+    Combine the results of all shards into one result.
+
+    Args:
+        results: One result per shard.
+
+    Returns:
+        PlaybookResult: Highest exit code, overall timings, merged stats and
+        combined resource usage.
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+    for result in results:
+        stats.update(result.stats)
+
+    errors = [result.error for result in results if result.error]
+    usages = [result.usage for result in results if result.usage]
+    usage = usages[0] if usages else None
+    for other in usages[1:]:
+        usage = usage.merge(other)
+    started_at = min(result.started_at for result in results)
+    finished_at = max(result.finished_at for result in results)
+    return executor.PlaybookResult(
+        env=results[0].env,
+        playbook=results[0].playbook,
+        command=results[0].command,
+        exit_code=max((result.exit_code for result in results), key=abs),
+        started_at=started_at,
+        finished_at=finished_at,
+        duration=max(result.duration for result in results),
+        stats=stats,
+        timed_out=any(result.timed_out for result in results),
+        error="; ".join(errors) or None,
+        usage=usage,
+    )
+
+
+async def run_sharded(
+    env: str,
+    playbook: str,
+    hosts: List[str],
+    shards: int,
+    work_dir: pathlib.Path,
+    verbosity: int = 0,
+    forks: Optional[int] = None,
+    timeout: Optional[int] = None,
+    on_output: Optional[executor.OutputCallback] = None,
+    sample_interval: float = 0,
+    admission: Optional[dict] = None,
+    extra_vars_file: Optional[pathlib.Path] = None,
+    tags: Optional[List[str]] = None,
+    context_lines: int = 50,
+    failure_dir: Optional[pathlib.Path] = None,
+) -> executor.PlaybookResult:
+    """
+    Run one ansible-playbook controller per host shard, in parallel.
+
+    The configured forks are divided between the shards so the total number
+    of connections matches an unsharded run.
+
+    Args:
+        env: Environment name.
+        playbook: Playbook name.
+        hosts: All hosts of the run.
+        shards: Number of controllers to start.
+        work_dir: Directory for per-shard fact caches and temp dirs.
+        verbosity: Verbosity level from CLI.
+        forks: Total forks across all shards.
+        timeout: Seconds before each controller is killed (0 disables).
+        on_output: Called with every line of output, prefixed by its shard.
+        sample_interval: Seconds between process tree samples of each shard.
+        admission: `admission` config section applied to each controller.
+        extra_vars_file: Extra-vars bundle shared by every controller.
+        tags: Only run tasks with these tags.
+        context_lines: Output lines kept for the failure report of a shard.
+        failure_dir: Directory to also write failure reports of shards to.
+
+    Returns:
+        PlaybookResult: Merged result of all shards.
+    """
+    parts = partition_hosts(hosts, shards)
+    if not parts:
+        raise exceptions.InventoryError(f"[Inventory] No hosts to shard for '{env}'")
+    shard_forks = max(1, math.ceil(forks / len(parts))) if forks else None
+    logger.info(
+        "Running %s across %d shards of ~%d hosts",
+        playbook,
+        len(parts),
+        len(parts[0]),
+    )
+
+    def _prefixed(index: int) -> Optional[executor.OutputCallback]:
+        if not on_output:
+            return None
+        prefix = f"[shard {index + 1}/{len(parts)}] "
+        return lambda line: on_output(prefix + line)
+
+    results = await asyncio.gather(
+        *(
+            executor.run_playbook(
+                env,
+                playbook,
+                verbosity=verbosity,
+                forks=shard_forks,
+                timeout=timeout,
+                limit=part,
+                on_output=_prefixed(index),
+                extra_env=shard_environment(work_dir, index),
+                sample_interval=sample_interval,
+                admission=admission,
+                extra_vars_file=extra_vars_file,
+                tags=tags,
+                context_lines=context_lines,
+                failure_dir=failure_dir,
+            )
+            for index, part in enumerate(parts)
+        )
+    )
+
+    for index, result in enumerate(results):
+        logger.debug(
+            "Shard %d finished with exit code %d in %.1fs",
+            index + 1,
+            result.exit_code,
+            result.duration,
+        )
+    return merge_results(list(results))
@@ -0,0 +1,282 @@
+"""Simulated ansible-playbook for load tests without a real fleet.
+
+Run as ``python -m ansible_execute.simulator PLAYBOOK [ansible-playbook args]``,
+or put the shim written by `install` first on PATH. The simulator prints the
+output of a linear-strategy run over generated hosts (or the --limit hosts):
+one play, fact gathering and a number of tasks, then the recap, and exits
+with the code ansible-playbook would.
+
+It is configured through environment variables, so that the executor can
+pass them to the child with `extra_env`:
+
+    ANSIBLE_EXECUTE_SIM_HOSTS             Hosts without --limit (default 10)
+    ANSIBLE_EXECUTE_SIM_TASKS             Tasks after fact gathering (default 5)
+    ANSIBLE_EXECUTE_SIM_LATENCY           Seconds per batch of forks hosts (0)
+    ANSIBLE_EXECUTE_SIM_JITTER            Relative latency jitter, 0-1 (0.2)
+    ANSIBLE_EXECUTE_SIM_FAIL_RATE         Chance a host fails a task (0)
+    ANSIBLE_EXECUTE_SIM_UNREACHABLE_RATE  Chance a host is unreachable (0)
+    ANSIBLE_EXECUTE_SIM_OUTPUT_BYTES      Result payload per host and task (0)
+    ANSIBLE_EXECUTE_SIM_SEED              Seed of the simulated outcomes (0)
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import random
+import stat
+import sys
+import time
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, TextIO
+
+ENV_PREFIX = "ANSIBLE_EXECUTE_SIM_"
+# ansible-playbook exit codes
+EXIT_FAILED = 2
+EXIT_UNREACHABLE = 4
+EXIT_BAD_OPTIONS = 5
+# Ansible's default when --forks is not given
+DEFAULT_FORKS = 5
+# Tasks are named after these, cycling when there are more tasks
+TASK_NAMES = (
+    "Install packages",
+    "Render configuration",
+    "Ensure service is running",
+    "Open firewall ports",
+    "Create users",
+    "Deploy application",
+    "Run migrations",
+    "Reload service",
+)
+COUNTERS = ("ok", "changed", "unreachable", "failed", "skipped", "rescued", "ignored")
+
+
+@dataclass
+class SimulatorSettings:
+    """Shape of the simulated fleet and run."""
+
+    hosts: int = 10
+    tasks: int = 5
+    latency: float = 0.0
+    jitter: float = 0.2
+    fail_rate: float = 0.0
+    unreachable_rate: float = 0.0
+    output_bytes: int = 0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls, environ=None) -> "SimulatorSettings":
+        """
+        Read the settings from `ANSIBLE_EXECUTE_SIM_*` variables.
+
+        Args:
+            environ: Environment to read (default: os.environ).
+
+        Returns:
+            SimulatorSettings: Settings, with defaults for unset variables.
+
+        Raises:
+            ValueError: If a variable is not a valid number, naming it.
+        """
+        environ = os.environ if environ is None else environ
+        values = {}
+        for each in fields(cls):
+            name = ENV_PREFIX + each.name.upper()
+            raw = environ.get(name)
+            if not raw:
+                continue
+            kind = type(each.default)
+            try:
+                values[each.name] = kind(raw)
+            except ValueError:
+                raise ValueError(
+                    f"Invalid value for {name}: {raw!r} (expected {kind.__name__})"
+                ) from None
+        return cls(**values)
+
+    def as_env(self) -> Dict[str, str]:
+        """Return the settings as `ANSIBLE_EXECUTE_SIM_*` variables."""
+        return {
+            ENV_PREFIX + each.name.upper(): str(getattr(self, each.name))
+            for each in fields(self)
+        }
+
+
+def host_names(count: int) -> List[str]:
+    """
+    Name the generated hosts.
+
+    Args:
+        count: Number of hosts.
+
+    Returns:
+        List[str]: Host names, zero-padded so they sort naturally.
+    """
+    width = len(str(count))
+    return [f"sim-{index:0{width}d}" for index in range(1, count + 1)]
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="ansible-playbook", add_help=False)
+    parser.add_argument("playbook", nargs="?")
+    parser.add_argument("--limit", default=None)
+    parser.add_argument("--forks", type=int, default=DEFAULT_FORKS)
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def _header(title: str) -> str:
+    return f"{title} " + "*" * max(3, 78 - len(title))
+
+
+def _payload(settings: SimulatorSettings, verbose: bool, **result) -> str:
+    if settings.output_bytes:
+        result["stdout"] = "x" * settings.output_bytes
+    elif not verbose:
+        return ""
+    return " => " + json.dumps(result)
+
+
+def simulate(
+    argv: List[str],
+    settings: SimulatorSettings,
+    out: TextIO,
+    sleep=time.sleep,
+) -> int:
+    """
+    Print the output of a simulated run.
+
+    Outcomes are drawn from a generator seeded with the seed, host and task,
+    so the same settings and hosts always fail the same way. A host that
+    fails or is unreachable skips the remaining tasks.
+
+    Args:
+        argv: ansible-playbook arguments; --limit, --forks and -v are honoured.
+        settings: Shape of the fleet and run.
+        out: Stream the output is written to.
+        sleep: Called with the simulated latency of each batch of hosts.
+
+    Returns:
+        int: Exit code ansible-playbook would return.
+    """
+    args = _parse_args(argv)
+    hosts = (
+        [host for host in args.limit.split(",") if host]
+        if args.limit
+        else host_names(settings.hosts)
+    )
+    forks = max(1, args.forks)
+    stats = {host: dict.fromkeys(COUNTERS, 0) for host in hosts}
+    active = list(hosts)
+    timing = random.Random(settings.seed)
+
+    out.write(_header("PLAY [nodes]") + "\n\n")
+    tasks = ["Gathering Facts"] + [
+        TASK_NAMES[index % len(TASK_NAMES)] for index in range(settings.tasks)
+    ]
+    for number, task in enumerate(tasks):
+        out.write(_header(f"TASK [{task}]") + "\n")
+        for start in range(0, len(active), forks):
+            if settings.latency:
+                spread = settings.jitter * (2 * timing.random() - 1)
+                sleep(max(0.0, settings.latency * (1 + spread)))
+            for host in active[start : start + forks]:
+                rng = random.Random(f"{settings.seed}:{host}:{number}")
+                roll = rng.random()
+                if roll < settings.unreachable_rate:
+                    stats[host]["unreachable"] += 1
+                    out.write(
+                        f"fatal: [{host}]: UNREACHABLE! => "
+                        + json.dumps(
+                            {
+                                "changed": False,
+                                "msg": "Failed to connect to the host via ssh",
+                                "unreachable": True,
+                            }
+                        )
+                        + "\n"
+                    )
+                elif roll < settings.unreachable_rate + settings.fail_rate:
+                    stats[host]["failed"] += 1
+                    out.write(
+                        f"fatal: [{host}]: FAILED! => "
+                        + json.dumps({"changed": False, "msg": f"{task} failed"})
+                        + "\n"
+                    )
+                else:
+                    changed = number > 0 and rng.random() < 0.3
+                    stats[host]["changed" if changed else "ok"] += 1
+                    status = "changed" if changed else "ok"
+                    payload = _payload(settings, args.verbose > 0, changed=changed)
+                    out.write(f"{status}: [{host}]{payload}\n")
+        out.flush()
+        active = [
+            host
+            for host in active
+            if not stats[host]["failed"] and not stats[host]["unreachable"]
+        ]
+        out.write("\n")
+
+    out.write(_header("PLAY RECAP") + "\n")
+    for host in hosts:
+        counters = "  ".join(f"{key}={stats[host][key]}" for key in COUNTERS)
+        out.write(f"{host} : {counters}\n")
+    out.flush()
+
+    if any(counters["failed"] for counters in stats.values()):
+        return EXIT_FAILED
+    if any(counters["unreachable"] for counters in stats.values()):
+        return EXIT_UNREACHABLE
+    return 0
+
+
+def install(directory: pathlib.Path) -> pathlib.Path:
+    """
+    Write an `ansible-playbook` shim that runs the simulator.
+
+    Like the `resources` wrapper, the shim imports this package from wherever
+    it was loaded (including a zipapp).
+
+    Args:
+        directory: Directory to put first on the child's PATH.
+
+    Returns:
+        pathlib.Path: The shim.
+    """
+    package_parent = str(pathlib.Path(__file__).resolve().parent.parent)
+    shim = directory / "ansible-playbook"
+    directory.mkdir(parents=True, exist_ok=True)
+    shim.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"sys.path.insert(0, {package_parent!r})\n"
+        "from ansible_execute.simulator import main\n"
+        "sys.exit(main())\n",
+        encoding="utf-8",
+    )
+    shim.chmod(shim.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return shim
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Simulate an ansible-playbook run.
+
+    Args:
+        argv: ansible-playbook arguments (default: sys.argv[1:]).
+
+    Returns:
+        int: Exit code of the simulated run, or 5 (bad options) if the
+        settings are invalid.
+    """
+    try:
+        settings = SimulatorSettings.from_env()
+    except ValueError as exc:
+        sys.stderr.write(f"ERROR! {exc}\n")
+        return EXIT_BAD_OPTIONS
+    return simulate(sys.argv[1:] if argv is None else argv, settings, sys.stdout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
 """Config validation and generation for ansible-execute."""
 
+import copy
+import json
+import os
 import pathlib
+import tempfile
 from importlib import resources
+from typing import Dict
 
 import yaml
 
@@ -63,8 +68,50 @@ class Config:
         # Validate config
         self.validate_config_against_schema(self.config_data, self.schema_def)
 
+        # Merged per-environment views, resolved lazily and memoized
+        self._env_views: Dict[str, dict] = {}
+
+    def for_env(self, env: str) -> dict:
+        """
+        Return the config with the overlay for `env` merged onto the base.
+
+        The merged view is validated against the full schema the first time an
+        environment is requested and memoized afterwards, so callers should
+        treat the returned dict as read-only.
+
+        Args:
+            env: Environment name (dev, staging, prod).
+
+        Returns:
+            dict: Base config deep-merged with `environments.<env>`.
+        """
+        if env in self._env_views:
+            return self._env_views[env]
+
+        base = {
+            key: value
+            for key, value in self.config_data.items()
+            if not self.schema_def.get(key, {}).get("overlay", False)
+        }
+        overlays = {
+            key: value
+            for key, value in self.config_data.items()
+            if self.schema_def.get(key, {}).get("overlay", False)
+        }
+
+        merged = deep_merge(base, {})
+        for overlay in overlays.values():
+            if env in overlay:
+                merged = deep_merge(merged, overlay[env] or {})
+
+        self.validate_config_against_schema(
+            merged, self.schema_def, path=f"environments.{env}"
+        )
+        self._env_views[env] = merged
+        return merged
+
     def validate_config_against_schema(
-        self, config: dict, schema: dict, path: str = ""
+        self, config: dict, schema: dict, path: str = "", partial: bool = False
     ) -> None:
         """
         Recursively validate the config against the expected schema.
@@ -73,6 +120,7 @@ class Config:
             config: Actual loaded config.
             schema: Expected schema.
             path: Dot-path used for error context.
+            partial: Skip mandatory checks (used for environment overlays).
         """
         for key in config:
             if key not in schema:
@@ -82,7 +130,7 @@ class Config:
         for key, rules in schema.items():
             full_path = f"{path}.{key}" if path else key
 
-            if rules.get("mandatory", False) and key not in config:
+            if not partial and rules.get("mandatory", False) and key not in config:
                 raise exceptions.ConfigError(
                     f"[Config] Missing required key: '{full_path}'"
                 )
@@ -99,8 +147,13 @@ class Config:
                     raise exceptions.ConfigError(
                         f"[Config] Key '{full_path}' should be a dict"
                     )
+                if rules.get("overlay", False):
+                    self._validate_overlays(value, schema, path=full_path)
+                    continue
+                if "children" not in rules:
+                    continue  # free-form mapping (e.g. extra_vars.values)
                 self.validate_config_against_schema(
-                    value, rules.get("children", {}), path=full_path
+                    value, rules.get("children", {}), path=full_path, partial=partial
                 )
             elif python_type is list:
                 if not isinstance(value, list):
@@ -114,6 +167,40 @@ class Config:
                         f"[Config] Key '{full_path}' should be of type {python_type.__name__}, "
                         f"got {type(value).__name__}"
                     )
+                choices = rules.get("choices")
+                if choices is not None and value not in choices:
+                    raise exceptions.ConfigError(
+                        f"[Config] Key '{full_path}' must be one of "
+                        f"{', '.join(map(str, choices))}, got '{value}'"
+                    )
+
+    def _validate_overlays(self, overlays: dict, schema: dict, path: str) -> None:
+        """
+        Validate overlay blocks keyed by environment name.
+
+        Each block may set any subset of the sibling (non-overlay) keys.
+
+        Args:
+            overlays: Mapping of environment name to overlay block.
+            schema: Schema of the level the overlay lives in.
+            path: Dot-path used for error context.
+        """
+        base_schema = {
+            key: rules
+            for key, rules in schema.items()
+            if not rules.get("overlay", False)
+        }
+        for env, overlay in overlays.items():
+            full_path = f"{path}.{env}"
+            if overlay is None:
+                continue
+            if not isinstance(overlay, dict):
+                raise exceptions.ConfigError(
+                    f"[Config] Key '{full_path}' should be a dict"
+                )
+            self.validate_config_against_schema(
+                overlay, base_schema, path=full_path, partial=True
+            )
 
     def _resolve_type(self, type_name: str) -> type:
         """
@@ -134,6 +221,61 @@ class Config:
         return mapping[type_name]
 
 
+def deep_merge(base: dict, overlay: dict) -> dict:
+    """
+    Recursively merge `overlay` onto `base` without mutating either.
+
+    Nested dicts are merged key by key; any other value in the overlay
+    replaces the base value.
+
+    Args:
+        base: Base mapping.
+        overlay: Mapping whose values take precedence.
+
+    Returns:
+        dict: New merged mapping.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def write_json_atomic(path: pathlib.Path, data) -> None:
+    """
+    Write `data` as JSON to `path` so readers never see a partial file.
+
+    Args:
+        path: Destination file; parent directories are created.
+        data: JSON-serializable value.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_name, path)
+    except BaseException:
+        pathlib.Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def state_dir(settings: dict) -> pathlib.Path:
+    """
+    Return the directory used for caches and resumable run state.
+
+    Args:
+        settings: Resolved config for the current environment.
+
+    Returns:
+        pathlib.Path: Value of `state.dir` (default ./.ansible-execute).
+    """
+    return pathlib.Path(settings.get("state", {}).get("dir") or ".ansible-execute")
+
+
 class ConfigGenerator:
     """Generates a default config YAML from a bundled schema definition."""
 
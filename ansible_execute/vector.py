@@ -0,0 +1,363 @@
+"""Ship JSON log records to a Vector socket source in batches."""
+
+import logging
+import os
+import pathlib
+import queue
+import select
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple, Union
+
+from ansible_execute import exceptions
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(value: str) -> Tuple[int, Address]:
+    """
+    Parse a Vector socket address.
+
+    Args:
+        value: `unix:/path/to/socket`, `tcp://host:port` or `host:port`.
+
+    Returns:
+        Tuple[int, Address]: Socket family and address to connect to.
+
+    Raises:
+        ValueError: If the address cannot be parsed.
+    """
+    if value.startswith("unix:"):
+        return socket.AF_UNIX, value[len("unix:") :]
+    if value.startswith("tcp://"):
+        value = value[len("tcp://") :]
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid Vector address '{value}'")
+    return socket.AF_INET, (host.strip("[]"), int(port))
+
+
+def _segment_pid(path: pathlib.Path) -> Optional[int]:
+    """Return the pid in a segment name, or None for an unowned segment."""
+    _, _, pid = path.name.split(".", 1)[0].partition("-")
+    return int(pid) if pid.isdigit() else None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class DiskSpool:
+    """
+    Bounded, segmented on-disk buffer of undelivered records.
+
+    Several processes may share a spool directory. Each writes its own
+    segments, named after its pid, and replays its own and those of exited
+    processes. A segment is claimed by renaming it before it is replayed, so
+    only one process can ever send it.
+    """
+
+    def __init__(
+        self, directory: Optional[pathlib.Path], max_bytes: int, segments: int = 8
+    ) -> None:
+        """
+        Initialize the spool.
+
+        Args:
+            directory: Spool directory (None disables spooling).
+            max_bytes: Total size above which the oldest segments are dropped.
+            segments: Number of segments the size limit is split into.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1, max_bytes // max(1, segments))
+        # Records lost because the spool was full or disabled
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._current: Optional[pathlib.Path] = None
+        if directory:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def append(self, lines: List[bytes]) -> None:
+        """Write records to the newest segment, dropping the oldest if full."""
+        if not lines:
+            return
+        if not self.directory or not self.max_bytes:
+            self.dropped += len(lines)
+            return
+        data = b"".join(line + b"\n" for line in lines)
+        with self._lock:
+            if (
+                self._current is None
+                or not self._current.exists()
+                or self._current.stat().st_size + len(data) > self.segment_bytes
+            ):
+                self._current = (
+                    self.directory / f"{time.time_ns():020d}-{os.getpid()}.spool"
+                )
+            with self._current.open("ab") as f:
+                f.write(data)
+            self._enforce_limit()
+
+    def _enforce_limit(self) -> None:
+        segments = self._segments()
+        total = sum(path.stat().st_size for path in segments)
+        while total > self.max_bytes and len(segments) > 1:
+            oldest = segments.pop(0)
+            data = oldest.read_bytes()
+            total -= len(data)
+            self.dropped += data.count(b"\n")
+            oldest.unlink()
+
+    def _segments(self) -> List[pathlib.Path]:
+        if not self.directory:
+            return []
+        return sorted(self.directory.glob("*.spool"))
+
+    def _replayable(self) -> List[pathlib.Path]:
+        """Segments of this process and of processes that have exited."""
+        own = os.getpid()
+        return [
+            segment
+            for segment in self._segments()
+            if _segment_pid(segment) in (None, own) or not _alive(_segment_pid(segment))
+        ]
+
+    def pending(self) -> bool:
+        """Whether any spooled records wait for replay by this process."""
+        return bool(self._replayable())
+
+    def take(self) -> List[pathlib.Path]:
+        """
+        Close the active segment and claim the segments to replay, oldest first.
+
+        Callers delete each segment once it has been delivered, and `restore`
+        the ones they could not deliver.
+        """
+        with self._lock:
+            self._current = None
+            if not self.directory:
+                return []
+            own = os.getpid()
+            # Claims of processes that died while replaying go back to the spool
+            for claimed in self.directory.glob("*.replay"):
+                claimer = claimed.name.split(".")[-2]
+                if claimer.isdigit() and not _alive(int(claimer)):
+                    self.restore([claimed])
+            taken = []
+            for segment in self._replayable():
+                claimed = segment.with_name(f"{segment.name}.{own}.replay")
+                try:
+                    os.rename(segment, claimed)
+                except FileNotFoundError:
+                    continue  # claimed by another process first
+                taken.append(claimed)
+            return taken
+
+    def restore(self, claimed: List[pathlib.Path]) -> None:
+        """Return claimed segments that were not delivered to the spool."""
+        for path in claimed:
+            original = path.name[: path.name.index(".spool") + len(".spool")]
+            try:
+                os.rename(path, path.with_name(original))
+            except FileNotFoundError:
+                pass
+
+
+class VectorSocketHandler(logging.Handler):
+    """
+    Send formatted records to a Vector `socket` source as newline-delimited JSON.
+
+    Records are queued by `emit` and sent in batches by a background thread,
+    so a slow or absent Vector never blocks the caller. When the queue is
+    full, or the socket is down, records go to a bounded disk spool that is
+    replayed, oldest first, once the connection is back.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        spool_dir: Optional[pathlib.Path] = None,
+        spool_max_bytes: int = 10 * 1024 * 1024,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+        timeout: float = 5.0,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """
+        Initialize the handler and start its sender thread.
+
+        Args:
+            address: Vector socket address, see `parse_address`.
+            spool_dir: Directory for undelivered records (None drops them).
+            spool_max_bytes: Size limit of the spool.
+            batch_size: Records per write to the socket.
+            flush_interval: Seconds a partial batch may wait before it is sent.
+            queue_size: Records buffered in memory before spilling to disk.
+            timeout: Seconds for connecting and sending before giving up.
+            max_backoff: Upper bound of the reconnect delay in seconds.
+        """
+        super().__init__()
+        self.family, self.address = parse_address(address)
+        self.spool = DiskSpool(spool_dir, spool_max_bytes)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.sent = 0
+
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(queue_size)
+        self._sock: Optional[socket.socket] = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="vector-handler", daemon=True
+        )
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue a formatted record, spilling to the spool if the queue is full."""
+        try:
+            line = self.format(record).encode("utf-8")
+            try:
+                self._queue.put_nowait(line)
+            except queue.Full:
+                # Backpressure: Vector is slower than we log; never block
+                self.spool.append([line])
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self) -> None:
+        """Deliver (or spool) everything queued and stop the sender thread."""
+        if not self._stop.is_set():
+            self._stop.set()
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join(self.timeout * 2 + self.flush_interval)
+        super().close()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch or self.spool.pending():
+                self._deliver(batch)
+            if self._stop.is_set() and self._queue.empty():
+                break
+        self._disconnect()
+
+    def _next_batch(self) -> List[bytes]:
+        batch: List[bytes] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            wait = deadline - time.monotonic()
+            try:
+                if self._stop.is_set():
+                    line = self._queue.get_nowait()
+                else:
+                    line = self._queue.get(timeout=max(wait, 0))
+            except queue.Empty:
+                break
+            if line is not None:
+                batch.append(line)
+            if wait <= 0:
+                break
+        return batch
+
+    def _deliver(self, batch: List[bytes]) -> None:
+        if not self._connected():
+            self.spool.append(batch)
+            return
+        segments = self.spool.take()
+        try:
+            while segments:
+                self._sock.sendall(segments[0].read_bytes())
+                segments.pop(0).unlink()
+            if batch:
+                self._sock.sendall(b"".join(line + b"\n" for line in batch))
+                self.sent += len(batch)
+        except OSError:
+            self._disconnect(failed=True)
+            self.spool.restore(segments)
+            self.spool.append(batch)
+
+    def _connected(self) -> bool:
+        if self._sock is not None:
+            # A readable socket we never read from means the peer closed it
+            readable, _, _ = select.select([self._sock], [], [], 0)
+            if not readable:
+                return True
+            try:
+                if self._sock.recv(1, socket.MSG_PEEK):
+                    return True
+            except OSError:
+                pass
+            self._disconnect(failed=True)
+
+        if time.monotonic() < self._retry_at:
+            return False
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            self._disconnect(failed=True)
+            return False
+        self._sock = sock
+        self._backoff = 0.0
+        return True
+
+    def _disconnect(self, failed: bool = False) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        if failed:
+            self._backoff = min(self.max_backoff, max(0.5, self._backoff * 2))
+            self._retry_at = time.monotonic() + self._backoff
+
+
+def from_settings(settings: dict) -> Optional[VectorSocketHandler]:
+    """
+    Create a handler from the `logging.vector` config section.
+
+    Args:
+        settings: `logging.vector` config section.
+
+    Returns:
+        Optional[VectorSocketHandler]: Handler, or None without an address.
+
+    Raises:
+        ConfigError: If the address cannot be parsed.
+    """
+    address = settings.get("address")
+    if not address:
+        return None
+    try:
+        parse_address(address)
+    except ValueError as exc:
+        raise exceptions.ConfigError(
+            f"[Config] Key 'logging.vector.address': {exc}"
+        ) from exc
+    spool_dir = settings.get("spool_dir")
+    return VectorSocketHandler(
+        address,
+        spool_dir=pathlib.Path(os.path.expanduser(spool_dir)) if spool_dir else None,
+        spool_max_bytes=settings.get("spool_max_bytes", 10 * 1024 * 1024),
+        batch_size=settings.get("batch_size", 100),
+        flush_interval=settings.get("flush_interval", 1.0),
+        queue_size=settings.get("queue_size", 10000),
+    )
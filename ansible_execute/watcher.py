@@ -0,0 +1,323 @@
+"""Watch the ansible tree and re-run playbooks when files change."""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import pathlib
+import struct
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ansible_execute import playbooks
+
+logger = logging.getLogger(__name__)
+
+WATCH_ROOT = playbooks.ANSIBLE_ROOT
+IGNORED_DIRS = {".git", "__pycache__", ".ansible-execute", ".tox", ".venv"}
+IGNORED_SUFFIXES = (".swp", ".swx", ".tmp", "~", ".retry")
+# Matches every path, used when the kernel event queue overflowed
+RESCAN = "*"
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def ignored(name: str) -> bool:
+    """Whether a file or directory name is editor or tool noise."""
+    return (
+        name in IGNORED_DIRS
+        or name.endswith(IGNORED_SUFFIXES)
+        or name.startswith(".#")
+        or name == "4913"  # vim's write-permission probe
+    )
+
+
+class PollingWatcher:
+    """Detects changes by comparing periodic snapshots of the tree."""
+
+    def __init__(self, root: pathlib.Path, interval: float = 1.0) -> None:
+        """
+        Initialize and take the first snapshot.
+
+        Args:
+            root: Directory to watch recursively.
+            interval: Seconds between snapshots.
+        """
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Return (mtime, size) of every file, using one scandir per directory."""
+        snapshot: Dict[str, Tuple[int, int]] = {}
+        pending = [str(self.root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if ignored(entry.name):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    async def next_changes(self) -> Set[str]:
+        """Wait until at least one file was added, removed or modified."""
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self._scan()
+            previous = self._snapshot
+            self._snapshot = current
+            changed = {
+                path
+                for path in current.keys() | previous.keys()
+                if current.get(path) != previous.get(path)
+            }
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        """Release resources (nothing to do for polling)."""
+
+
+class InotifyWatcher:
+    """Detects changes through Linux inotify, with one watch per directory."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        """
+        Initialize and register watches for every directory under `root`.
+
+        Args:
+            root: Directory to watch recursively.
+
+        Raises:
+            OSError: If inotify is unavailable or the watch limit is reached.
+        """
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+        self._paths: Dict[int, str] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        try:
+            self._add_tree(str(root))
+        except OSError:
+            os.close(self._fd)
+            raise
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+
+    def _add_tree(self, top: str) -> List[str]:
+        """Watch `top` and its subdirectories; return the files found in them."""
+        found: List[str] = []
+        for directory, dirnames, filenames in os.walk(top):
+            dirnames[:] = [name for name in dirnames if not ignored(name)]
+            found.extend(
+                os.path.join(directory, name) for name in filenames if not ignored(name)
+            )
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), WATCH_MASK
+            )
+            if wd < 0:
+                code = ctypes.get_errno()
+                if code == errno.ENOENT:
+                    continue  # removed while walking
+                raise OSError(
+                    code, f"inotify_add_watch({directory}): {os.strerror(code)}"
+                )
+            self._paths[wd] = directory
+        return found
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._queue.put_nowait(RESCAN)
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None or (name and ignored(name)):
+                continue
+
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    # Files created before the watch existed raised no events
+                    for created in self._add_tree(path):
+                        self._queue.put_nowait(created)
+                except OSError as exc:
+                    logger.warning("Cannot watch new directory %s: %s", path, exc)
+            self._queue.put_nowait(path)
+
+    async def next_changes(self) -> Set[str]:
+        """Wait until at least one file event arrived and return all pending."""
+        changed = {await self._queue.get()}
+        while not self._queue.empty():
+            changed.add(self._queue.get_nowait())
+        return changed
+
+    def close(self) -> None:
+        """Stop watching and close the inotify descriptor."""
+        try:
+            asyncio.get_running_loop().remove_reader(self._fd)
+        except RuntimeError:
+            pass
+        os.close(self._fd)
+
+
+def create_watcher(
+    root: pathlib.Path, backend: str = "auto", poll_interval: float = 1.0
+):
+    """
+    Create the cheapest available watcher for `root`.
+
+    Must be called from a running event loop.
+
+    Args:
+        root: Directory to watch recursively.
+        backend: "inotify", "poll" or "auto" (inotify, falling back to polling).
+        poll_interval: Seconds between snapshots for the polling watcher.
+
+    Returns:
+        InotifyWatcher or PollingWatcher.
+    """
+    if backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as exc:
+            if backend == "inotify":
+                raise
+            logger.info("inotify unavailable (%s), falling back to polling", exc)
+    return PollingWatcher(root, interval=poll_interval)
+
+
+async def debounced_changes(watcher, delay: float) -> Set[str]:
+    """
+    Wait for a burst of changes to settle.
+
+    Args:
+        watcher: Watcher to read changes from.
+        delay: Seconds without further changes that end the burst.
+
+    Returns:
+        Set[str]: Every path changed during the burst.
+    """
+    # A polling watcher sees a change only at its next scan, so the quiet
+    # period has to outlast one interval or bursts would never merge
+    timeout = delay + getattr(watcher, "interval", 0.0)
+    changes = await watcher.next_changes()
+    while True:
+        try:
+            more = await asyncio.wait_for(watcher.next_changes(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return changes
+        changes |= more
+
+
+def _log_failed_run(task: "asyncio.Future") -> None:
+    """Retrieve and log the exception of a run nobody else awaits."""
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error("Run failed: %s", exc, exc_info=exc)
+
+
+def _start(run: Callable[[], Awaitable[object]]) -> "asyncio.Future":
+    task = asyncio.ensure_future(run())
+    task.add_done_callback(_log_failed_run)
+    return task
+
+
+async def watch_and_run(
+    root: pathlib.Path,
+    run: Callable[[], Awaitable[object]],
+    debounce: float = 0.5,
+    backend: str = "auto",
+    poll_interval: float = 1.0,
+    max_runs: Optional[int] = None,
+) -> None:
+    """
+    Run `run` now and again after every burst of changes under `root`.
+
+    A run still in flight when new changes settle is cancelled (terminating
+    its ansible-playbook child) and started again. A run that raises is
+    logged and watching goes on.
+
+    Args:
+        root: Directory to watch recursively.
+        run: Coroutine function performing one run.
+        debounce: Seconds of quiet before a burst of changes triggers a run.
+        backend: Watcher backend, see `create_watcher`.
+        poll_interval: Seconds between snapshots when polling.
+        max_runs: Stop after this many runs have been started (for tests).
+    """
+    watcher = create_watcher(root, backend=backend, poll_interval=poll_interval)
+    logger.info("Watching %s with %s", root, type(watcher).__name__)
+    task = _start(run)
+    runs = 1
+    try:
+        while max_runs is None or runs < max_runs:
+            changed = await debounced_changes(watcher, debounce)
+            logger.info("%d changed paths, restarting run", len(changed))
+            logger.debug("Changed: %s", ", ".join(sorted(changed)[:20]))
+            if not task.done():
+                logger.info("Cancelling in-flight run")
+                task.cancel()
+                await asyncio.wait([task])
+            task = _start(run)
+            runs += 1
+        await asyncio.wait([task])
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+        watcher.close()
@@ -0,0 +1,213 @@
+"""Build ansible-execute as a single-file zipapp and benchmark its cold start.
+
+Usage:
+    python -m ansible_execute.zipapp build [-o dist/ansible-execute.pyz]
+    python -m ansible_execute.zipapp bench dist/ansible-execute.pyz
+"""
+
+import argparse
+import importlib.util
+import marshal
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PACKAGES = ("ansible_execute", "yaml")
+# Modules of a package that are not shipped
+EXCLUDED = {
+    # libyaml bindings: a C extension cannot be imported from a zip, and
+    # yaml/__init__ falls back to the pure-Python implementation without it
+    "yaml": ("cyaml.py",),
+    # The builder itself is not needed at runtime
+    "ansible_execute": ("zipapp.py",),
+}
+DATA_SUFFIXES = (".yml",)
+MAIN = "import sys\nfrom ansible_execute.main import main\nsys.exit(main())\n"
+# Fixed timestamp so identical inputs give byte-identical archives
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+
+def _package_dir(name: str) -> pathlib.Path:
+    spec = importlib.util.find_spec(name)
+    if spec is None or not spec.submodule_search_locations:
+        raise SystemExit(f"Cannot find package '{name}' to bundle")
+    return pathlib.Path(list(spec.submodule_search_locations)[0])
+
+
+def _package_files(name: str) -> Iterator[Tuple[pathlib.Path, str]]:
+    """Yield (file, archive name) for the modules and data of a package."""
+    root = _package_dir(name)
+    for path in sorted(root.rglob("*")):
+        if "__pycache__" in path.parts or not path.is_file():
+            continue
+        relative = path.relative_to(root)
+        if path.suffix == ".py" and path.name in EXCLUDED.get(name, ()):
+            continue
+        if path.suffix == ".py" or path.suffix in DATA_SUFFIXES:
+            yield path, f"{name}/{relative.as_posix()}"
+
+
+def _bytecode(source: pathlib.Path, archive_name: str, optimize: int) -> bytes:
+    """Compile a module to an unchecked hash-based .pyc image."""
+    data = source.read_bytes()
+    code = compile(data, archive_name, "exec", dont_inherit=True, optimize=optimize)
+    # Flags 0b01: hash-based, not checked against the source on import
+    header = importlib.util.MAGIC_NUMBER + (1).to_bytes(4, "little")
+    return header + importlib.util.source_hash(data) + marshal.dumps(code)
+
+
+def build(
+    output: pathlib.Path,
+    optimize: int = 2,
+    include_source: bool = False,
+    compress: bool = False,
+    interpreter: Optional[str] = None,
+) -> pathlib.Path:
+    """
+    Build a self-contained zipapp of ansible-execute and pure-Python PyYAML.
+
+    Modules are stored as precompiled bytecode so nothing is compiled on
+    start-up. Without `include_source` the archive only runs on the Python
+    minor version that built it; the default shebang names that version.
+
+    Args:
+        output: Path of the .pyz file to write.
+        optimize: Bytecode optimisation level (2 strips asserts and docstrings).
+        include_source: Also ship .py files, so other Python versions can run
+            the archive by compiling it in memory.
+        compress: Deflate the members (smaller, slightly slower to start).
+        interpreter: Shebang interpreter (default: this Python's version).
+
+    Returns:
+        pathlib.Path: The written archive.
+    """
+    interpreter = interpreter or "/usr/bin/env python{}.{}".format(
+        *sys.version_info[:2]
+    )
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+
+    with tmp.open("wb") as f:
+        f.write(f"#!{interpreter}\n".encode("utf-8"))
+        with zipfile.ZipFile(f, "w", compression=compression) as archive:
+
+            def _add(name: str, data: bytes) -> None:
+                info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+                info.compress_type = compression
+                info.external_attr = 0o644 << 16
+                archive.writestr(info, data)
+
+            _add("__main__.py", MAIN.encode("utf-8"))
+            for package in PACKAGES:
+                for path, name in _package_files(package):
+                    if path.suffix != ".py":
+                        _add(name, path.read_bytes())
+                        continue
+                    _add(name[:-3] + ".pyc", _bytecode(path, name, optimize))
+                    if include_source:
+                        _add(name, path.read_bytes())
+
+    tmp.chmod(0o755)
+    tmp.replace(output)
+    return output
+
+
+def _time_command(command: List[str], runs: int) -> Dict[str, float]:
+    """Run a command `runs` times and return start-up timings in ms."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(timings), 1),
+        "median_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+    }
+
+
+def benchmark(
+    pyz: pathlib.Path, runs: int = 10, entry_point: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compare the start-up time of the zipapp with the installed entry point.
+
+    Each command runs `--help`, which imports every module before exiting.
+
+    Args:
+        pyz: Zipapp to measure.
+        runs: Runs per command.
+        entry_point: Installed console script (default: found on PATH).
+
+    Returns:
+        Dict[str, Dict[str, float]]: Timings per command.
+    """
+    commands = {"zipapp": [sys.executable, str(pyz), "--help"]}
+    entry_point = entry_point or shutil.which("ansible-execute")
+    if entry_point:
+        commands["entry_point"] = [entry_point, "--help"]
+    commands["python -c main"] = [
+        sys.executable,
+        "-c",
+        "from ansible_execute.main import main; main()",
+        "--help",
+    ]
+    return {name: _time_command(command, runs) for name, command in commands.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line interface of the builder."""
+    parser = argparse.ArgumentParser(prog="python -m ansible_execute.zipapp")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Build the zipapp")
+    build_parser.add_argument(
+        "-o",
+        "--output",
+        type=pathlib.Path,
+        default=pathlib.Path("dist/ansible-execute.pyz"),
+    )
+    build_parser.add_argument("--optimize", type=int, choices=[0, 1, 2], default=2)
+    build_parser.add_argument("--include-source", action="store_true")
+    build_parser.add_argument("--compress", action="store_true")
+    build_parser.add_argument("--python", dest="interpreter", default=None)
+
+    bench_parser = commands.add_parser("bench", help="Benchmark cold start")
+    bench_parser.add_argument("pyz", type=pathlib.Path)
+    bench_parser.add_argument("--runs", type=int, default=10)
+    bench_parser.add_argument("--entry-point", default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        path = build(
+            args.output,
+            optimize=args.optimize,
+            include_source=args.include_source,
+            compress=args.compress,
+            interpreter=args.interpreter,
+        )
+        print(f"Built {path} ({path.stat().st_size // 1024} KiB)")
+        return
+
+    results = benchmark(args.pyz, runs=args.runs, entry_point=args.entry_point)
+    width = max(len(name) for name in results)
+    for name, timing in results.items():
+        print(
+            f"{name:<{width}}  min {timing['min_ms']:>7.1f} ms  "
+            f"median {timing['median_ms']:>7.1f} ms  max {timing['max_ms']:>7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
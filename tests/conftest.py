@@ -0,0 +1,132 @@
+"""Shared fixtures for ansible-execute tests."""
+
+import json
+import os
+import pathlib
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from ansible_execute import inventory
+
+FAKE_ANSIBLE_PLAYBOOK = textwrap.dedent("""\
+    #!{python}
+    import json, os, sys, time
+
+    calls = os.environ.get("FAKE_ANSIBLE_CALLS")
+    if calls:
+        with open(calls, "a", encoding="utf-8") as f:
+            f.write(json.dumps(sys.argv[1:]) + "\\n")
+
+    rc = int(os.environ.get("FAKE_ANSIBLE_RC", "0"))
+    hosts = os.environ.get("FAKE_ANSIBLE_HOSTS", "localhost").split(",")
+    if "--limit" in sys.argv:
+        hosts = sys.argv[sys.argv.index("--limit") + 1].split(",")
+    failing = set(os.environ.get("FAKE_ANSIBLE_FAIL_HOSTS", "").split(","))
+    if rc:
+        failing.update(hosts)
+    elif failing.intersection(hosts):
+        rc = 2
+    print("PLAY [nodes] " + "*" * 20, flush=True)
+    print("TASK [ping] " + "*" * 20, flush=True)
+    time.sleep(float(os.environ.get("FAKE_ANSIBLE_SLEEP", "0")))
+    for host in hosts:
+        if host in failing:
+            print(f"fatal: [{{host}}]: FAILED! => {{{{}}}}")
+        else:
+            print(f"ok: [{{host}}]")
+    print("PLAY RECAP " + "*" * 20)
+    for host in hosts:
+        failed = 1 if host in failing else 0
+        print(
+            f"{{host}} : ok={{1 - failed}} changed=0 unreachable=0 "
+            f"failed={{failed}} skipped=0 rescued=0 ignored=0"
+        )
+    sys.exit(rc)
+    """)
+
+
+FAKE_ANSIBLE_INVENTORY = textwrap.dedent("""\
+    #!{python}
+    import json, os, sys
+
+    calls = os.environ.get("FAKE_ANSIBLE_CALLS")
+    if calls:
+        with open(calls, "a", encoding="utf-8") as f:
+            f.write(json.dumps(["ansible-inventory"] + sys.argv[1:]) + "\\n")
+
+    print(os.environ["FAKE_ANSIBLE_INVENTORY"])
+    """)
+
+
+class FakeAnsible:
+    """Controls the fake ansible-playbook placed on PATH."""
+
+    def __init__(self, bin_dir: pathlib.Path, monkeypatch) -> None:
+        self.bin_dir = bin_dir
+        self.calls_file = bin_dir / "calls.jsonl"
+        self._monkeypatch = monkeypatch
+        monkeypatch.setenv("FAKE_ANSIBLE_CALLS", str(self.calls_file))
+
+    def configure(
+        self, rc: int = 0, sleep: float = 0.0, hosts=("localhost",), fail_hosts=()
+    ):
+        """Set exit code, run duration and recap hosts for subsequent runs."""
+        inventory = {
+            "_meta": {"hostvars": {host: {} for host in hosts}},
+            "all": {"children": ["dev", "staging", "prod"]},
+            "dev": {"hosts": list(hosts)},
+            "staging": {"hosts": list(hosts)},
+            "prod": {"hosts": list(hosts)},
+        }
+        self._monkeypatch.setenv("FAKE_ANSIBLE_INVENTORY", json.dumps(inventory))
+        self._monkeypatch.setenv("FAKE_ANSIBLE_RC", str(rc))
+        self._monkeypatch.setenv("FAKE_ANSIBLE_SLEEP", str(sleep))
+        self._monkeypatch.setenv("FAKE_ANSIBLE_HOSTS", ",".join(hosts))
+        self._monkeypatch.setenv("FAKE_ANSIBLE_FAIL_HOSTS", ",".join(fail_hosts))
+
+    def calls(self) -> list:
+        """Argument vectors of every ansible-playbook invocation so far."""
+        return [call for call in self._all_calls() if call[:1] != ["ansible-inventory"]]
+
+    def inventory_calls(self) -> list:
+        """Argument vectors of every ansible-inventory invocation so far."""
+        return [
+            call[1:] for call in self._all_calls() if call[:1] == ["ansible-inventory"]
+        ]
+
+    def _all_calls(self) -> list:
+        if not self.calls_file.exists():
+            return []
+        return [
+            json.loads(line)
+            for line in self.calls_file.read_text(encoding="utf-8").splitlines()
+        ]
+
+
+@pytest.fixture
+def fake_ansible(tmp_path, monkeypatch) -> FakeAnsible:
+    """Put a fake ansible-playbook first on PATH."""
+    bin_dir = tmp_path / "fake-bin"
+    bin_dir.mkdir()
+    for name, source in (
+        ("ansible-playbook", FAKE_ANSIBLE_PLAYBOOK),
+        ("ansible-inventory", FAKE_ANSIBLE_INVENTORY),
+    ):
+        script = bin_dir / name
+        script.write_text(source.format(python=sys.executable))
+        script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    fake = FakeAnsible(bin_dir, monkeypatch)
+    fake.configure()
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def reset_inventory_memo():
+    """Forget inventories resolved by earlier tests."""
+    inventory._resolved.clear()  # pylint: disable=protected-access
+    yield
+    inventory._resolved.clear()  # pylint: disable=protected-access
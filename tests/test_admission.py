@@ -0,0 +1,112 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import os
+import subprocess
+import time
+
+import pytest
+
+from ansible_execute import admission, executor
+
+SETTINGS = {
+    "enabled": True,
+    "max_load_per_cpu": 2.0,
+    "min_mem_available": 0.1,
+    "max_active_runs": 3,
+    "min_forks": 2,
+    "max_wait": 5,
+    "poll_interval": 0.01,
+}
+
+
+@pytest.fixture(autouse=True)
+def no_reservations(monkeypatch):
+    monkeypatch.setattr(admission, "_reserved", 0)
+
+
+def load(load_per_cpu=0.0, mem_available=0.5, active_runs=0):
+    return admission.SystemLoad(load_per_cpu, mem_available, active_runs)
+
+
+def test_pressure_is_the_worst_threshold_ratio():
+    assert admission.pressure(load(), SETTINGS) == pytest.approx(0.25)
+    assert admission.pressure(load(load_per_cpu=3.0), SETTINGS) == 1.5
+    assert admission.pressure(load(mem_available=0.05), SETTINGS) == 2.0
+    assert admission.pressure(load(active_runs=3), SETTINGS) == 1.0
+    assert admission.pressure(load(mem_available=None), {}) == 0.0
+
+
+def test_forks_scale_down_above_half_pressure():
+    assert admission.scaled_forks(20, 0.5, SETTINGS) == 20
+    assert admission.scaled_forks(20, 0.75, SETTINGS) == 10
+    assert admission.scaled_forks(20, 0.99, SETTINGS) == 2
+    assert admission.scaled_forks(None, 0.3, SETTINGS) is None
+    assert admission.scaled_forks(None, 0.8, SETTINGS) == 2
+
+
+def test_admit_waits_until_load_drops(monkeypatch):
+    loads = iter([load(load_per_cpu=4.0), load(load_per_cpu=3.0), load()])
+    monkeypatch.setattr(admission, "system_load", lambda: next(loads))
+
+    assert asyncio.run(admission.admit(SETTINGS, 10)) == 10
+
+
+def test_admit_gives_up_waiting_with_min_forks(monkeypatch):
+    monkeypatch.setattr(admission, "system_load", lambda: load(load_per_cpu=9.0))
+
+    started = time.monotonic()
+    forks = asyncio.run(admission.admit({**SETTINGS, "max_wait": 0.1}, 10))
+
+    assert forks == 2
+    assert time.monotonic() - started < 2
+
+
+def test_mem_available_reads_meminfo(tmp_path, monkeypatch):
+    (tmp_path / "meminfo").write_text(
+        "MemTotal:       1000 kB\nMemFree:  100 kB\nMemAvailable:    250 kB\n"
+    )
+    monkeypatch.setattr(admission, "PROC", tmp_path)
+
+    assert admission._mem_available() == 0.25  # pylint: disable=protected-access
+
+
+@pytest.mark.skipif(not admission.PROC.is_dir(), reason="no /proc")
+def test_active_runs_counts_controllers(fake_ansible):
+    fake_ansible.configure(sleep=5)
+    before = admission.active_runs()
+    with subprocess.Popen(["ansible-playbook", "site.yml"]) as proc:
+        time.sleep(0.3)
+        during = admission.active_runs()
+        own = admission.active_runs(exclude_children_of=os.getpid())
+        proc.kill()
+
+    assert during == before + 1
+    assert own == before
+
+
+def test_concurrent_admits_reserve_slots(monkeypatch):
+    monkeypatch.setattr(admission, "system_load", lambda: load())
+    settings = {**SETTINGS, "max_active_runs": 2, "max_wait": 0.2}
+
+    async def scenario():
+        return await asyncio.gather(*(admission.admit(settings, 8) for _ in range(3)))
+
+    forks = sorted(asyncio.run(scenario()))
+
+    # The third run only starts after max_wait, with min_forks
+    assert forks == [2, 6, 8]
+    assert admission._reserved == 3  # pylint: disable=protected-access
+
+
+def test_run_playbook_passes_scaled_forks(fake_ansible, monkeypatch):
+    monkeypatch.setattr(admission, "system_load", lambda: load(load_per_cpu=1.5))
+
+    result = asyncio.run(
+        executor.run_playbook("dev", "site", forks=20, admission=SETTINGS)
+    )
+
+    assert result.ok
+    cmd = fake_ansible.calls()[0]
+    assert cmd[cmd.index("--forks") + 1] == "10"
+    assert admission._reserved == 0  # pylint: disable=protected-access
@@ -0,0 +1,170 @@
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+import pathlib
+import textwrap
+
+import pytest
+
+from ansible_execute import changes
+
+
+def write(path: pathlib.Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(content))
+
+
+@pytest.fixture
+def ansible_tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = pathlib.Path("ansible")
+    write(
+        root / "playbooks" / "master.yml",
+        """\
+        - hosts: web
+          tags: [web]
+          roles:
+            - role: nginx
+              tags: nginx
+          tasks:
+            - import_role:
+                name: certs
+              tags: [certs]
+        - hosts: all
+          roles:
+            - common
+          tasks:
+            - include_role:
+                name: users
+                apply:
+                  tags: [users]
+              tags: [users]
+            - include_role:
+                name: motd
+        """,
+    )
+    write(root / "roles" / "nginx" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "nginx" / "meta" / "main.yml", "dependencies: [base]\n")
+    write(root / "roles" / "nginx" / "defaults" / "main.yml", "port: 80\n")
+    write(root / "roles" / "base" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "certs" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "common" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "users" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "motd" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "group_vars" / "all.yml", "x: 1\n")
+    return root
+
+
+def record(settings=None, vars_file=None, hosts=None):
+    plan = changes.plan("dev", "master", settings or {}, vars_file, hosts)
+    changes.save_snapshot(
+        changes.snapshot_path(settings or {}, "dev", "master"), plan.snapshot
+    )
+
+
+def touch(root: pathlib.Path, relative: str) -> None:
+    path = root / relative
+    path.write_text(path.read_text() + "- debug:\n")
+
+
+def test_first_run_is_full(ansible_tree):  # pylint: disable=unused-argument
+    plan = changes.plan("dev", "master", {})
+
+    assert plan.tags is None
+    assert plan.reason == "no successful run recorded"
+    assert not plan.up_to_date
+
+
+def test_unchanged_tree_is_up_to_date(ansible_tree):  # pylint: disable=unused-argument
+    record()
+
+    assert changes.plan("dev", "master", {}).up_to_date
+
+
+@pytest.mark.parametrize(
+    "changed, tags",
+    [
+        ("roles/nginx/tasks/main.yml", ["nginx", "web"]),
+        # A dependency runs with the tags of the role depending on it
+        ("roles/base/tasks/main.yml", ["nginx", "web"]),
+        ("roles/certs/tasks/main.yml", ["certs", "web"]),
+        ("roles/users/tasks/main.yml", ["users"]),
+    ],
+)
+def test_changed_role_maps_to_its_tags(ansible_tree, changed, tags):
+    record()
+    touch(ansible_tree, changed)
+
+    plan = changes.plan("dev", "master", {})
+
+    assert plan.changed == [str(ansible_tree / changed)]
+    assert plan.tags == tags
+    assert plan.reason is None
+
+
+@pytest.mark.parametrize(
+    "changed, reason",
+    [
+        ("roles/common/tasks/main.yml", "role common is applied without tags"),
+        # include_role without `apply` tags cannot be selected with --tags
+        ("roles/motd/tasks/main.yml", "role motd is applied without tags"),
+        ("roles/nginx/defaults/main.yml", "not scoped to a single role"),
+        ("group_vars/all.yml", "not scoped to a single role"),
+        ("playbooks/master.yml", "not scoped to a single role"),
+    ],
+)
+def test_ambiguous_changes_run_everything(ansible_tree, changed, reason):
+    record()
+    touch(ansible_tree, changed)
+
+    plan = changes.plan("dev", "master", {})
+
+    assert plan.tags is None
+    assert reason in plan.reason
+
+
+def test_changed_extra_vars_run_everything(ansible_tree, tmp_path):
+    # pylint: disable=unused-argument
+    record(vars_file=tmp_path / "aaa.json")
+
+    plan = changes.plan("dev", "master", {}, tmp_path / "bbb.json")
+
+    assert plan.tags is None
+    assert plan.reason == "extra-vars changed"
+
+
+def test_snapshots_are_per_environment(ansible_tree):
+    record(settings={"state": {"dir": "state"}})
+    touch(ansible_tree, "roles/certs/tasks/main.yml")
+
+    assert changes.plan("dev", "master", {}).reason == "no successful run recorded"
+    assert changes.plan("dev", "master", {"state": {"dir": "state"}}).tags
+
+
+def test_unreadable_snapshot_is_ignored(ansible_tree, caplog):
+    # pylint: disable=unused-argument
+    path = changes.snapshot_path({}, "dev", "master")
+    path.parent.mkdir(parents=True)
+    path.write_text("{not json")
+
+    assert changes.load_snapshot(path) is None
+    assert "Ignoring unreadable snapshot" in caplog.text
+
+
+def test_host_changes_run_everything(ansible_tree):  # pylint: disable=unused-argument
+    record(hosts=["web1"])
+
+    assert changes.plan("dev", "master", {}, hosts=["web1"]).up_to_date
+    plan = changes.plan("dev", "master", {}, hosts=["web1", "web2"])
+    assert plan.reason == "hosts changed"
+    assert changes.plan("dev", "master", {}).reason == "hosts changed"
+
+
+def test_inventory_changes_run_everything(ansible_tree):
+    inventory_file = ansible_tree / "hosts.ini"
+    inventory_file.write_text("[dev]\nweb1\n")
+    settings = {"inventory": {"sources": [str(inventory_file)]}}
+    record(settings)
+
+    inventory_file.write_text("[dev]\nweb1 ansible_port=2222\n")
+
+    assert changes.plan("dev", "master", settings).reason == "inventory changed"
@@ -0,0 +1,99 @@
+# pylint: disable=missing-function-docstring
+
+from types import SimpleNamespace
+
+from ansible_execute import checkpoints
+from ansible_execute.events import ProgressTracker
+
+OUTPUT = [
+    "PLAY [nodes] ***",
+    "TASK [Gathering Facts] ***",
+    "ok: [web1]",
+    "ok: [web2]",
+    "ok: [web3]",
+    "TASK [deploy] ***",
+    "ok: [web1]",
+    "fatal: [web2]: FAILED! => {}",
+    "ok: [web3]",
+    "TASK [migrate] ***",
+    "fatal: [web3]: FAILED! => {}",
+]
+
+
+def tracked(lines=OUTPUT):
+    tracker = ProgressTracker()
+    for line in lines:
+        tracker.feed(line)
+    return tracker
+
+
+def new_checkpoint(tmp_path, limit=None):
+    return checkpoints.Checkpoint(
+        tmp_path / "dev-master.json", "dev", "master", "abc", limit=limit
+    )
+
+
+def result(ok, failed=()):
+    return SimpleNamespace(ok=ok, failed_hosts=list(failed))
+
+
+def test_update_resumes_all_hosts_at_earliest_open_task(tmp_path):
+    checkpoint = new_checkpoint(tmp_path, limit=["web1", "web2", "web3"])
+
+    checkpoint.update(tracked())
+
+    saved = checkpoints.Checkpoint.load(checkpoint.path)
+    assert saved.start_at == "deploy"
+    assert saved.hosts == ["web1", "web2", "web3"]
+    assert saved.last_completed["task"] == "deploy"
+    assert saved.last_completed["hosts"] == ["web1", "web3"]
+    assert saved.fingerprint == "abc"
+
+
+def test_finish_resumes_failed_hosts_from_recap(tmp_path):
+    checkpoint = new_checkpoint(tmp_path)
+
+    checkpoint.finish(result(False, ["web3"]), tracked())
+
+    saved = checkpoints.Checkpoint.load(checkpoint.path)
+    assert saved.hosts == ["web3"]
+    assert saved.start_at == "migrate"
+
+
+def test_failure_while_gathering_facts_restarts_from_the_top(tmp_path):
+    checkpoint = new_checkpoint(tmp_path)
+    lines = OUTPUT[:3] + ["fatal: [web2]: UNREACHABLE! => {}"]
+
+    checkpoint.finish(result(False, ["web2"]), tracked(lines))
+
+    assert checkpoints.Checkpoint.load(checkpoint.path).start_at is None
+
+
+def test_finish_clears_checkpoint_on_success(tmp_path):
+    checkpoint = new_checkpoint(tmp_path)
+    checkpoint.update(tracked())
+
+    checkpoint.finish(result(True), tracked())
+
+    assert not checkpoint.path.exists()
+    assert checkpoints.Checkpoint.load(checkpoint.path) is None
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path, caplog):
+    path = tmp_path / "dev-master.json"
+    path.write_text('{"env": "dev"}')
+
+    assert checkpoints.Checkpoint.load(path) is None
+    assert "Ignoring unreadable checkpoint" in caplog.text
+
+
+def test_fingerprint_tracks_files_and_extra_vars():
+    snapshot = {"files": {"a.yml": "1"}, "extra_vars": "x.json"}
+
+    assert checkpoints.fingerprint(snapshot) == checkpoints.fingerprint(dict(snapshot))
+    assert checkpoints.fingerprint(snapshot) != checkpoints.fingerprint(
+        {**snapshot, "files": {"a.yml": "2"}}
+    )
+    assert checkpoints.fingerprint(snapshot) != checkpoints.fingerprint(
+        {**snapshot, "extra_vars": "y.json"}
+    )
@@ -0,0 +1,117 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import pathlib
+
+from ansible_execute import checks
+
+
+def make_tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    playbook_dir = pathlib.Path("ansible/playbooks")
+    playbook_dir.mkdir(parents=True)
+    (playbook_dir / "site.yml").write_text("- hosts: all\n  roles: [web]\n")
+    (playbook_dir / "other.yml").write_text("- hosts: all\n  tasks: []\n")
+    role = pathlib.Path("ansible/roles/web/tasks")
+    role.mkdir(parents=True)
+    (role / "main.yml").write_text("- ping:\n")
+    return tmp_path / "cache"
+
+
+def run(targets, cache_dir):
+    return asyncio.run(checks.run_checks(targets, lambda env: cache_dir, concurrency=4))
+
+
+def test_checks_run_both_commands_in_parallel(fake_ansible, tmp_path, monkeypatch):
+    cache_dir = make_tree(tmp_path, monkeypatch)
+
+    results = run([("dev", "site"), ("prod", "site")], cache_dir)
+
+    assert [(r.env, r.ok, r.cached) for r in results] == [
+        ("dev", True, False),
+        ("prod", True, False),
+    ]
+    flags = sorted(call[-1] for call in fake_ansible.calls())
+    assert flags == ["--list-tasks"] * 2 + ["--syntax-check"] * 2
+    assert any(line.startswith("[syntax] ") for line in results[0].output)
+
+
+def test_checks_are_cached_by_content(fake_ansible, tmp_path, monkeypatch):
+    cache_dir = make_tree(tmp_path, monkeypatch)
+    run([("dev", "site"), ("dev", "other")], cache_dir)
+    assert len(fake_ansible.calls()) == 4
+
+    # Nothing changed: answered from cache without running ansible-playbook
+    results = run([("dev", "site"), ("dev", "other")], cache_dir)
+    assert all(result.cached for result in results)
+    assert len(fake_ansible.calls()) == 4
+
+    # A role only `site` uses changed: only `site` is re-checked
+    pathlib.Path("ansible/roles/web/tasks/main.yml").write_text("- debug:\n")
+    results = run([("dev", "site"), ("dev", "other")], cache_dir)
+    assert [result.cached for result in results] == [False, True]
+    assert len(fake_ansible.calls()) == 6
+
+
+def test_checks_do_not_cache_failures(fake_ansible, tmp_path, monkeypatch, caplog):
+    cache_dir = make_tree(tmp_path, monkeypatch)
+    fake_ansible.configure(rc=4)
+
+    assert not run([("dev", "site")], cache_dir)[0].ok
+    # A failed check is its answer, not a failed run to report
+    assert "Playbook run failed" not in caplog.text
+
+    # Fixed outside the playbook tree (e.g. a collection was installed)
+    fake_ansible.configure()
+    result = run([("dev", "site")], cache_dir)[0]
+    assert result.ok and not result.cached
+
+
+def test_checks_without_cache(fake_ansible, tmp_path, monkeypatch):
+    make_tree(tmp_path, monkeypatch)
+    run([("dev", "site")], None)
+    run([("dev", "site")], None)
+    assert len(fake_ansible.calls()) == 4
+
+
+def test_checks_do_not_cache_missing_binary(tmp_path, monkeypatch):
+    cache_dir = make_tree(tmp_path, monkeypatch)
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    assert not run([("dev", "site")], cache_dir)[0].ok
+    assert not cache_dir.exists()
+
+
+def test_checks_use_extra_vars_and_inventory(fake_ansible, tmp_path, monkeypatch):
+    cache_dir = make_tree(tmp_path, monkeypatch)
+    pathlib.Path("hosts.ini").write_text("[dev]\nhost1\n")
+    settings = {
+        "extra_vars": {"values": {"release": "1.0"}},
+        "inventory": {"sources": ["hosts.ini"]},
+    }
+
+    def run_with_settings():
+        return asyncio.run(
+            checks.run_checks(
+                [("dev", "site")],
+                lambda env: cache_dir,
+                concurrency=4,
+                settings_for=lambda env: settings,
+            )
+        )
+
+    run_with_settings()
+    assert all(
+        call[call.index("--extra-vars") + 1].startswith("@")
+        for call in fake_ansible.calls()
+    )
+    assert run_with_settings()[0].cached
+
+    # Changed extra-vars are a different check
+    settings["extra_vars"]["values"]["release"] = "2.0"
+    assert not run_with_settings()[0].cached
+
+    # So is a changed inventory
+    pathlib.Path("hosts.ini").write_text("[dev]\nhost1\nhost2\n")
+    assert not run_with_settings()[0].cached
+    assert len(fake_ansible.calls()) == 6
@@ -23,3 +23,41 @@ def test_env_arg_invalid(monkeypatch) -> None:
     monkeypatch.setattr("sys.argv", ["prog", "-e", "banana"])
     with pytest.raises(SystemExit):
         parse_args()
+
+
+def test_env_and_playbook_repeatable(monkeypatch) -> None:
+    """Test that -e and -p can be given several times."""
+    monkeypatch.setattr(
+        "sys.argv", ["prog", "-e", "dev", "-e", "prod", "-e", "dev", "-p", "site"]
+    )
+    args = parse_args()
+    assert args.env == "dev"
+    assert args.envs == ["dev", "prod"]
+    assert args.playbooks == ["site"]
+
+
+def test_env_and_playbook_defaults(monkeypatch) -> None:
+    """Test that the default env and playbook populate the lists."""
+    monkeypatch.setattr("sys.argv", ["prog"])
+    args = parse_args()
+    assert args.envs == ["prod"]
+    assert args.playbooks == ["master"]
+
+
+def test_logs_time_bounds_are_normalised(monkeypatch) -> None:
+    """Test that --since/--until are parsed, a bare --until to the end of day."""
+    monkeypatch.setattr(
+        "sys.argv", ["prog", "logs", "--since", "2026-10-18", "--until", "2026-10-18"]
+    )
+    args = parse_args()
+    assert args.since == "2026-10-18T00:00:00"
+    assert args.until == "2026-10-18T23:59:59"
+
+
+def test_logs_invalid_time_is_a_usage_error(monkeypatch, capsys) -> None:
+    """Test that a bad --since exits with a usage error, not a traceback."""
+    monkeypatch.setattr("sys.argv", ["prog", "logs", "--since", "yesterday"])
+    with pytest.raises(SystemExit) as exc:
+        parse_args()
+    assert exc.value.code == 2
+    assert "Invalid time 'yesterday'" in capsys.readouterr().err
@@ -0,0 +1,294 @@
+# pylint: disable=missing-function-docstring,redefined-outer-name,unused-argument
+
+import asyncio
+import json
+
+import pytest
+
+from ansible_execute import distributed, exceptions
+
+HOSTS = [f"web{i}" for i in range(1, 11)]
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def limits(calls):
+    return [call[call.index("--limit") + 1].split(",") for call in calls]
+
+
+async def start(coordinator):
+    address = await coordinator.start("127.0.0.1:0")
+    return address, asyncio.ensure_future(coordinator.wait())
+
+
+def test_chunk_size_weights_by_throughput():
+    # Unmeasured agents split the remaining hosts evenly, half at a time
+    assert distributed.chunk_size(100, None, [None]) == 25
+    # A twice as fast agent gets twice the share
+    assert distributed.chunk_size(90, 2.0, [1.0]) == 30
+    assert distributed.chunk_size(90, 1.0, [2.0]) == 15
+    # Unmeasured agents are assumed average
+    assert distributed.chunk_size(90, None, [2.0, 1.0]) == 15
+    assert distributed.chunk_size(100, None, [], min_chunk=80) == 80
+    assert distributed.chunk_size(100, None, [], max_chunk=10) == 10
+    assert distributed.chunk_size(3, None, [], min_chunk=10) == 3
+    # Float noise in the share does not round the chunk up
+    assert distributed.chunk_size(6, 23 / 7.3, []) == 3
+
+
+def test_agent_stats_smooth_throughput():
+    stats = distributed.AgentStats("a")
+    stats.record(10, 1.0)
+    stats.record(30, 1.0)
+
+    assert stats.jobs == 2
+    assert stats.hosts == 40
+    assert stats.throughput == pytest.approx(20.0)
+
+
+def test_coordinator_spreads_hosts_over_agents(fake_ansible, workdir, caplog):
+    fake_ansible.configure(hosts=HOSTS, sleep=0.2)
+    lines = []
+
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS, {"nodes": ["dev"]})],
+            token=TOKEN,
+            on_output=lines.append,
+        )
+        address, done = await start(coordinator)
+        jobs = await asyncio.gather(
+            distributed.run_agent(address, name="a", token=TOKEN),
+            distributed.run_agent(address, name="b", token=TOKEN),
+        )
+        results = await done
+        await coordinator.close()
+        return coordinator, jobs, results
+
+    with caplog.at_level("INFO"):
+        coordinator, jobs, results = asyncio.run(scenario())
+
+    result = results[("dev", "master")]
+    assert result.ok
+    assert sorted(result.stats) == sorted(HOSTS)
+    assert all(count > 0 for count in jobs)
+    assert set(coordinator.agents) == {"a", "b"}
+    # Every host ran exactly once
+    ran = [host for limit in limits(fake_ansible.calls()) for host in limit]
+    assert sorted(ran) == sorted(HOSTS)
+    assert any(line.startswith("[a] ok: [web") for line in lines)
+
+    (record,) = [r for r in caplog.records if r.msg == "Distributed run finished"]
+    assert record.data["hosts"] == len(HOSTS)
+    assert set(record.data["agents"]) == {"a", "b"}
+    # The extra-vars travel with the job
+    call = fake_ansible.calls()[0]
+    bundle = call[call.index("--extra-vars") + 1][1:]
+    assert json.loads((workdir / bundle).read_text()) == {"nodes": ["dev"]}
+
+
+def test_whole_runs_are_single_jobs(fake_ansible, workdir):
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [
+                distributed.Target("dev", "master", None),
+                distributed.Target("staging", "master", None),
+            ],
+            token=TOKEN,
+        )
+        address, done = await start(coordinator)
+        jobs = await distributed.run_agent(address, token=TOKEN)
+        results = await done
+        await coordinator.close()
+        return jobs, results
+
+    jobs, results = asyncio.run(scenario())
+
+    assert jobs == 2
+    assert set(results) == {("dev", "master"), ("staging", "master")}
+    assert all("--limit" not in call for call in fake_ansible.calls())
+
+
+def test_failed_hosts_fail_the_merged_result(fake_ansible, workdir):
+    fake_ansible.configure(hosts=HOSTS, fail_hosts=("web3",))
+
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS)], TOKEN, max_chunk=4
+        )
+        address, done = await start(coordinator)
+        await distributed.run_agent(address, token=TOKEN)
+        results = await done
+        await coordinator.close()
+        return results
+
+    result = asyncio.run(scenario())[("dev", "master")]
+
+    assert not result.ok
+    assert result.failed_hosts == ["web3"]
+    # Chunks shrink as the remaining hosts run out
+    assert [len(limit) for limit in limits(fake_ansible.calls())] == [4, 3, 2, 1]
+
+
+def test_invalid_token_is_rejected(fake_ansible, workdir, caplog):
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS)], token=TOKEN
+        )
+        address, _ = await start(coordinator)
+        host, port = address.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host, int(port))
+        hello = {"type": "hello", "name": "rogue", "nonce": "n", "version": 2}
+        writer.write(json.dumps(hello).encode() + b"\n")
+        nonce = json.loads(await reader.readline())["nonce"]
+        proof = distributed._proof(  # pylint: disable=protected-access
+            "wrong", "agent", "n", nonce
+        )
+        for message in ({"type": "auth", "proof": proof}, {"type": "ready"}):
+            writer.write(json.dumps(message).encode() + b"\n")
+        reply = json.loads(await reader.readline())
+        writer.close()
+        await coordinator.close()
+        return reply
+
+    reply = asyncio.run(scenario())
+
+    assert reply == {"type": "error", "message": "invalid token"}
+    assert "Rejected agent rogue: invalid token" in caplog.text
+    assert not fake_ansible.calls()
+
+
+def test_agent_rejects_coordinator_without_the_token(fake_ansible, workdir):
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS)], token="impostor"
+        )
+        address, _ = await start(coordinator)
+        try:
+            await distributed.run_agent(address, token=TOKEN)
+        finally:
+            await coordinator.close()
+
+    with pytest.raises(exceptions.DistributedError, match="does not know the token"):
+        asyncio.run(scenario())
+    assert not fake_ansible.calls()
+
+
+def test_token_is_never_sent(fake_ansible, workdir, monkeypatch):
+    sent = []
+    send = distributed._send  # pylint: disable=protected-access
+
+    async def spy(writer, message):
+        sent.append(json.dumps(message))
+        await send(writer, message)
+
+    monkeypatch.setattr(distributed, "_send", spy)
+
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", None)], TOKEN
+        )
+        address, done = await start(coordinator)
+        await distributed.run_agent(address, token=TOKEN)
+        await done
+        await coordinator.close()
+
+    asyncio.run(scenario())
+
+    assert sent and not any(TOKEN in message for message in sent)
+
+
+def test_empty_token_is_refused(workdir):
+    with pytest.raises(exceptions.DistributedError, match="token is required"):
+        distributed.Coordinator([distributed.Target("dev", "master", HOSTS)], "")
+    with pytest.raises(exceptions.DistributedError, match="token is required"):
+        asyncio.run(distributed.run_agent("127.0.0.1:7700", token=""))
+
+
+def test_bare_port_listens_on_loopback(workdir):
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", None)], TOKEN
+        )
+        address = await coordinator.start("0")
+        await coordinator.close()
+        return address
+
+    assert asyncio.run(scenario()).startswith("127.0.0.1:")
+
+
+def test_unreachable_coordinator_raises(workdir):
+    with pytest.raises(exceptions.DistributedError, match="Cannot reach"):
+        asyncio.run(
+            distributed.run_agent(f"unix:{workdir / 'missing.sock'}", token=TOKEN)
+        )
+
+
+def test_job_of_lost_agent_is_handed_out_again(fake_ansible, workdir, caplog):
+    fake_ansible.configure(hosts=HOSTS)
+
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS)], TOKEN, max_chunk=5
+        )
+        address, done = await start(coordinator)
+        host, port = address.rsplit(":", 1)
+
+        # An agent that takes a job and disappears
+        reader, writer = await asyncio.open_connection(host, int(port))
+        hello = {"type": "hello", "name": "flaky", "nonce": "n", "version": 2}
+        writer.write(json.dumps(hello).encode() + b"\n")
+        nonce = json.loads(await reader.readline())["nonce"]
+        proof = distributed._proof(  # pylint: disable=protected-access
+            TOKEN, "agent", "n", nonce
+        )
+        for message in ({"type": "auth", "proof": proof}, {"type": "ready"}):
+            writer.write(json.dumps(message).encode() + b"\n")
+        await reader.readline()  # welcome
+        job = json.loads(await reader.readline())
+        writer.close()
+
+        await distributed.run_agent(address, name="steady", token=TOKEN)
+        results = await done
+        await coordinator.close()
+        return job, results
+
+    job, results = asyncio.run(scenario())
+
+    assert len(job["hosts"]) == 5
+    assert sorted(results[("dev", "master")].stats) == sorted(HOSTS)
+    assert "Agent flaky left during job 1" in caplog.text
+
+
+def test_agent_refuses_job_for_another_tree(fake_ansible, workdir, caplog):
+    async def scenario():
+        coordinator = distributed.Coordinator(
+            [distributed.Target("dev", "master", HOSTS, fingerprint="elsewhere")],
+            TOKEN,
+            min_chunk=len(HOSTS),
+            max_attempts=1,
+        )
+        address, done = await start(coordinator)
+        with pytest.raises(exceptions.DistributedError, match="differs"):
+            await distributed.run_agent(address, token=TOKEN)
+        results = await done
+        await coordinator.close()
+        return results
+
+    result = asyncio.run(scenario())[("dev", "master")]
+
+    assert not result.ok
+    assert "disconnected" in result.error
+    assert sorted(result.failed_hosts) == sorted(HOSTS)
+    assert not fake_ansible.calls()
+    assert "Giving up on job 1" in caplog.text
+
+
+def test_coordinator_requires_hosts():
+    with pytest.raises(exceptions.DistributedError, match="No hosts"):
+        distributed.Coordinator([distributed.Target("dev", "master", [])], TOKEN)
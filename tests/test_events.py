@@ -0,0 +1,94 @@
+# pylint: disable=missing-function-docstring
+
+from ansible_execute.events import ProgressTracker, RecapParser, strip_ansi
+
+RECAP = """\
+PLAY [nodes] ***
+TASK [ping] ***
+ok: [web1]
+web1 : ok=9 changed=9
+PLAY RECAP *********************************************************************
+\x1b[0;32mweb1\x1b[0m                       : \x1b[0;32mok=3   \x1b[0m changed=1    \
+unreachable=0    failed=0    skipped=2    rescued=0    ignored=0
+db1                        : ok=1    changed=0    unreachable=1    failed=0    \
+skipped=0    rescued=0    ignored=0
+
+Playbook run took 0 days, 0 hours, 0 minutes, 5 seconds
+"""
+
+
+def test_strip_ansi():
+    assert strip_ansi("\x1b[0;31mfatal\x1b[0m") == "fatal"
+
+
+def test_recap_parser_collects_stats_only_inside_recap():
+    parser = RecapParser()
+    for line in RECAP.splitlines():
+        parser.feed(line)
+
+    assert parser.stats == {
+        "web1": {
+            "ok": 3,
+            "changed": 1,
+            "unreachable": 0,
+            "failed": 0,
+            "skipped": 2,
+            "rescued": 0,
+            "ignored": 0,
+        },
+        "db1": {
+            "ok": 1,
+            "changed": 0,
+            "unreachable": 1,
+            "failed": 0,
+            "skipped": 0,
+            "rescued": 0,
+            "ignored": 0,
+        },
+    }
+
+
+PROGRESS = """\
+PLAY [nodes] ***
+TASK [Gathering Facts] ***
+ok: [web1]
+ok: [web2]
+fatal: [db1]: UNREACHABLE! => {}
+TASK [common : install packages] ***
+changed: [web1] => (item=vim)
+failed: [web2] (item=vim) => {}
+fatal: [web2]: FAILED! => {"msg": "One or more items failed"}
+TASK [probe] ***
+fatal: [web1]: FAILED! => {}
+...ignoring
+included: /ansible/tasks/extra.yml for web1
+TASK [restart] ***
+"""
+
+
+def test_progress_tracker_follows_tasks_and_failures():
+    tracker = ProgressTracker()
+    completed = [tracker.feed(line) for line in PROGRESS.splitlines()]
+
+    assert completed.count(True) == 3
+    assert tracker.current.task == "restart"
+    assert tracker.last_completed.task == "probe"
+    assert tracker.last_completed.index == 3
+    assert tracker.completed_hosts == ["web1"]
+    # The ignored failure of web1 is forgotten
+    assert {host: task.task for host, task in tracker.failures.items()} == {
+        "db1": "Gathering Facts",
+        "web2": "common : install packages",
+    }
+    assert not tracker.failures["db1"].selectable
+    assert tracker.failures["web2"].selectable
+
+
+def test_progress_tracker_completes_last_task_at_recap():
+    tracker = ProgressTracker()
+    for line in ["PLAY [all] ***", "RUNNING HANDLER [reload] ***", "ok: [web1]"]:
+        tracker.feed(line)
+
+    assert tracker.feed("PLAY RECAP ***")
+    assert tracker.last_completed.handler
+    assert not tracker.last_completed.selectable
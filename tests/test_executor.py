@@ -1,42 +1,212 @@
 """Tests for ansible playbook executor."""
 
-import subprocess
+import asyncio
 import json
-from unittest import mock
+import os
+import sys
+import tempfile
+import time
 
 import pytest
+from ansible_execute import executor
 from ansible_execute.executor import run_ansible_playbook
 
 
-@mock.patch("subprocess.run")
-def test_run_ansible_playbook_success(mock_run: mock.Mock) -> None:
+def test_run_ansible_playbook_success(fake_ansible) -> None:
     """Test successful playbook execution."""
-    # Arrange: simulate a zero‑exit code
-    mock_run.return_value = subprocess.CompletedProcess(args=[], returncode=0)
-
     # Act
-    run_ansible_playbook("dev", "test")
+    result = run_ansible_playbook("dev", "test")
 
     # Assert
     expected_extra_vars = json.dumps({"nodes": ["dev"]})
-    mock_run.assert_called_once_with(
+    assert fake_ansible.calls() == [
         [
-            "ansible-playbook",
             "ansible/playbooks/test.yml",
             "--extra-vars",
             expected_extra_vars,
-        ],
-        check=True,
-    )
+        ]
+    ]
+    assert result.ok
+    assert result.stats == {
+        "localhost": {
+            "ok": 1,
+            "changed": 0,
+            "unreachable": 0,
+            "failed": 0,
+            "skipped": 0,
+            "rescued": 0,
+            "ignored": 0,
+        }
+    }
 
 
-@mock.patch(
-    "subprocess.run", side_effect=subprocess.CalledProcessError(2, ["ansible-playbook"])
-)
-def test_run_ansible_playbook_failure(mock_run: mock.Mock) -> None:
+def test_run_ansible_playbook_failure(fake_ansible) -> None:
     """Test that a non-zero exit code bubbles up as SystemExit."""
+    fake_ansible.configure(rc=2)
     with pytest.raises(SystemExit) as exc:
         run_ansible_playbook("staging", "test")
     assert exc.value.code == 2
-    # We still logged the error inside executor (you could capture it via caplog)
-    mock_run.assert_called_once()
+    assert len(fake_ansible.calls()) == 1
+
+
+def test_run_ansible_playbook_passes_forks_and_limit(fake_ansible) -> None:
+    """Test that per-environment forks and pre-flight limits are passed."""
+    run_ansible_playbook("prod", "test", forks=20, limit=["web1", "web2"])
+
+    cmd = fake_ansible.calls()[0]
+    assert cmd[-4:] == ["--forks", "20", "--limit", "web1,web2"]
+
+
+def test_run_ansible_playbook_timeout(fake_ansible) -> None:
+    """Test that a timed out run exits with a non-zero code."""
+    fake_ansible.configure(sleep=10)
+    with pytest.raises(SystemExit) as exc:
+        run_ansible_playbook("prod", "test", timeout=1)
+    assert exc.value.code == 1
+
+
+def test_run_playbook_returns_structured_failure(fake_ansible) -> None:
+    """Test that the async API reports failures instead of exiting."""
+    fake_ansible.configure(rc=4, hosts=("web1", "web2"))
+    lines = []
+
+    result = asyncio.run(
+        executor.run_playbook("prod", "site", verbosity=2, on_output=lines.append)
+    )
+
+    assert not result.ok
+    assert result.exit_code == 4
+    assert result.command[-1] == "-vv"
+    assert result.failed_hosts == ["web1", "web2"]
+    assert "fatal: [web1]: FAILED! => {}" in lines
+    assert result.finished_at >= result.started_at
+    assert result.duration > 0
+
+
+def test_run_playbook_missing_binary(monkeypatch, tmp_path) -> None:
+    """Test that a missing ansible-playbook is reported as exit code 127."""
+    monkeypatch.setenv("PATH", str(tmp_path))
+    result = asyncio.run(executor.run_playbook("dev", "site"))
+    assert result.exit_code == 127
+    assert result.error
+
+
+def test_run_playbook_cancel_terminates_child(fake_ansible) -> None:
+    """Test that cancelling a run stops the child process."""
+    fake_ansible.configure(sleep=30)
+
+    async def scenario():
+        task = asyncio.create_task(executor.run_playbook("dev", "site"))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+
+
+def test_run_playbooks_runs_concurrently(fake_ansible) -> None:
+    """Test that many runs share one event loop and overlap in time."""
+    fake_ansible.configure(sleep=0.5)
+    runs = [{"env": env, "playbook": "site"} for env in ("dev", "staging", "prod")]
+
+    results = asyncio.run(executor.run_playbooks(runs, concurrency=3))
+
+    assert [result.env for result in results] == ["dev", "staging", "prod"]
+    assert all(result.ok for result in results)
+    # Overlapping runs: every run started before the first one finished
+    first_finish = min(result.finished_at for result in results)
+    assert all(result.started_at < first_finish for result in results)
+
+
+def test_failed_run_writes_failure_report(fake_ansible, tmp_path, caplog) -> None:
+    """Test that a failed run logs and writes a report with its context."""
+    fake_ansible.configure(hosts=("web1", "web2"), fail_hosts=("web2",))
+
+    with caplog.at_level("ERROR", logger="ansible_execute.executor"):
+        result = asyncio.run(
+            executor.run_playbook("dev", "site", failure_dir=tmp_path / "failures")
+        )
+
+    assert not result.ok
+    logged = [r for r in caplog.records if r.getMessage().startswith("Playbook run")]
+    assert logged[0].getMessage() == "Playbook run failed on web2 at task 'ping'"
+    (path,) = (tmp_path / "failures").iterdir()
+    report = json.loads(path.read_text())
+    assert report["first_failure"]["host"] == "web2"
+    assert report["failed_hosts"] == ["web2"]
+    assert report["output"][-3] == "PLAY RECAP " + "*" * 20
+
+
+def test_successful_run_writes_no_failure_report(fake_ansible, tmp_path) -> None:
+    """Test that no report is written when the run succeeds."""
+    asyncio.run(executor.run_playbook("dev", "site", failure_dir=tmp_path / "out"))
+    assert not (tmp_path / "out").exists()
+
+
+IGNORES_SIGTERM = """#!{python}
+import os, signal, time
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+with open(os.environ["PID_FILE"], "w", encoding="utf-8") as f:
+    f.write(str(os.getpid()))
+print("PLAY [nodes] ***", flush=True)
+time.sleep(60)
+"""
+
+
+def _alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            # Zombies are dead, just not reaped by their new parent yet
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _dies(pid: int, timeout: float = 3.0) -> bool:
+    # SIGKILL is delivered asynchronously: give the kernel a moment to reap
+    deadline = time.monotonic() + timeout
+    while _alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_timeout_kills_child_that_ignores_sigterm(tmp_path, monkeypatch) -> None:
+    """Test that the whole process group is killed after the grace period."""
+    script = tmp_path / "ansible-playbook"
+    script.write_text(IGNORES_SIGTERM.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PID_FILE", str(tmp_path / "pid"))
+    monkeypatch.setattr(executor, "TERMINATE_GRACE", 0.5)
+
+    started = time.monotonic()
+    result = asyncio.run(executor.run_playbook("dev", "site", timeout=1))
+
+    assert result.timed_out
+    assert time.monotonic() - started < 5
+    assert _dies(int((tmp_path / "pid").read_text()))
+
+
+def test_failing_output_callback_stops_the_child(tmp_path, monkeypatch) -> None:
+    """Test that an exception from on_output terminates the run and cleans up."""
+    script = tmp_path / "ansible-playbook"
+    script.write_text(IGNORES_SIGTERM.format(python=sys.executable))
+    script.chmod(0o755)
+    scratch = tmp_path / "tmp"
+    scratch.mkdir()
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PID_FILE", str(tmp_path / "pid"))
+    monkeypatch.setattr(executor, "TERMINATE_GRACE", 0.5)
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch))
+
+    def closed_pipe(line: str) -> None:
+        raise BrokenPipeError(line)
+
+    with pytest.raises(BrokenPipeError):
+        asyncio.run(executor.run_playbook("dev", "site", on_output=closed_pipe))
+
+    assert _dies(int((tmp_path / "pid").read_text()))
+    assert not list(scratch.iterdir())
@@ -0,0 +1,77 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import json
+
+import pytest
+
+from ansible_execute import exceptions, executor, extravars
+
+
+@pytest.fixture(autouse=True)
+def clear_memo():
+    extravars._bundles.clear()  # pylint: disable=protected-access
+    yield
+    extravars._bundles.clear()  # pylint: disable=protected-access
+
+
+def settings_for(tmp_path, **extra_vars):
+    return {"state": {"dir": str(tmp_path / "state")}, "extra_vars": extra_vars}
+
+
+def test_collect_merges_files_values_and_nodes(tmp_path):
+    (tmp_path / "common.yml").write_text("ntp: {servers: [a]}\nregion: eu\n")
+    (tmp_path / "dev.json").write_text('{"ntp": {"pool": true}, "nodes": ["x"]}')
+    settings = settings_for(
+        tmp_path,
+        files=[str(tmp_path / "common.yml"), str(tmp_path / "{env}.json")],
+        values={"region": "us"},
+    )
+
+    assert extravars.collect("dev", settings) == {
+        "ntp": {"servers": ["a"], "pool": True},
+        "region": "us",
+        "nodes": ["dev"],
+    }
+
+
+def test_collect_rejects_missing_and_non_mapping_files(tmp_path):
+    with pytest.raises(exceptions.ConfigError, match="Could not read"):
+        extravars.collect("dev", settings_for(tmp_path, files=["missing.yml"]))
+
+    (tmp_path / "list.yml").write_text("- a\n")
+    with pytest.raises(exceptions.ConfigError, match="must contain a mapping"):
+        extravars.collect(
+            "dev", settings_for(tmp_path, files=[str(tmp_path / "list.yml")])
+        )
+
+
+def test_bundle_is_content_addressed_and_reused(tmp_path):
+    source = tmp_path / "vars.yml"
+    source.write_text("a: 1\n")
+    settings = settings_for(tmp_path, files=[str(source)])
+
+    first = extravars.bundle("dev", settings)
+    assert json.loads(first.read_text()) == {"a": 1, "nodes": ["dev"]}
+    assert extravars.bundle("dev", settings) == first
+
+    # Another process (empty memo) with the same inputs shares the file
+    extravars._bundles.clear()  # pylint: disable=protected-access
+    assert extravars.bundle("dev", settings) == first
+
+    source.write_text("a: 22\n")
+    changed = extravars.bundle("dev", settings)
+    assert changed != first
+    assert extravars.bundle("prod", settings) not in (first, changed)
+
+
+def test_run_playbook_passes_bundle_as_file(fake_ansible, tmp_path):
+    vars_file = extravars.bundle("dev", settings_for(tmp_path, values={"x": 1}))
+
+    result = asyncio.run(
+        executor.run_playbook("dev", "site", extra_vars_file=vars_file)
+    )
+
+    assert result.ok
+    cmd = fake_ansible.calls()[0]
+    assert cmd[1:3] == ["--extra-vars", f"@{vars_file}"]
@@ -0,0 +1,100 @@
+# pylint: disable=missing-function-docstring
+
+import json
+from types import SimpleNamespace
+
+from ansible_execute import failures
+
+OUTPUT = [
+    "PLAY [nodes] ***",
+    "TASK [deploy] ***",
+    "ok: [web1]",
+    "fatal: [web2]: FAILED! => {}",
+    "...ignoring",
+    "TASK [migrate] ***",
+    "fatal: [web3]: FAILED! => {}",
+    "fatal: [web1]: UNREACHABLE! => {}",
+]
+
+
+def fed(output=OUTPUT, **kwargs):
+    context = failures.FailureContext(**kwargs)
+    for line in output:
+        context.feed(line)
+    return context
+
+
+def result(**overrides):
+    values = {
+        "env": "dev",
+        "playbook": "site",
+        "exit_code": 2,
+        "timed_out": False,
+        "error": None,
+        "failed_hosts": ["web1", "web3"],
+        "started_at": 1700000000.25,
+        "finished_at": 1700000003.0,
+        "duration": 2.75,
+        "queued": 0.0,
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_first_failure_skips_ignored_errors():
+    context = fed()
+
+    assert context.first_failure["host"] == "web3"
+    assert context.first_failure["task"] == "migrate"
+    assert [each["host"] for each in context.failures] == ["web3", "web1"]
+    ignored = [each for each in context.events if each.get("host") == "web2"]
+    assert ignored[0]["status"] == "ignored"
+
+
+def test_buffers_are_bounded():
+    lines = ["PLAY [nodes] ***"]
+    for index in range(1000):
+        lines += [f"TASK [step {index}] ***", f"fatal: [web{index}]: FAILED! => {{}}"]
+    context = fed(lines, lines=5, max_events=3)
+
+    assert context.lines_seen == len(lines)
+    assert len(context.lines) == 5
+    assert len(context.events) == len(context.failures) == 3
+    assert context.first_failure["host"] == "web0"
+    assert context.current_task["name"] == "step 999"
+
+
+def test_long_lines_are_truncated():
+    context = fed(["x" * (failures.MAX_LINE * 2)])
+    assert len(context.lines[0][1]) == failures.MAX_LINE + 3
+
+
+def test_report_holds_failure_tail_and_timings():
+    report = fed(lines=3).report(result())
+
+    assert report["first_failure"]["task"] == "migrate"
+    assert report["last_task"]["name"] == "migrate"
+    assert report["output"] == OUTPUT[-3:]
+    assert report["lines_seen"] == len(OUTPUT)
+    assert report["timings"]["duration"] == 2.75
+    assert report["timings"]["first_failure_after"] is not None
+    json.dumps(report)
+
+
+def test_write_report_creates_one_file_per_run(tmp_path):
+    context = fed()
+    first = failures.write_report(context.report(result()), tmp_path)
+    second = failures.write_report(
+        context.report(result(started_at=1700000000.5)), tmp_path
+    )
+
+    assert first != second
+    assert first.name == "dev-site-20231114T221320.250.json"
+    assert json.loads(first.read_text())["exit_code"] == 2
+
+
+def test_report_dir_defaults_under_state_dir(tmp_path):
+    assert failures.report_dir({"state": {"dir": str(tmp_path)}}) == (
+        tmp_path / "failures"
+    )
+    assert failures.report_dir({"failures": {"dir": "/tmp/x"}}).as_posix() == "/tmp/x"
@@ -0,0 +1,168 @@
+# pylint: disable=missing-function-docstring,protected-access,redefined-outer-name
+
+import json
+import os
+import pathlib
+import subprocess
+import time
+from unittest import mock
+
+import pytest
+
+from ansible_execute import exceptions, inventory
+from ansible_execute.inventory import Inventory, load_inventory
+
+INVENTORY = {
+    "_meta": {
+        "hostvars": {
+            "web1": {"ansible_host": "10.0.0.1", "ansible_port": 2222},
+            "db1": {},
+        }
+    },
+    "all": {"children": ["ungrouped", "prod"]},
+    "prod": {"children": ["web", "db"]},
+    "web": {"hosts": ["web1", "web2"]},
+    "db": {"hosts": ["db1", "web1"]},
+}
+
+
+def test_hosts_for_expands_child_groups():
+    inv = Inventory(INVENTORY)
+    assert inv.hosts_for("prod") == ["web1", "web2", "db1"]
+    assert inv.hosts_for("db") == ["db1", "web1"]
+
+
+def test_hosts_for_unknown_group_raises():
+    with pytest.raises(exceptions.InventoryError, match="Unknown group 'dev'"):
+        Inventory(INVENTORY).hosts_for("dev")
+
+
+def test_host_address_uses_host_vars():
+    inv = Inventory(INVENTORY)
+    assert inv.host_address("web1", 22) == ("10.0.0.1", 2222)
+    assert inv.host_address("db1", 22) == ("db1", 22)
+    assert inv.host_address("web2") == ("web2", None)
+
+
+def test_host_address_ignores_templated_port():
+    inv = Inventory({"_meta": {"hostvars": {"web1": {"ansible_port": "{{ p }}"}}}})
+    assert inv.host_address("web1", 22) == ("web1", 22)
+
+
+@mock.patch("ansible_execute.inventory.subprocess.run")
+def test_load_inventory_parses_output(mock_run):
+    mock_run.return_value = subprocess.CompletedProcess(
+        args=[], returncode=0, stdout=json.dumps(INVENTORY)
+    )
+    inv = load_inventory()
+    assert inv.hosts_for("web") == ["web1", "web2"]
+    assert mock_run.call_args.args[0] == ["ansible-inventory", "--list"]
+
+
+@mock.patch("ansible_execute.inventory.subprocess.run")
+def test_load_inventory_invalid_json_raises(mock_run):
+    mock_run.return_value = subprocess.CompletedProcess(
+        args=[], returncode=0, stdout="not json"
+    )
+    with pytest.raises(exceptions.InventoryError, match="invalid JSON"):
+        load_inventory()
+
+
+@mock.patch(
+    "ansible_execute.inventory.subprocess.run",
+    side_effect=FileNotFoundError("ansible-inventory"),
+)
+def test_load_inventory_missing_binary_raises(mock_run):
+    with pytest.raises(exceptions.InventoryError, match="Could not list inventory"):
+        load_inventory()
+    mock_run.assert_called_once()
+
+
+@pytest.fixture
+def inventory_settings(tmp_path):
+    hosts_file = tmp_path / "hosts.ini"
+    hosts_file.write_text("[prod]\nlocalhost\n")
+    return {
+        "state": {"dir": str(tmp_path / "state")},
+        "inventory": {"sources": [str(hosts_file)], "cache_ttl": 300},
+    }
+
+
+def test_resolve_caches_in_process_and_on_disk(fake_ansible, inventory_settings):
+    first = inventory.resolve(inventory_settings)
+    assert inventory.resolve(inventory_settings) is first
+
+    # A new process (empty memo) is served from the on-disk cache
+    inventory._resolved.clear()
+    assert inventory.resolve(inventory_settings).hosts_for("prod") == ["localhost"]
+
+    calls = fake_ansible.inventory_calls()
+    assert len(calls) == 1
+    assert calls[0] == ["--list", "-i", inventory_settings["inventory"]["sources"][0]]
+
+
+def test_resolve_invalidates_on_source_change(fake_ansible, inventory_settings):
+    inventory.resolve(inventory_settings)
+    inventory._resolved.clear()
+
+    hosts_file = pathlib.Path(inventory_settings["inventory"]["sources"][0])
+    hosts_file.write_text("[prod]\nlocalhost\nweb1\n")
+    os.utime(hosts_file, ns=(0, 10**18))
+    inventory.resolve(inventory_settings)
+
+    assert len(fake_ansible.inventory_calls()) == 2
+
+
+def test_resolve_honours_ttl_and_refresh(fake_ansible, inventory_settings, monkeypatch):
+    inventory.resolve(inventory_settings)
+    inventory._resolved.clear()
+
+    real_time = time.time
+    monkeypatch.setattr(inventory.time, "time", lambda: real_time() + 301)
+    inventory.resolve(inventory_settings)
+    assert len(fake_ansible.inventory_calls()) == 2
+
+    inventory.resolve(inventory_settings, refresh=True)
+    assert len(fake_ansible.inventory_calls()) == 3
+
+
+def test_resolve_without_disk_cache(fake_ansible, inventory_settings):
+    inventory_settings["inventory"]["cache_ttl"] = 0
+    inventory.resolve(inventory_settings)
+    inventory._resolved.clear()
+    inventory.resolve(inventory_settings)
+
+    assert len(fake_ansible.inventory_calls()) == 2
+    assert not (pathlib.Path(inventory_settings["state"]["dir"]) / "inventory").exists()
+
+
+def test_inventory_sources_lookup_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ANSIBLE_CONFIG", raising=False)
+    monkeypatch.delenv("ANSIBLE_INVENTORY", raising=False)
+    monkeypatch.setattr(inventory, "ANSIBLE_CFG_LOCATIONS", [tmp_path / "ansible.cfg"])
+
+    assert inventory.inventory_sources({}) == [inventory.DEFAULT_SOURCE]
+
+    (tmp_path / "ansible.cfg").write_text(
+        "[defaults]\ninventory = inv/hosts, inv/aws.yml\n"
+    )
+    assert inventory.inventory_sources({}) == [
+        str(tmp_path / "inv/hosts"),
+        str(tmp_path / "inv/aws.yml"),
+    ]
+
+    monkeypatch.setenv("ANSIBLE_INVENTORY", "a.ini,b.ini")
+    assert inventory.inventory_sources({}) == ["a.ini", "b.ini"]
+
+    settings = {"inventory": {"sources": ["c.ini"]}}
+    assert inventory.inventory_sources(settings) == ["c.ini"]
+
+
+def test_fingerprint_walks_directories(tmp_path):
+    (tmp_path / "group_vars").mkdir()
+    (tmp_path / "group_vars" / "prod.yml").write_text("a: 1\n")
+    before = inventory.fingerprint([str(tmp_path)])
+
+    (tmp_path / "group_vars" / "prod.yml").write_text("a: 22\n")
+    assert inventory.fingerprint([str(tmp_path)]) != before
@@ -0,0 +1,44 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import sys
+
+from ansible_execute import loadtest, simulator
+
+
+def test_percentiles_use_nearest_rank():
+    summary = loadtest.percentiles([float(value) for value in range(1, 101)])
+    assert summary == {"p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0}
+    assert loadtest.percentiles([]) == dict.fromkeys(["p50", "p95", "p99", "max"])
+
+
+def test_load_test_reports_throughput_latency_and_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sim = simulator.SimulatorSettings(hosts=40, tasks=2, fail_rate=0.02)
+
+    report = asyncio.run(loadtest.run_load_test(sim, runs=4, concurrency=2))
+
+    assert report["ok"] + report["failed"] == 4
+    assert report["failed"] and report["failed_hosts"]
+    assert report["throughput"]["hosts_per_second"] > 0
+    # Play, three task headers, 40 hosts per task at most and the recap
+    assert report["output"]["lines"] > 4 * 40
+    assert report["latency"]["run"]["max"] >= report["latency"]["run"]["p50"] > 0
+    assert report["latency"]["first_output"]["p50"] is not None
+    assert report["memory"]["controller_peak_rss_kb"] > 0
+
+
+def test_peak_rss_is_unknown_without_resource_module(monkeypatch):
+    # As on Windows, where the resource module does not exist
+    monkeypatch.setitem(sys.modules, "resource", None)
+    assert loadtest._peak_rss_kb() is None  # pylint: disable=protected-access
+
+
+def test_load_test_counts_timeouts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sim = simulator.SimulatorSettings(hosts=2, tasks=100, latency=0.1)
+
+    report = loadtest.load_test(sim, runs=2, concurrency=2, timeout=1)
+
+    assert report["timed_out"] == 2
+    assert report["ok"] == 0
@@ -0,0 +1,132 @@
+# pylint: disable=missing-function-docstring
+
+import json
+import logging
+
+from ansible_execute import logfilters
+from ansible_execute import logger as log_setup
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def record(msg, *args, level=logging.INFO):
+    return logging.LogRecord("t", level, __file__, 1, msg, args, None)
+
+
+def handler_with(settings):
+    handler = ListHandler()
+    logfilters.attach_filters(handler, settings)
+    return handler
+
+
+def test_rate_limit_is_per_template(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(logfilters.time, "monotonic", lambda: now[0])
+    handler = handler_with({"rate_limit": 1.0, "rate_burst": 2, "dedupe": False})
+
+    for host in range(5):
+        handler.handle(record("host %s unreachable", host))
+    handler.handle(record("other message"))
+    assert [r.getMessage() for r in handler.records] == [
+        "host 0 unreachable",
+        "host 1 unreachable",
+        "other message",
+    ]
+
+    # One token refills per second; the passing record reports what was lost
+    now[0] = 1.0
+    handler.handle(record("host %s unreachable", 9))
+    assert handler.records[-1].getMessage() == "host 9 unreachable"
+    assert handler.records[-1].suppressed == 3
+
+
+def test_consecutive_duplicates_collapse_into_a_repeat_count():
+    handler = handler_with({"dedupe": True})
+
+    for _ in range(4):
+        handler.handle(record("retrying"))
+    handler.handle(record("done"))
+
+    assert [(r.getMessage(), getattr(r, "repeated", 0)) for r in handler.records] == [
+        ("retrying", 0),
+        ("retrying", 3),
+        ("done", 0),
+    ]
+
+
+def test_duplicate_filter_flushes_pending_repeats():
+    handler = ListHandler()
+    dedupe = logfilters.DuplicateFilter(handler)
+    handler.addFilter(dedupe)
+
+    handler.handle(record("same"))
+    handler.handle(record("same"))
+    dedupe.flush()
+    dedupe.flush()
+
+    assert [getattr(r, "repeated", 0) for r in handler.records] == [0, 1]
+
+
+def test_debug_records_are_sampled_evenly():
+    handler = handler_with({"debug_sample_rate": 0.25, "dedupe": False})
+
+    for index in range(100):
+        handler.handle(record("line %d", index, level=logging.DEBUG))
+    handler.handle(record("warning", level=logging.WARNING))
+
+    assert len(handler.records) == 26
+    assert handler.records[-1].levelno == logging.WARNING
+
+
+def test_json_formatter_reports_counters():
+    collapsed = record("retrying")
+    collapsed.repeated = 3
+    collapsed.suppressed = 2
+
+    entry = json.loads(log_setup.JSONFormatter().format(collapsed))
+
+    assert (entry["repeated"], entry["suppressed"]) == (3, 2)
+
+
+def test_dedupe_is_off_unless_configured(monkeypatch):
+    registered = []
+    monkeypatch.setattr(logfilters.atexit, "register", registered.append)
+    monkeypatch.setattr(logfilters, "_flush_registered", False)
+
+    assert not handler_with({}).filters
+
+    for _ in range(3):
+        handler_with({"dedupe": True})
+    # One exit hook flushes every duplicate filter
+    assert registered == [logfilters._flush_all]  # pylint: disable=protected-access
+
+
+def test_configure_logging_attaches_filters(tmp_path):
+    root = logging.getLogger()
+    before = list(root.handlers)
+    try:
+        log_setup.configure_logging(
+            verbosity=2,
+            log_directory=tmp_path,
+            enable_console=False,
+            filters={"debug_sample_rate": 0.5, "dedupe": True},
+        )
+        added = [h for h in root.handlers if h not in before]
+        kinds = {type(f) for h in added for f in h.filters}
+        assert kinds == {
+            log_setup._EnvFilter,  # pylint: disable=protected-access
+            logfilters.DebugSampler,
+            logfilters.DuplicateFilter,
+        }
+    finally:
+        for handler in root.handlers[:]:
+            if handler not in before:
+                handler.close()
+                root.removeHandler(handler)
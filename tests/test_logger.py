@@ -1,11 +1,12 @@
 # pylint: disable=protected-access, missing-function-docstring
 
+import asyncio
 import logging
 import json
 import time
 import pytest
 
-from ansible_execute import logger
+from ansible_execute import exceptions, executor, logger, logquery
 
 
 def teardown_function():
@@ -99,6 +100,17 @@ def test_configure_logging_non_interactive_without_directory_raises():
     assert "log directory must be provided" in str(exc.value)
 
 
+def test_configure_logging_invalid_vector_adds_no_handler(tmp_path):
+    root = logging.getLogger()
+    root.handlers.clear()
+
+    with pytest.raises(exceptions.ConfigError, match="logging.vector.address"):
+        logger.configure_logging(
+            verbosity=0, log_directory=tmp_path, vector={"address": "nowhere"}
+        )
+    assert not root.handlers
+
+
 def test_configure_logging_file_logging(tmp_path):
     root = logging.getLogger()
     root.handlers.clear()
@@ -147,3 +159,54 @@ def test_configure_logging_with_console_and_file(tmp_path):
     files = list(log_dir.iterdir())
     assert len(files) == 1
     assert files[0].name.endswith("_ansible-execute.log")
+
+
+def test_jsonformatter_includes_env():
+    record = logging.LogRecord(
+        name="test",
+        level=logging.INFO,
+        pathname="app.py",
+        lineno=1,
+        msg="hello",
+        args=(),
+        exc_info=None,
+    )
+    assert "env" not in json.loads(logger.JSONFormatter().format(record))
+    assert json.loads(logger.JSONFormatter(env="prod").format(record))["env"] == "prod"
+
+    record.env = "dev"
+    assert json.loads(logger.JSONFormatter(env="prod").format(record))["env"] == "dev"
+
+
+def test_json_formatter_includes_structured_data():
+    formatter = logger.JSONFormatter()
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "done", None, None)
+    record.data = {"exit_code": 0}
+
+    assert json.loads(formatter.format(record))["data"] == {"exit_code": 0}
+
+
+def test_multi_env_runs_are_stamped_and_queryable(tmp_path, fake_ansible):
+    logger.configure_logging(
+        verbosity=1, log_directory=tmp_path, non_interactive=True, env=None
+    )
+    log = logging.getLogger("ansible_execute.test")
+    for env in ("dev", "prod"):
+        with logger.env_context(env):
+            log.warning("Preparing %s", env)
+            asyncio.run(executor.run_playbook(env, "site"))
+    log.warning("Done")
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+    prod = [
+        json.loads(line)
+        for line in logquery.search(tmp_path, logquery.LogQuery(env="prod"))
+    ]
+    assert [record["message"] for record in prod] == [
+        "Preparing prod",
+        "Playbook run finished",
+    ]
+    assert all(record["data"]["env"] == "prod" for record in prod[1:])
+    everything = list(logquery.search(tmp_path, logquery.LogQuery()))
+    assert '"env"' not in everything[-1]
@@ -0,0 +1,156 @@
+# pylint: disable=missing-function-docstring
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from ansible_execute import logquery
+
+
+def record(ts, level="INFO", env="prod", message="hello"):
+    return json.dumps({"timestamp": ts, "level": level, "message": message, "env": env})
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(logquery, "BLOCK_RECORDS", 10)
+    lines = []
+    for minute in range(60):
+        level = "ERROR" if minute == 42 else "INFO"
+        env = "dev" if minute >= 50 else "prod"
+        lines.append(
+            record(f"2026-10-18T10:{minute:02d}:00", level, env, f"msg {minute}")
+        )
+    (tmp_path / "2026-10-18_ansible-execute.log").write_text("\n".join(lines) + "\n")
+    (tmp_path / "2026-10-17_ansible-execute.log").write_text(
+        record("2026-10-17T09:00:00", message="yesterday") + "\n"
+    )
+    return tmp_path
+
+
+def messages(lines):
+    return [json.loads(line)["message"] for line in lines]
+
+
+def test_parse_time():
+    assert logquery.parse_time("2026-10-18") == "2026-10-18T00:00:00"
+    assert logquery.parse_time("2026-10-18", end=True) == "2026-10-18T23:59:59"
+    assert logquery.parse_time("2026-10-18T10:05") == "2026-10-18T10:05:00"
+    assert logquery.parse_time(None) is None
+    with pytest.raises(ValueError, match="Invalid time"):
+        logquery.parse_time("yesterday")
+
+
+def test_update_index_builds_sparse_blocks(log_dir):
+    log_path = log_dir / "2026-10-18_ansible-execute.log"
+    blocks = logquery.update_index(log_path)
+
+    assert len(blocks) == 6
+    assert blocks[0]["start"] == 0
+    assert blocks[-1]["end"] == log_path.stat().st_size
+    assert blocks[4]["levels"] == ["INFO", "ERROR"]
+    assert blocks[5]["envs"] == ["dev"]
+    assert blocks[1]["first"] == "2026-10-18T10:10:00"
+    assert (log_dir / "2026-10-18_ansible-execute.log.idx").exists()
+
+
+def test_update_index_is_incremental(log_dir):
+    log_path = log_dir / "2026-10-18_ansible-execute.log"
+    logquery.update_index(log_path)
+
+    with log_path.open("a") as f:
+        f.write(record("2026-10-18T11:00:00", message="late") + "\n")
+        f.write('{"timestamp": "2026-10-18T11:01')  # still being written
+
+    blocks = logquery.update_index(log_path)
+    assert len(blocks) == 7
+    assert blocks[-1]["last"] == "2026-10-18T11:00:00"
+    assert blocks[-1]["end"] < log_path.stat().st_size
+
+
+def test_search_filters(log_dir):
+    def run(**kwargs):
+        return messages(logquery.search(log_dir, logquery.LogQuery(**kwargs)))
+
+    assert run(level="ERROR") == ["msg 42"]
+    assert run(env="dev") == [f"msg {minute}" for minute in range(50, 60)]
+    assert run(since="2026-10-18T10:15:00", until="2026-10-18T10:17:00") == [
+        "msg 15",
+        "msg 16",
+        "msg 17",
+    ]
+    assert run(until="2026-10-17T23:59:59") == ["yesterday"]
+    assert run(contains="msg 3", since="2026-10-18T00:00:00")[:2] == [
+        "msg 3",
+        "msg 30",
+    ]
+
+
+def test_search_finds_records_written_after_midnight(tmp_path, monkeypatch):
+    # Started before midnight: records of the next day stay in this file
+    late = tmp_path / "2026-10-18_ansible-execute.log"
+    late.write_text(
+        record("2026-10-18T23:59:00", message="before")
+        + "\n"
+        + record("2026-10-19T00:30:00", message="after")
+        + "\n"
+    )
+    written = time.mktime(time.strptime("2026-10-19T00:30:00", logquery.TIME_FORMAT))
+    os.utime(late, (written, written))
+    # Last written well before the range: not even opened
+    old = tmp_path / "2026-10-17_ansible-execute.log"
+    old.write_text(record("2026-10-17T09:00:00", message="old") + "\n")
+    written = time.mktime(time.strptime("2026-10-17T09:00:00", logquery.TIME_FORMAT))
+    os.utime(old, (written, written))
+    opened = []
+    monkeypatch.setattr(
+        logquery, "query_file", lambda path, query: opened.append(path.name) or []
+    )
+
+    query = logquery.LogQuery(since="2026-10-19T00:00:00")
+    assert not query.skips_file(late)
+    assert query.skips_file(old)
+    list(logquery.search(tmp_path, query))
+    assert opened == [late.name]
+
+
+def test_search_skips_blocks_outside_range(log_dir, monkeypatch):
+    parsed = []
+    original = logquery._parse  # pylint: disable=protected-access
+
+    def counting_parse(line):
+        parsed.append(line)
+        return original(line)
+
+    for path in logquery.log_files(log_dir):
+        logquery.update_index(path)
+    monkeypatch.setattr(logquery, "_parse", counting_parse)
+
+    query = logquery.LogQuery(since="2026-10-18T10:41:00", until="2026-10-18T10:43:00")
+    assert messages(logquery.search(log_dir, query)) == ["msg 41", "msg 42", "msg 43"]
+    # Only the one block covering 10:40-10:49 was read
+    assert len(parsed) == 10
+
+
+def test_search_follow_yields_new_records(log_dir):
+    log_path = log_dir / "2026-10-18_ansible-execute.log"
+    query = logquery.LogQuery(level="WARNING", since="2026-10-18T10:50:00")
+    results = logquery.search(log_dir, query, follow=True, poll_interval=0.05)
+
+    def append():
+        time.sleep(0.2)
+        with log_path.open("a") as f:
+            f.write(record("2026-10-18T12:00:00", "INFO", message="ignored") + "\n")
+            f.write(record("2026-10-18T12:00:01", "WARNING", message="new") + "\n")
+        time.sleep(0.2)
+        (log_dir / "2026-10-19_ansible-execute.log").write_text(
+            record("2026-10-19T00:00:01", "ERROR", message="next day") + "\n"
+        )
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    assert messages([next(results), next(results)]) == ["new", "next day"]
+    writer.join()
@@ -1,14 +1,21 @@
 # pylint: disable=missing-function-docstring,wrong-import-order,unused-import,missing-class-docstring
 
+import asyncio
+import json
 import sys
 import logging
-from unittest import mock
+import threading
+import time
 from types import SimpleNamespace
 
 import pytest
 
 from ansible_execute.main import main
-from ansible_execute import utils, cli
+from ansible_execute import utils, cli, distributed, exceptions
+from ansible_execute import logger as log_setup
+
+# Kept before the autouse fixture stubs it out
+REAL_CONFIGURE_LOGGING = log_setup.configure_logging
 
 
 class FakeConfig:
@@ -16,9 +23,14 @@ class FakeConfig:
         # Provide a config_data dict so main() can do .get(...) without errors
         self.config_data = {}
 
+    def for_env(self, env):  # pylint: disable=unused-argument
+        return self.config_data
+
 
 @pytest.fixture(autouse=True)
-def disable_side_effects(monkeypatch):
+def disable_side_effects(monkeypatch, tmp_path):
+    # Keep state (inventory cache, shard dirs) out of the working tree
+    monkeypatch.chdir(tmp_path)
     # Stub out structured‐logging setup to at least set INFO level
     monkeypatch.setattr(
         "ansible_execute.logger.configure_logging",
@@ -60,14 +72,12 @@ def test_main_generates_config(tmp_path, monkeypatch):
 
 
 @pytest.mark.parametrize("env", ["dev", "staging", "prod"])
-@mock.patch("ansible_execute.executor.subprocess.run")
-def test_main_runs_playbook_in_normal_mode(mock_run, env, caplog):
+def test_main_runs_playbook_in_normal_mode(fake_ansible, env, caplog):
     """
-    When not in test mode, main() should call subprocess.run and log the
+    When not in test mode, main() should run ansible-playbook and log the
     playbook start, the smoke test message, and success.
     """
     # Arrange
-    mock_run.return_value = mock.Mock(returncode=0)
     sys.argv[:] = ["prog", "-e", env]
 
     # Capture INFO logs
@@ -77,7 +87,7 @@ def test_main_runs_playbook_in_normal_mode(mock_run, env, caplog):
     main()
 
     # Assert: playbook was invoked
-    mock_run.assert_called_once()
+    assert len(fake_ansible.calls()) == 1
     # Assert: main() logged it
     assert "Running Ansible playbook..." in caplog.text
     # Assert: executor logged start of smoke test
@@ -87,11 +97,10 @@ def test_main_runs_playbook_in_normal_mode(mock_run, env, caplog):
 
 
 @pytest.mark.parametrize("env", ["dev", "staging", "prod"])
-@mock.patch("ansible_execute.executor.subprocess.run")
-def test_main_skips_playbook_in_test_mode(mock_run, env, caplog):
+def test_main_skips_playbook_in_test_mode(fake_ansible, env, caplog):
     """
-    When in test mode (-t), main() should NOT call subprocess.run and should
-    log the skip message.
+    When in test mode (-t), main() should only syntax-check and list the
+    tasks of the playbook, never execute it.
     """
     # Arrange
     sys.argv[:] = ["prog", "-e", env, "-t"]
@@ -102,10 +111,11 @@ def test_main_skips_playbook_in_test_mode(mock_run, env, caplog):
     # Act
     main()
 
-    # Assert: no playbook invocation
-    mock_run.assert_not_called()
-    # Assert: skip message
-    assert f"Test mode enabled, skipping playbook execution for {env}." in caplog.text
+    # Assert: no playbook execution, only validation
+    calls = fake_ansible.calls()
+    assert sorted(call[-1] for call in calls) == ["--list-tasks", "--syntax-check"]
+    # Assert: test mode message
+    assert f"Test mode enabled, validating playbooks for {env}." in caplog.text
 
 
 def test_main_validates_config(monkeypatch, tmp_path, caplog):
@@ -134,3 +144,459 @@ def test_main_validates_config(monkeypatch, tmp_path, caplog):
 
     # Assert
     assert "Configuration is valid." in caplog.text
+
+
+def test_main_preflight_limits_playbook(fake_ansible, monkeypatch):
+    """
+    With --preflight, main() should pass the reachable hosts to the executor.
+    """
+    monkeypatch.setattr(
+        "ansible_execute.preflight.run_preflight",
+        lambda env, settings, **kwargs: ["web1"],
+    )
+    sys.argv[:] = ["prog", "-e", "prod", "--preflight"]
+
+    main()
+
+    assert fake_ansible.calls()[0][-2:] == ["--limit", "web1"]
+
+
+def test_main_preflight_failure_exits(fake_ansible, monkeypatch):
+    """
+    A failed pre-flight probe should exit before running the playbook.
+    """
+
+    def fail(env, settings, **kwargs):  # pylint: disable=unused-argument
+        raise exceptions.PreflightError("2 unreachable hosts")
+
+    monkeypatch.setattr("ansible_execute.preflight.run_preflight", fail)
+    sys.argv[:] = ["prog", "-e", "prod", "--preflight"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+    assert not fake_ansible.calls()
+
+
+def test_main_rolling_failure_exits(fake_ansible, monkeypatch):
+    """
+    With --rolling, main() should hand the env's hosts to the rollout and exit
+    non-zero when a batch exceeds the failure threshold.
+    """
+    seen = {}
+
+    def fake_rollout(env, playbook, hosts, settings, verbosity, tags=None):
+        # pylint: disable=unused-argument
+        seen["hosts"] = hosts
+        raise exceptions.RolloutError("1 of 1 hosts failed")
+
+    monkeypatch.setattr("ansible_execute.rollout.run_rollout", fake_rollout)
+    monkeypatch.setattr(
+        "ansible_execute.preflight.run_preflight",
+        lambda env, settings, **kwargs: ["web1"],
+    )
+    sys.argv[:] = ["prog", "-e", "prod", "--preflight", "--rolling"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+    assert seen["hosts"] == ["web1"]
+    assert not fake_ansible.calls()
+
+
+def test_main_rolling_invalid_stage_exits(fake_ansible, monkeypatch, caplog):
+    """
+    An invalid rollout stage is reported as an error instead of a traceback.
+    """
+    monkeypatch.setattr(
+        FakeConfig, "for_env", lambda self, env: {"rollout": {"stages": ["x"]}}
+    )
+    monkeypatch.setattr(
+        "ansible_execute.preflight.run_preflight",
+        lambda env, settings, **kwargs: ["web1"],
+    )
+    sys.argv[:] = ["prog", "-e", "prod", "--preflight", "--rolling"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+    assert "Invalid rollout stage 'x'" in caplog.text
+    assert not fake_ansible.calls()
+
+
+def test_main_sharded_run(fake_ansible, monkeypatch):
+    """
+    With --shards, main() should start one controller per host shard.
+    """
+    monkeypatch.setattr(
+        "ansible_execute.preflight.run_preflight",
+        lambda env, settings, **kwargs: ["web1", "web2", "web3"],
+    )
+    sys.argv[:] = ["prog", "-e", "prod", "--preflight", "--shards", "2"]
+
+    main()
+
+    assert len(fake_ansible.calls()) == 2
+
+
+def test_main_logs_command(tmp_path, capsys):
+    """
+    The logs subcommand should print matching records from the log directory.
+    """
+    log_file = tmp_path / "2026-10-18_ansible-execute.log"
+    log_file.write_text(
+        '{"timestamp": "2026-10-18T10:00:00", "level": "INFO", "message": "a"}\n'
+        '{"timestamp": "2026-10-18T10:00:01", "level": "ERROR", "message": "b"}\n'
+    )
+    sys.argv[:] = ["prog", "logs", "--dir", str(tmp_path), "--level", "error"]
+
+    main()
+
+    assert capsys.readouterr().out.splitlines() == [
+        '{"timestamp": "2026-10-18T10:00:01", "level": "ERROR", "message": "b"}'
+    ]
+
+
+def test_main_logs_command_requires_directory():
+    """
+    Without --dir or logging.dir, the logs subcommand should exit non-zero.
+    """
+    sys.argv[:] = ["prog", "logs"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+
+
+def test_main_test_mode_fails_on_bad_playbook(fake_ansible, caplog):
+    """
+    Test mode should check every requested env and exit non-zero on failure.
+    """
+    fake_ansible.configure(rc=4)
+    sys.argv[:] = ["prog", "-t", "-e", "dev", "-e", "prod"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+    assert len(fake_ansible.calls()) == 4
+    assert "Checks failed for prod/master" in caplog.text
+
+
+def test_main_runs_every_requested_env(fake_ansible):
+    """
+    Several -e/-p options should run every env and playbook combination.
+    """
+    sys.argv[:] = ["prog", "-e", "dev", "-e", "prod", "-p", "a", "-p", "b"]
+
+    main()
+
+    assert [call[0] for call in fake_ansible.calls()] == [
+        "ansible/playbooks/a.yml",
+        "ansible/playbooks/b.yml",
+        "ansible/playbooks/a.yml",
+        "ansible/playbooks/b.yml",
+    ]
+
+
+def test_main_watch_mode_runs_playbooks(fake_ansible, monkeypatch, tmp_path):
+    """
+    --watch should run every requested playbook and wait for changes.
+    """
+    from ansible_execute import watcher  # pylint: disable=import-outside-toplevel
+
+    (tmp_path / "ansible").mkdir()
+    original = watcher.watch_and_run
+    monkeypatch.setattr(
+        watcher,
+        "watch_and_run",
+        lambda *args, **kwargs: original(*args, **{**kwargs, "max_runs": 1}),
+    )
+    sys.argv[:] = ["prog", "--watch", "-e", "dev", "-p", "a", "-p", "b"]
+
+    main()
+
+    assert [call[0] for call in fake_ansible.calls()] == [
+        "ansible/playbooks/a.yml",
+        "ansible/playbooks/b.yml",
+    ]
+
+
+def test_main_watch_mode_requires_ansible_tree():
+    sys.argv[:] = ["prog", "--watch"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+
+
+def test_main_passes_extra_vars_bundle(fake_ansible):
+    """
+    Normal runs pass the env's extra-vars as a content-addressed file.
+    """
+    sys.argv[:] = ["prog", "-e", "dev"]
+
+    main()
+
+    cmd = fake_ansible.calls()[0]
+    assert cmd[1] == "--extra-vars"
+    assert cmd[2].startswith("@.ansible-execute/extra-vars/")
+
+
+def test_main_changed_only_runs_changed_role_tags(fake_ansible, tmp_path):
+    """
+    --changed-only skips unchanged runs and narrows the run to the tags of
+    the roles changed since the last successful run.
+    """
+    roles = tmp_path / "ansible" / "roles"
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "master.yml").write_text(
+        "- hosts: all\n  roles:\n    - {role: web, tags: [web]}\n"
+    )
+    (roles / "web" / "tasks").mkdir(parents=True)
+    (roles / "web" / "tasks" / "main.yml").write_text("- ping:\n")
+    sys.argv[:] = ["prog", "-e", "dev", "--changed-only"]
+
+    main()  # no snapshot yet: full run
+    main()  # nothing changed: skipped
+    (roles / "web" / "tasks" / "main.yml").write_text("- ping:\n- ping:\n")
+    main()
+
+    calls = fake_ansible.calls()
+    assert len(calls) == 2
+    assert "--tags" not in calls[0]
+    assert calls[1][calls[1].index("--tags") + 1] == "web"
+
+
+def test_main_changed_only_runs_new_hosts(fake_ansible, tmp_path):
+    """
+    A host added to the environment makes the next --changed-only run full.
+    """
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "master.yml").write_text("- hosts: all\n")
+    fake_ansible.configure(hosts=("web1",))
+    sys.argv[:] = ["prog", "-e", "dev", "--changed-only", "--refresh-inventory"]
+
+    main()
+    main()  # nothing changed: skipped
+    fake_ansible.configure(hosts=("web1", "web2"))
+    main()
+
+    assert len(fake_ansible.calls()) == 2
+
+
+def test_main_plain_run_skips_change_planning(fake_ansible, tmp_path, monkeypatch):
+    """
+    Without --changed-only, no change plan is made and no snapshot recorded.
+    """
+    monkeypatch.setattr(
+        "ansible_execute.changes.plan",
+        lambda *args, **kwargs: pytest.fail("plan() called"),
+    )
+    sys.argv[:] = ["prog", "-e", "dev"]
+
+    main()
+
+    assert len(fake_ansible.calls()) == 1
+    assert not list(tmp_path.glob(".ansible-execute/snapshots/*"))
+
+
+def test_main_failed_run_keeps_previous_snapshot(fake_ansible, tmp_path):
+    """
+    A failed run does not record a snapshot, so the next run is full again.
+    """
+    fake_ansible.configure(rc=2)
+    sys.argv[:] = ["prog", "-e", "dev", "--changed-only"]
+
+    with pytest.raises(SystemExit):
+        main()
+
+    assert not list(tmp_path.glob(".ansible-execute/snapshots/*"))
+
+
+def test_main_resume_restarts_failed_hosts(fake_ansible):
+    """
+    A failed run leaves a checkpoint; `resume` reruns the failed hosts from
+    the task they failed at and clears the checkpoint once it succeeds.
+    """
+    fake_ansible.configure(hosts=("web1", "web2"), fail_hosts=("web2",))
+    sys.argv[:] = ["prog", "-e", "dev"]
+    with pytest.raises(SystemExit):
+        main()
+
+    fake_ansible.configure(hosts=("web1", "web2"))
+    sys.argv[:] = ["prog", "-e", "dev", "resume"]
+    main()
+
+    resumed = fake_ansible.calls()[1]
+    assert resumed[resumed.index("--start-at-task") + 1] == "ping"
+    assert resumed[resumed.index("--limit") + 1] == "web2"
+
+    sys.argv[:] = ["prog", "-e", "dev", "resume"]
+    with pytest.raises(SystemExit) as exc:
+        main()
+    assert exc.value.code == 1
+
+
+def test_main_writes_failure_report(fake_ansible, tmp_path):
+    """
+    A failed run leaves a failure report under the state directory.
+    """
+    fake_ansible.configure(hosts=("web1", "web2"), fail_hosts=("web2",))
+    sys.argv[:] = ["prog", "-e", "dev"]
+    with pytest.raises(SystemExit):
+        main()
+
+    (path,) = tmp_path.glob(".ansible-execute/failures/dev-master-*.json")
+    assert json.loads(path.read_text())["first_failure"]["host"] == "web2"
+
+
+def test_main_resume_refuses_changed_playbook(fake_ansible, tmp_path):
+    """
+    Resuming after the playbook changed needs --force.
+    """
+    playbook = tmp_path / "ansible" / "playbooks" / "master.yml"
+    playbook.parent.mkdir(parents=True)
+    playbook.write_text("- hosts: all\n")
+    fake_ansible.configure(rc=2)
+    sys.argv[:] = ["prog", "-e", "dev"]
+    with pytest.raises(SystemExit):
+        main()
+
+    playbook.write_text("- hosts: all\n  tasks: []\n")
+    fake_ansible.configure()
+    sys.argv[:] = ["prog", "-e", "dev", "resume"]
+    with pytest.raises(SystemExit) as exc:
+        main()
+    assert exc.value.code == 1
+    assert len(fake_ansible.calls()) == 1
+
+    sys.argv[:] = ["prog", "-e", "dev", "resume", "--force"]
+    main()
+    assert len(fake_ansible.calls()) == 2
+
+
+def test_main_load_test_prints_report(capsys):
+    """
+    The load-test subcommand drives the simulator and prints a JSON report.
+    """
+    sys.argv[:] = ["prog", "load-test", "--runs", "2", "--hosts", "5", "--tasks", "1"]
+
+    main()
+
+    report = json.loads(capsys.readouterr().out)
+    assert report["runs"] == report["ok"] == 2
+    assert report["simulator"]["ANSIBLE_EXECUTE_SIM_HOSTS"] == "5"
+
+
+def test_main_agent_requires_coordinator_address():
+    """
+    The agent subcommand needs a coordinator to connect to.
+    """
+    sys.argv[:] = ["prog", "agent"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+
+
+def test_main_coordinator_requires_token(caplog):
+    """
+    A coordinator without a shared token refuses to start.
+    """
+    sys.argv[:] = ["prog", "-e", "dev", "coordinator", "--listen", "127.0.0.1:0"]
+
+    with pytest.raises(SystemExit) as exc:
+        main()
+
+    assert exc.value.code == 1
+    assert "token is required" in caplog.text
+
+
+def test_main_coordinator_distributes_to_agent(
+    fake_ansible, tmp_path, caplog, monkeypatch
+):
+    """
+    `coordinator` hands the env's hosts to agents and exits non-zero when a
+    host failed.
+    """
+    fake_ansible.configure(hosts=("web1", "web2"), fail_hosts=("web2",))
+    monkeypatch.setattr(
+        FakeConfig, "for_env", lambda self, env: {"distributed": {"token": "t0k"}}
+    )
+    socket_path = tmp_path / "coordinator.sock"
+
+    def agent():
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                asyncio.run(
+                    distributed.run_agent(f"unix:{socket_path}", name="a1", token="t0k")
+                )
+                return
+            except exceptions.DistributedError as exc:
+                if "Cannot reach" not in str(exc):
+                    raise
+                time.sleep(0.05)
+
+    worker = threading.Thread(target=agent)
+    worker.start()
+    sys.argv[:] = [
+        "prog",
+        "-e",
+        "dev",
+        "coordinator",
+        "--listen",
+        f"unix:{socket_path}",
+    ]
+    try:
+        with pytest.raises(SystemExit) as exc:
+            main()
+    finally:
+        worker.join(15)
+
+    assert exc.value.code == 2
+    assert "failed for dev on 1 hosts: web2" in caplog.text
+    ran = [call[call.index("--limit") + 1] for call in fake_ansible.calls()]
+    assert sorted(",".join(ran).split(",")) == ["web1", "web2"]
+
+
+def test_main_invalid_vector_address_logs_once(tmp_path, monkeypatch, capsys):
+    """
+    An invalid Vector address is reported once, on handlers added only once.
+    """
+    log_dir = tmp_path / "logs"
+    monkeypatch.setattr(
+        FakeConfig,
+        "for_env",
+        lambda self, env: {
+            "logging": {"dir": str(log_dir), "vector": {"address": "nowhere"}}
+        },
+    )
+    monkeypatch.setattr(
+        "ansible_execute.logger.configure_logging", REAL_CONFIGURE_LOGGING
+    )
+    root = logging.getLogger()
+    before = list(root.handlers)
+    sys.argv[:] = ["prog", "-e", "dev"]
+    try:
+        with pytest.raises(SystemExit) as exc:
+            main()
+        added = [handler for handler in root.handlers if handler not in before]
+    finally:
+        for handler in root.handlers[:]:
+            if handler not in before:
+                handler.close()
+                root.removeHandler(handler)
+
+    assert exc.value.code == 1
+    assert len(added) == 2
+    (log_file,) = log_dir.iterdir()
+    assert log_file.read_text().count("Invalid logging config") == 1
+    assert capsys.readouterr().err.count("Invalid logging config") == 1
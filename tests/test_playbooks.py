@@ -0,0 +1,111 @@
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+import pathlib
+import textwrap
+
+import pytest
+
+from ansible_execute import playbooks
+
+
+def write(path: pathlib.Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(content))
+
+
+@pytest.fixture
+def ansible_tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = pathlib.Path("ansible")
+    write(
+        root / "playbooks" / "master.yml",
+        """\
+        - import_playbook: web.yml
+        - hosts: "{{ nodes }}"
+          vars_files:
+            - vars/common.yml
+          roles:
+            - common
+          tasks:
+            - block:
+                - include_tasks: tasks/extra.yml
+        """,
+    )
+    write(
+        root / "playbooks" / "web.yml",
+        """\
+        - hosts: web
+          roles:
+            - role: nginx
+          tasks:
+            - include_role:
+                name: certs
+        """,
+    )
+    write(root / "playbooks" / "vars" / "common.yml", "a: !vault |\n  abc\n")
+    write(root / "playbooks" / "tasks" / "extra.yml", "- debug: msg=hi\n")
+    write(root / "roles" / "common" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "nginx" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "nginx" / "meta" / "main.yml", "dependencies:\n  - base\n")
+    write(root / "roles" / "base" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "certs" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "roles" / "unused" / "tasks" / "main.yml", "- ping:\n")
+    write(root / "group_vars" / "all.yml", "x: 1\n")
+    return root
+
+
+def test_playbook_path():
+    assert str(playbooks.playbook_path("site")) == "ansible/playbooks/site.yml"
+
+
+def test_dependencies_follow_imports_and_roles(ansible_tree):
+    files, exact = playbooks.dependencies("master")
+
+    assert exact
+    names = {str(path.relative_to(ansible_tree)) for path in files}
+    assert names == {
+        "playbooks/master.yml",
+        "playbooks/web.yml",
+        "playbooks/vars/common.yml",
+        "playbooks/tasks/extra.yml",
+        "roles/common/tasks/main.yml",
+        "roles/nginx/tasks/main.yml",
+        "roles/nginx/meta/main.yml",
+        "roles/base/tasks/main.yml",
+        "roles/certs/tasks/main.yml",
+        "group_vars/all.yml",
+    }
+
+
+def test_dependencies_fall_back_to_whole_tree(ansible_tree):
+    write(
+        ansible_tree / "playbooks" / "dynamic.yml",
+        """\
+        - hosts: all
+          tasks:
+            - include_role:
+                name: "{{ role_name }}"
+        """,
+    )
+    files, exact = playbooks.dependencies("dynamic")
+
+    assert not exact
+    assert ansible_tree / "roles" / "unused" / "tasks" / "main.yml" in files
+
+
+def test_scanner_reports_roles(ansible_tree):
+    scanner = playbooks.DependencyScanner()
+    scanner.scan_playbook(ansible_tree / "playbooks" / "web.yml")
+    assert scanner.roles == {"nginx", "base", "certs"}
+
+
+def test_content_hash_tracks_content(ansible_tree):
+    files, _ = playbooks.dependencies("master")
+    before = playbooks.content_hash(files)
+    assert playbooks.content_hash(files) == before
+
+    (ansible_tree / "roles" / "unused" / "tasks" / "main.yml").write_text("- fail:\n")
+    assert playbooks.content_hash(files) == before
+
+    (ansible_tree / "roles" / "base" / "tasks" / "main.yml").write_text("- fail:\n")
+    assert playbooks.content_hash(files) != before
@@ -0,0 +1,125 @@
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from ansible_execute import exceptions, preflight
+from ansible_execute.inventory import Inventory
+
+
+@pytest.fixture
+def listening_port():
+    """A local listening socket standing in for a reachable SSH daemon."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    stop = threading.Event()
+
+    def _accept():
+        sock.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn, _ = sock.accept()
+                conn.close()
+            except OSError:
+                continue
+
+    thread = threading.Thread(target=_accept, daemon=True)
+    thread.start()
+    yield sock.getsockname()[1]
+    stop.set()
+    thread.join()
+    sock.close()
+
+
+@pytest.fixture
+def closed_port():
+    """A port nothing is listening on."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def make_inventory(up_port, down_port, up=3, down=2):
+    hostvars = {}
+    for i in range(up):
+        hostvars[f"up{i}"] = {"ansible_host": "127.0.0.1", "ansible_port": up_port}
+    for i in range(down):
+        hostvars[f"down{i}"] = {"ansible_host": "127.0.0.1", "ansible_port": down_port}
+    return Inventory(
+        {"_meta": {"hostvars": hostvars}, "prod": {"hosts": list(hostvars)}}
+    )
+
+
+def test_probe_hosts_reports_reachability(listening_port, closed_port):
+    targets = {
+        "up": ("127.0.0.1", listening_port),
+        "down": ("127.0.0.1", closed_port),
+    }
+    results = asyncio.run(preflight.probe_hosts(targets, timeout=1.0, concurrency=1))
+    assert results == {"up": True, "down": False}
+
+
+def test_probe_host_times_out(monkeypatch):
+    async def never_connects(*args, **kwargs):  # pylint: disable=unused-argument
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(asyncio, "open_connection", never_connects)
+    assert not asyncio.run(preflight.probe_host("192.0.2.1", 22, timeout=0.05))
+
+
+def test_run_preflight_all_reachable(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port, up=5, down=0)
+    hosts = preflight.run_preflight("prod", {"timeout": 1.0}, inv=inv)
+    assert hosts is None
+
+
+def test_run_preflight_limits_to_reachable(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port)
+    hosts = preflight.run_preflight(
+        "prod", {"timeout": 1.0, "on_unreachable": "limit"}, inv=inv
+    )
+    assert hosts == ["up0", "up1", "up2"]
+
+
+def test_run_preflight_aborts_on_unreachable(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port)
+    with pytest.raises(exceptions.PreflightError, match="2 unreachable hosts"):
+        preflight.run_preflight("prod", {"timeout": 1.0}, inv=inv)
+
+
+def test_run_preflight_nothing_reachable(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port, up=0)
+    with pytest.raises(exceptions.PreflightError, match="No reachable hosts"):
+        preflight.run_preflight(
+            "prod", {"timeout": 1.0, "on_unreachable": "limit"}, inv=inv
+        )
+
+
+def test_run_preflight_rejects_unknown_action():
+    with pytest.raises(exceptions.ConfigError, match="on_unreachable"):
+        preflight.run_preflight("prod", {"on_unreachable": "ignore"})
+
+
+def test_run_preflight_skips_local_hosts(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port, up=1, down=1)
+    inv.hostvars["localhost"] = {"ansible_connection": "local"}
+    inv.groups["prod"]["hosts"].append("localhost")
+    hosts = preflight.run_preflight(
+        "prod", {"timeout": 1.0, "on_unreachable": "limit"}, inv=inv
+    )
+    assert hosts == ["up0", "localhost"]
+
+
+def test_run_preflight_falls_back_on_templated_port(listening_port, closed_port):
+    inv = make_inventory(listening_port, closed_port, up=2, down=0)
+    inv.hostvars["up1"]["ansible_port"] = "{{ ssh_port }}"
+    hosts = preflight.run_preflight(
+        "prod", {"timeout": 1.0, "port": listening_port}, inv=inv
+    )
+    assert hosts is None
@@ -0,0 +1,107 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ansible_execute import executor, resources
+
+pytestmark = pytest.mark.skipif(
+    not resources.accounting_supported(), reason="os.wait4 not available"
+)
+
+BURN_CPU = "import sys; sum(range(3_000_000)); sys.exit(int(sys.argv[1]))"
+
+
+def test_wrapper_records_rusage_of_the_child(tmp_path):
+    output = tmp_path / "usage.json"
+
+    code = resources.main(
+        ["--output", str(output), "--", sys.executable, "-c", BURN_CPU, "3"]
+    )
+
+    assert code == 3
+    usage = resources.read_usage(output)
+    assert usage.user_cpu + usage.system_cpu > 0
+    assert usage.max_rss_kb > 1000
+    assert usage.voluntary_switches + usage.involuntary_switches > 0
+
+
+def test_wrapper_reports_missing_command(tmp_path, capsys):
+    output = tmp_path / "usage.json"
+
+    assert resources.main(["--output", str(output), "--", "no-such-binary"]) == 127
+    assert "no-such-binary" in capsys.readouterr().err
+    assert resources.read_usage(output) is None
+
+
+def test_wrapper_forwards_termination_and_dies_by_the_same_signal(tmp_path):
+    output = tmp_path / "usage.json"
+    cmd = resources.wrap_command(
+        [sys.executable, "-c", "import time; time.sleep(30)"], output
+    )
+    proc = subprocess.Popen(cmd)  # pylint: disable=consider-using-with
+    deadline = 50
+    while deadline and not resources.sample_tree(proc.pid)["processes"] > 1:
+        deadline -= 1
+        time.sleep(0.1)
+
+    proc.send_signal(signal.SIGTERM)
+
+    assert proc.wait(timeout=10) == -signal.SIGTERM
+    assert resources.read_usage(output) is not None
+
+
+@pytest.mark.skipif(not resources.PROC.is_dir(), reason="no /proc")
+def test_sample_tree_sums_descendants():
+    with subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(5)"]
+    ) as child:
+        sample = resources.sample_tree(os.getpid())
+        child.kill()
+
+    assert sample["processes"] >= 2
+    assert sample["rss_kb"] > 0
+    assert resources.sample_tree(2**22 + 1) is None
+
+
+def test_merge_sums_counters_and_keeps_largest_rss():
+    first = resources.ResourceUsage(user_cpu=1.5, max_rss_kb=100, block_in=3)
+    second = resources.ResourceUsage(user_cpu=0.5, max_rss_kb=300, block_in=4)
+
+    merged = first.merge(second)
+
+    assert (merged.user_cpu, merged.max_rss_kb, merged.block_in) == (2.0, 300, 7)
+
+
+def test_run_playbook_attaches_usage_and_logs_record(fake_ansible, caplog):
+    fake_ansible.configure(sleep=0.5)
+    caplog.set_level("INFO")
+
+    result = asyncio.run(executor.run_playbook("dev", "site", sample_interval=0.1))
+
+    assert result.ok
+    assert result.usage.user_cpu + result.usage.system_cpu > 0
+    assert result.usage.samples
+    assert result.usage.peak_tree_rss_kb >= result.usage.samples[0]["rss_kb"]
+
+    finished = [r for r in caplog.records if r.getMessage() == "Playbook run finished"]
+    record = finished[-1].data
+    assert record["env"] == "dev" and record["exit_code"] == 0
+    assert record["resources"]["max_rss_kb"] == result.usage.max_rss_kb
+    json.dumps(record)
+
+
+def test_run_playbook_reports_usage_of_timed_out_run(fake_ansible):
+    fake_ansible.configure(sleep=10)
+
+    result = asyncio.run(executor.run_playbook("dev", "site", timeout=1))
+
+    assert result.timed_out
+    assert result.usage is not None
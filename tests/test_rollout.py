@@ -0,0 +1,118 @@
+# pylint: disable=missing-function-docstring
+
+import json
+
+import pytest
+
+from ansible_execute import exceptions, rollout
+
+HOSTS = [f"web{i:02d}" for i in range(40)]
+
+
+def limits(fake_ansible):
+    calls = fake_ansible.calls()
+    return [call[call.index("--limit") + 1].split(",") for call in calls]
+
+
+def settings_for(tmp_path, **rollout_settings):
+    return {"state": {"dir": str(tmp_path / "state")}, "rollout": rollout_settings}
+
+
+def test_stage_size():
+    assert rollout.stage_size(1, 40) == 1
+    assert rollout.stage_size("5%", 40) == 2
+    assert rollout.stage_size("25%", 40) == 10
+    assert rollout.stage_size("5%", 3) == 1
+    with pytest.raises(exceptions.ConfigError, match="Invalid rollout stage"):
+        rollout.stage_size("lots%", 40)
+    with pytest.raises(exceptions.ConfigError, match="Invalid rollout stage"):
+        rollout.stage_size(0, 40)
+
+
+def test_next_batch_size_adapts():
+    assert rollout.next_batch_size(10, None, 0.2) == 10
+    clean = {"hosts": ["a", "b"], "failed": [], "duration": 10.0}
+    assert rollout.next_batch_size(10, clean, 0.2) == 10
+    # Failures within threshold stop growth
+    flaky = {"hosts": HOSTS[:10], "failed": HOSTS[:1], "duration": 10.0}
+    assert rollout.next_batch_size(30, flaky, 0.2) == 5
+    # 2 hosts per second with a 4 second budget
+    assert rollout.next_batch_size(30, clean, 0.2, time_budget=40) == 8
+
+
+def test_run_rollout_canary_batches(fake_ansible, tmp_path):
+    settings = settings_for(tmp_path)
+
+    rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    assert [len(batch) for batch in limits(fake_ansible)] == [1, 2, 10, 27]
+    assert sum(limits(fake_ansible), []) == HOSTS
+    # Finished rollouts leave no state behind
+    assert not rollout.state_path(settings, "prod", "site").exists()
+
+
+def test_run_rollout_aborts_and_resumes(fake_ansible, tmp_path):
+    settings = settings_for(tmp_path)
+    fake_ansible.configure(fail_hosts=("web05",))
+
+    with pytest.raises(exceptions.RolloutError, match="1 of 10 hosts failed"):
+        rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    state_file = rollout.state_path(settings, "prod", "site")
+    state = json.loads(state_file.read_text())
+    assert len(state["completed"]) == 12
+    assert state["failed"] == ["web05"]
+
+    # Fixed: resume retries the failed host and skips completed ones
+    fake_ansible.configure()
+    rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    resumed = limits(fake_ansible)[3:]
+    assert resumed[0][0] == "web05"
+    assert sorted(sum(resumed, [])) == sorted(set(HOSTS) - set(state["completed"]))
+    assert not state_file.exists()
+
+
+def test_run_rollout_rejects_invalid_stage_before_running(fake_ansible, tmp_path):
+    settings = settings_for(tmp_path, stages=[1, "lots%"])
+
+    with pytest.raises(exceptions.ConfigError, match="Invalid rollout stage"):
+        rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    assert not fake_ansible.calls()
+
+
+def test_run_rollout_reports_failed_batch(fake_ansible, tmp_path):
+    settings = settings_for(tmp_path)
+    settings["failures"] = {"dir": str(tmp_path / "reports")}
+    fake_ansible.configure(fail_hosts=("web00",))
+
+    with pytest.raises(exceptions.RolloutError):
+        rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    (report,) = (tmp_path / "reports").iterdir()
+    assert json.loads(report.read_text())["failed_hosts"] == ["web00"]
+
+
+def test_run_rollout_tolerates_failures_within_threshold(fake_ansible, tmp_path):
+    settings = settings_for(tmp_path, max_failure_rate=0.5)
+    fake_ansible.configure(fail_hosts=("web20",))
+
+    state = rollout.run_rollout("prod", "site", HOSTS, settings)
+
+    assert state.failed == ["web20"]
+    assert len(state.completed) == 39
+    # The rollout is kept so a rerun only retries the failed host
+    assert rollout.state_path(settings, "prod", "site").exists()
+
+
+def test_rollout_state_restarts_when_hosts_change(tmp_path):
+    path = tmp_path / "state.json"
+    state = rollout.RolloutState(path, HOSTS)
+    state.record_batch(HOSTS[:5], [], 1.0)
+
+    assert rollout.RolloutState.load(path, HOSTS).remaining == HOSTS[5:]
+    assert rollout.RolloutState.load(path, HOSTS[:10]).remaining == HOSTS[:10]
+
+    path.write_text("{broken")
+    assert rollout.RolloutState.load(path, HOSTS).remaining == HOSTS
@@ -0,0 +1,103 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import json
+
+import pytest
+
+from ansible_execute import exceptions, sharding
+from ansible_execute.executor import PlaybookResult
+
+HOSTS = [f"host{i}" for i in range(10)]
+
+
+def test_partition_hosts_round_robin():
+    parts = sharding.partition_hosts(HOSTS, 3)
+    assert parts == [
+        ["host0", "host3", "host6", "host9"],
+        ["host1", "host4", "host7"],
+        ["host2", "host5", "host8"],
+    ]
+    assert sorted(sum(parts, [])) == sorted(HOSTS)
+
+
+def test_partition_hosts_caps_shards_at_host_count():
+    assert sharding.partition_hosts(["a", "b"], 8) == [["a"], ["b"]]
+    assert not sharding.partition_hosts([], 4)
+
+
+def test_merge_results():
+    def result(exit_code, started, finished, stats):
+        return PlaybookResult(
+            env="prod",
+            playbook="site",
+            command=["ansible-playbook"],
+            exit_code=exit_code,
+            started_at=started,
+            finished_at=finished,
+            duration=finished - started,
+            stats=stats,
+        )
+
+    merged = sharding.merge_results(
+        [
+            result(0, 10.0, 20.0, {"a": {"ok": 1}}),
+            result(2, 11.0, 25.0, {"b": {"failed": 1}}),
+        ]
+    )
+    assert merged.exit_code == 2
+    assert merged.started_at == 10.0
+    assert merged.finished_at == 25.0
+    assert merged.duration == 14.0
+    assert merged.stats == {"a": {"ok": 1}, "b": {"failed": 1}}
+    assert merged.failed_hosts == ["b"]
+
+
+def test_run_sharded_uses_disjoint_limits_and_dirs(fake_ansible, tmp_path):
+    fake_ansible.configure(fail_hosts=("host4",))
+    lines = []
+
+    result = asyncio.run(
+        sharding.run_sharded(
+            "prod",
+            "site",
+            HOSTS,
+            3,
+            tmp_path / "work",
+            forks=30,
+            on_output=lines.append,
+        )
+    )
+
+    calls = fake_ansible.calls()
+    limits = [call[call.index("--limit") + 1].split(",") for call in calls]
+    assert sorted(sum(limits, [])) == sorted(HOSTS)
+    assert all(call[call.index("--forks") + 1] == "10" for call in calls)
+    assert sorted(result.stats) == sorted(HOSTS)
+    assert result.failed_hosts == ["host4"]
+    assert result.exit_code == 2
+    assert any(line.startswith("[shard 2/3] ") for line in lines)
+    assert (tmp_path / "work" / "shard-2" / "facts").is_dir()
+    assert (tmp_path / "work" / "shard-0" / "tmp").is_dir()
+
+
+def test_run_sharded_writes_failure_report_per_failed_shard(fake_ansible, tmp_path):
+    fake_ansible.configure(hosts=HOSTS, fail_hosts=("host1", "host2"))
+    reports = tmp_path / "failures"
+
+    result = asyncio.run(
+        sharding.run_sharded(
+            "prod", "site", HOSTS, 3, tmp_path / "shards", failure_dir=reports
+        )
+    )
+
+    assert not result.ok
+    failed = sorted(
+        json.loads(path.read_text())["failed_hosts"][0] for path in reports.iterdir()
+    )
+    assert failed == ["host1", "host2"]
+
+
+def test_run_sharded_without_hosts_raises(tmp_path):
+    with pytest.raises(exceptions.InventoryError, match="No hosts to shard"):
+        asyncio.run(sharding.run_sharded("prod", "site", [], 2, tmp_path))
@@ -0,0 +1,121 @@
+# pylint: disable=missing-function-docstring
+
+import io
+import subprocess
+
+import pytest
+
+from ansible_execute import events, simulator
+
+
+def simulate(argv=(), **settings):
+    out = io.StringIO()
+    sleeps = []
+    code = simulator.simulate(
+        ["site.yml", *argv],
+        simulator.SimulatorSettings(**settings),
+        out,
+        sleep=sleeps.append,
+    )
+    return code, out.getvalue().splitlines(), sleeps
+
+
+def recap(lines):
+    parser = events.RecapParser()
+    for line in lines:
+        parser.feed(line)
+    return parser.stats
+
+
+def test_successful_run_prints_every_host_and_task():
+    code, lines, sleeps = simulate(hosts=12, tasks=3)
+
+    assert code == 0
+    assert lines[0].startswith("PLAY [nodes] ***")
+    assert sum(line.startswith("TASK [") for line in lines) == 4
+    stats = recap(lines)
+    assert sorted(stats) == simulator.host_names(12)
+    assert all(each["ok"] + each["changed"] == 4 for each in stats.values())
+    assert not sleeps
+
+
+def test_failures_are_deterministic_and_stop_the_host():
+    first = simulate(hosts=200, tasks=4, fail_rate=0.05, seed=7)
+    second = simulate(hosts=200, tasks=4, fail_rate=0.05, seed=7)
+
+    code, lines, _ = first
+    assert code == simulator.EXIT_FAILED
+    assert lines == second[1]
+    failed = [host for host, each in recap(lines).items() if each["failed"]]
+    assert failed
+    # A failed host gets no further results
+    for host in failed:
+        results = [line for line in lines if f"[{host}]" in line]
+        assert results[-1].startswith(f"fatal: [{host}]: FAILED!")
+
+
+def test_unreachable_hosts_exit_with_4():
+    code, lines, _ = simulate(hosts=50, unreachable_rate=0.2)
+
+    assert code == simulator.EXIT_UNREACHABLE
+    assert any("UNREACHABLE!" in line for line in lines)
+    assert any(each["unreachable"] for each in recap(lines).values())
+
+
+def test_limit_forks_latency_and_output_volume():
+    code, lines, sleeps = simulate(
+        ["--limit", "a,b,c", "--forks", "2"],
+        tasks=1,
+        latency=0.5,
+        jitter=0,
+        output_bytes=100,
+    )
+
+    assert code == 0
+    assert sorted(recap(lines)) == ["a", "b", "c"]
+    # Two tasks, each in two batches of at most two hosts
+    assert sleeps == [0.5] * 4
+    results = [line for line in lines if line.startswith(("ok:", "changed:"))]
+    assert all('"stdout": "' + "x" * 100 in line for line in results)
+
+
+def test_settings_round_trip_through_the_environment():
+    settings = simulator.SimulatorSettings(hosts=3, latency=0.25, seed=9)
+    assert simulator.SimulatorSettings.from_env(settings.as_env()) == settings
+    assert simulator.SimulatorSettings.from_env({}) == simulator.SimulatorSettings()
+
+
+def test_invalid_setting_names_the_variable():
+    with pytest.raises(ValueError, match="ANSIBLE_EXECUTE_SIM_HOSTS: 'ten'"):
+        simulator.SimulatorSettings.from_env({"ANSIBLE_EXECUTE_SIM_HOSTS": "ten"})
+
+
+def test_installed_shim_rejects_invalid_settings(tmp_path):
+    shim = simulator.install(tmp_path)
+
+    proc = subprocess.run(
+        [str(shim), "site.yml"],
+        env={"ANSIBLE_EXECUTE_SIM_LATENCY": "slow"},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert proc.returncode == simulator.EXIT_BAD_OPTIONS
+    assert proc.stderr == (
+        "ERROR! Invalid value for ANSIBLE_EXECUTE_SIM_LATENCY: 'slow' "
+        "(expected float)\n"
+    )
+
+
+def test_installed_shim_runs_the_simulator(tmp_path):
+    shim = simulator.install(tmp_path)
+    env = simulator.SimulatorSettings(hosts=2, tasks=1, fail_rate=1.0).as_env()
+
+    proc = subprocess.run(
+        [str(shim), "site.yml"], env=env, capture_output=True, text=True, check=False
+    )
+
+    assert shim.name == "ansible-playbook"
+    assert proc.returncode == simulator.EXIT_FAILED
+    assert "fatal: [sim-1]: FAILED!" in proc.stdout
@@ -150,3 +150,107 @@ def test_supported_types_roundtrip(tmp_path):
             )
             cfg = Config(config_path=config_path, schema_name="schema.yml")
             assert "val" in cfg.config_data
+
+
+OVERLAY_CONFIG = {
+    "logging": {"dir": "logs/"},
+    "execution": {"forks": 5, "timeout": 0},
+    "environments": {
+        "prod": {"execution": {"forks": 50}, "logging": {"dir": "/var/log/prod"}},
+        "dev": None,
+    },
+}
+
+
+def test_env_overlay_deep_merges_onto_base(tmp_path):
+    config_path = tmp_path / "overlay.yml"
+    config_path.write_text(yaml.dump(OVERLAY_CONFIG))
+
+    cfg = Config(config_path=config_path)
+    prod = cfg.for_env("prod")
+
+    assert prod["execution"] == {"forks": 50, "timeout": 0}
+    assert prod["logging"]["dir"] == "/var/log/prod"
+    assert "environments" not in prod
+    # Base config is left untouched
+    assert cfg.config_data["execution"]["forks"] == 5
+    # Environments without an overlay resolve to the base settings
+    assert cfg.for_env("dev")["execution"]["forks"] == 5
+    assert cfg.for_env("staging")["logging"]["dir"] == "logs/"
+
+
+def test_env_overlay_is_memoized(tmp_path):
+    config_path = tmp_path / "overlay.yml"
+    config_path.write_text(yaml.dump(OVERLAY_CONFIG))
+
+    cfg = Config(config_path=config_path)
+    with patch.object(
+        Config,
+        "validate_config_against_schema",
+        autospec=True,
+        side_effect=Config.validate_config_against_schema,
+    ) as spy:
+        first = cfg.for_env("prod")
+        second = cfg.for_env("prod")
+
+    assert first is second
+    assert spy.call_count == 3  # merged view + execution + logging children
+
+
+def test_env_overlay_wrong_type_raises(tmp_path):
+    config = {
+        "logging": {"dir": "logs/"},
+        "environments": {"prod": {"execution": {"forks": "many"}}},
+    }
+    config_path = tmp_path / "bad_overlay.yml"
+    config_path.write_text(yaml.dump(config))
+
+    with pytest.raises(
+        exceptions.ConfigError, match="'environments.prod.execution.forks'"
+    ):
+        Config(config_path=config_path)
+
+
+def test_env_overlay_unexpected_key_raises(tmp_path):
+    config = {
+        "logging": {"dir": "logs/"},
+        "environments": {"prod": {"environments": {}}},
+    }
+    config_path = tmp_path / "nested_overlay.yml"
+    config_path.write_text(yaml.dump(config))
+
+    with pytest.raises(exceptions.ConfigError, match="Unexpected key"):
+        Config(config_path=config_path)
+
+
+def test_value_outside_choices_raises(tmp_path):
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(
+        "logging:\n  dir: /tmp\npreflight:\n  on_unreachable: ignore\n"
+    )
+
+    with pytest.raises(
+        exceptions.ConfigError,
+        match="'preflight.on_unreachable' must be one of abort, limit",
+    ):
+        Config(config_path=config_path)
+
+
+def test_config_accepts_free_form_extra_vars(tmp_path):
+    """
+    Dicts without children in the schema, such as extra_vars.values, accept
+    any keys, including in environment overlays.
+    """
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(
+        "logging:\n  dir: /tmp\n"
+        "extra_vars:\n  values: {ntp: {servers: [a]}}\n"
+        "environments:\n  dev:\n    extra_vars:\n      values: {debug: true}\n"
+    )
+
+    config = Config(config_path=config_path)
+
+    assert config.for_env("dev")["extra_vars"]["values"] == {
+        "ntp": {"servers": ["a"]},
+        "debug": True,
+    }
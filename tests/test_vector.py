@@ -0,0 +1,251 @@
+# pylint: disable=missing-function-docstring
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from ansible_execute import logger as log_setup
+from ansible_execute import exceptions, vector
+
+
+class SocketServer:
+    """Stand-in for a Vector socket source that records received lines."""
+
+    def __init__(self, family=socket.AF_INET, address=("127.0.0.1", 0)):
+        self.lines = []
+        self.connections = 0
+        self._family = family
+        self._address = address
+        self._sock = None
+        self._stop = threading.Event()
+        self.start()
+
+    @property
+    def address(self):
+        if self._family == socket.AF_UNIX:
+            return f"unix:{self._address}"
+        return f"tcp://127.0.0.1:{self._address[1]}"
+
+    def start(self):
+        self._sock = socket.socket(self._family, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self._address)
+        self._address = self._sock.getsockname()
+        self._sock.listen()
+        self._sock.settimeout(0.1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            conn.settimeout(0.1)
+            buffer = b""
+            with conn:
+                while not self._stop.is_set():
+                    try:
+                        data = conn.recv(65536)
+                    except socket.timeout:
+                        continue
+                    if not data:
+                        break
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\n")
+                    self.lines.extend(json.loads(line) for line in lines)
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.lines) < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return [line["message"] for line in self.lines]
+
+
+def make_handler(address, tmp_path, **kwargs):
+    handler = vector.VectorSocketHandler(
+        address,
+        spool_dir=tmp_path / "spool",
+        flush_interval=kwargs.pop("flush_interval", 0.05),
+        **kwargs,
+    )
+    handler.setFormatter(log_setup.JSONFormatter(env="dev"))
+    return handler
+
+
+def emit(handler, *messages):
+    for message in messages:
+        handler.handle(
+            logging.LogRecord("t", logging.INFO, __file__, 1, message, None, None)
+        )
+
+
+def test_parse_address():
+    assert vector.parse_address("unix:/run/vector.sock") == (
+        socket.AF_UNIX,
+        "/run/vector.sock",
+    )
+    assert vector.parse_address("tcp://localhost:9000")[1] == ("localhost", 9000)
+    assert vector.parse_address("10.0.0.1:9000")[1] == ("10.0.0.1", 9000)
+    with pytest.raises(ValueError):
+        vector.parse_address("localhost")
+
+
+def test_handler_sends_batches_over_tcp(tmp_path):
+    server = SocketServer()
+    handler = make_handler(server.address, tmp_path, batch_size=10)
+
+    emit(handler, *(f"record {i}" for i in range(25)))
+
+    assert server.wait_for(25) == [f"record {i}" for i in range(25)]
+    assert server.lines[0]["env"] == "dev"
+    assert server.connections == 1
+    handler.close()
+    server.stop()
+
+
+def test_handler_sends_over_unix_socket(tmp_path):
+    server = SocketServer(socket.AF_UNIX, str(tmp_path / "vector.sock"))
+    handler = make_handler(server.address, tmp_path)
+
+    emit(handler, "hello")
+
+    assert server.wait_for(1) == ["hello"]
+    handler.close()
+    server.stop()
+
+
+def test_handler_spools_while_down_and_replays_in_order(tmp_path):
+    server = SocketServer()
+    address = server.address
+    server.stop()
+    handler = make_handler(address, tmp_path, max_backoff=0.1)
+
+    emit(handler, "first", "second")
+    handler.close()
+    assert list((tmp_path / "spool").glob("*.spool"))
+
+    # A new handler (e.g. the next run) replays the spool before new records
+    server.start()
+    handler = make_handler(server.address, tmp_path)
+    emit(handler, "third")
+
+    assert server.wait_for(3) == ["first", "second", "third"]
+    handler.close()
+    server.stop()
+    assert not list((tmp_path / "spool").glob("*.spool"))
+
+
+def test_handler_reconnects_after_server_restart(tmp_path):
+    server = SocketServer()
+    handler = make_handler(server.address, tmp_path, max_backoff=0.1)
+    emit(handler, "before")
+    server.wait_for(1)
+
+    server.stop()
+    emit(handler, "while down")
+    time.sleep(0.3)
+    server.start()
+    time.sleep(0.3)
+    emit(handler, "after")
+
+    messages = server.wait_for(3)
+    handler.close()
+    server.stop()
+    assert messages[0] == "before"
+    assert messages[-1] == "after"
+    assert "while down" in messages
+
+
+def test_spool_is_bounded(tmp_path):
+    spool = vector.DiskSpool(tmp_path, max_bytes=1000, segments=4)
+
+    for index in range(300):
+        spool.append([json.dumps({"n": index}).encode()])
+
+    total = sum(path.stat().st_size for path in tmp_path.glob("*.spool"))
+    assert total <= 1000
+    assert spool.dropped > 0
+    last = spool.take()[-1].read_bytes().splitlines()[-1]
+    assert json.loads(last) == {"n": 299}
+
+
+def test_spool_segments_are_replayed_once(tmp_path, monkeypatch):
+    spool = vector.DiskSpool(tmp_path, max_bytes=10000)
+    spool.append([b"mine"])
+    # A segment of another running process, and one of a process that exited
+    (tmp_path / "00000000000000000001-1.spool").write_bytes(b"theirs\n")
+    (tmp_path / "00000000000000000002-999999999.spool").write_bytes(b"orphan\n")
+    monkeypatch.setattr(vector, "_alive", lambda pid: pid in (1, os.getpid()))
+
+    taken = spool.take()
+
+    assert [path.read_bytes() for path in taken] == [b"orphan\n", b"mine\n"]
+    # Claimed segments are no longer offered to anyone else
+    assert vector.DiskSpool(tmp_path, max_bytes=10000).take() == []
+
+    spool.restore(taken[1:])
+    taken[0].unlink()
+    assert sorted(path.read_bytes() for path in tmp_path.glob("*.spool")) == [
+        b"mine\n",
+        b"theirs\n",
+    ]
+
+
+def test_claims_of_exited_processes_are_replayed(tmp_path, monkeypatch):
+    claimed = tmp_path / "00000000000000000001-7.spool.7.replay"
+    claimed.write_bytes(b"stuck\n")
+    monkeypatch.setattr(vector, "_alive", lambda pid: False)
+
+    (taken,) = vector.DiskSpool(tmp_path, max_bytes=10000).take()
+
+    assert taken.read_bytes() == b"stuck\n"
+
+
+def test_from_settings_rejects_bad_address():
+    with pytest.raises(exceptions.ConfigError, match="logging.vector.address"):
+        vector.from_settings({"address": "nowhere"})
+
+
+def test_full_queue_spills_to_spool(tmp_path):
+    handler = make_handler(
+        "tcp://127.0.0.1:9", tmp_path, queue_size=1, flush_interval=5
+    )
+
+    emit(handler, *(f"record {i}" for i in range(20)))
+
+    assert handler.spool.pending()
+    handler.close()
+
+
+def test_configure_logging_adds_vector_handler(tmp_path):
+    server = SocketServer()
+    root = logging.getLogger()
+    before = list(root.handlers)
+    try:
+        log_setup.configure_logging(
+            verbosity=1,
+            enable_console=False,
+            env="prod",
+            vector={"address": server.address, "flush_interval": 0.05},
+        )
+        logging.getLogger("t").info("shipped")
+        assert server.wait_for(1) == ["shipped"]
+    finally:
+        for handler in set(root.handlers) - set(before):
+            handler.close()
+            root.removeHandler(handler)
+        server.stop()
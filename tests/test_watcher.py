@@ -0,0 +1,169 @@
+# pylint: disable=missing-function-docstring
+
+import asyncio
+import pathlib
+
+import pytest
+
+from ansible_execute import watcher
+
+
+async def first_changes(watch, action, delay=0.2):
+    await asyncio.sleep(0.05)
+    action()
+    try:
+        return await asyncio.wait_for(watcher.debounced_changes(watch, delay), 5)
+    finally:
+        watch.close()
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watcher_reports_changed_files(tmp_path, backend):
+    (tmp_path / "roles" / "web").mkdir(parents=True)
+    target = tmp_path / "roles" / "web" / "main.yml"
+    target.write_text("- ping:\n")
+
+    async def scenario():
+        watch = watcher.create_watcher(tmp_path, backend=backend, poll_interval=0.05)
+        return await first_changes(watch, lambda: target.write_text("- debug:\n"))
+
+    assert str(target) in asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watcher_follows_new_directories_and_ignores_noise(tmp_path, backend):
+    def action():
+        new_dir = tmp_path / "roles" / "db" / "tasks"
+        new_dir.mkdir(parents=True)
+        (new_dir / ".main.yml.swp").write_text("x")
+        (new_dir / "main.yml").write_text("- ping:\n")
+
+    async def scenario():
+        watch = watcher.create_watcher(tmp_path, backend=backend, poll_interval=0.05)
+        return await first_changes(watch, action, delay=0.3)
+
+    changed = asyncio.run(scenario())
+    assert str(tmp_path / "roles" / "db" / "tasks" / "main.yml") in changed
+    assert not any(path.endswith(".swp") for path in changed)
+
+
+def test_debounce_collapses_a_burst_of_saves(tmp_path):
+    target = tmp_path / "site.yml"
+
+    async def scenario():
+        watch = watcher.PollingWatcher(tmp_path, interval=0.02)
+
+        async def burst():
+            for index in range(5):
+                target.write_text(str(index))
+                await asyncio.sleep(0.03)
+            (tmp_path / "other.yml").write_text("x")
+
+        writer = asyncio.ensure_future(burst())
+        changed = await watcher.debounced_changes(watch, 0.2)
+        await writer
+        return changed
+
+    assert asyncio.run(scenario()) == {str(target), str(tmp_path / "other.yml")}
+
+
+def test_debounce_outlasts_the_poll_interval(tmp_path):
+    target = tmp_path / "site.yml"
+
+    async def scenario():
+        # Scans are further apart than the debounce delay
+        watch = watcher.create_watcher(tmp_path, backend="poll", poll_interval=0.2)
+
+        async def burst():
+            for index in range(5):
+                target.write_text(str(index))
+                await asyncio.sleep(0.1)
+            (tmp_path / "other.yml").write_text("x")
+
+        writer = asyncio.ensure_future(burst())
+        changed = await watcher.debounced_changes(watch, 0.1)
+        await writer
+        return changed
+
+    assert asyncio.run(scenario()) == {str(target), str(tmp_path / "other.yml")}
+
+
+def test_create_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    def broken(self, root):
+        raise OSError(24, "Too many open files")
+
+    monkeypatch.setattr(watcher.InotifyWatcher, "__init__", broken)
+
+    async def scenario():
+        return watcher.create_watcher(tmp_path)
+
+    assert isinstance(asyncio.run(scenario()), watcher.PollingWatcher)
+
+
+def test_watch_and_run_cancels_in_flight_run(tmp_path):
+    events = []
+
+    async def run():
+        events.append("start")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def scenario():
+        async def edit():
+            await asyncio.sleep(0.2)
+            (tmp_path / "site.yml").write_text("x")
+
+        editor = asyncio.ensure_future(edit())
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                watcher.watch_and_run(tmp_path, run, debounce=0.1, max_runs=2), 1.5
+            )
+        await editor
+
+    asyncio.run(scenario())
+    assert events[:3] == ["start", "cancelled", "start"]
+
+
+def test_watch_and_run_reruns_after_change(tmp_path):
+    runs = []
+
+    async def run():
+        runs.append(pathlib.Path(tmp_path / "site.yml").exists())
+
+    async def scenario():
+        async def edit():
+            await asyncio.sleep(0.2)
+            (tmp_path / "site.yml").write_text("x")
+
+        editor = asyncio.ensure_future(edit())
+        await watcher.watch_and_run(tmp_path, run, debounce=0.1, max_runs=2)
+        await editor
+
+    asyncio.run(scenario())
+    assert runs == [False, True]
+
+
+def test_watch_and_run_logs_failed_run_and_keeps_watching(tmp_path, caplog):
+    runs = []
+
+    async def run():
+        runs.append(len(runs))
+        if len(runs) == 1:
+            raise RuntimeError("inventory exploded")
+
+    async def scenario():
+        async def edit():
+            await asyncio.sleep(0.2)
+            (tmp_path / "site.yml").write_text("x")
+
+        editor = asyncio.ensure_future(edit())
+        await watcher.watch_and_run(tmp_path, run, debounce=0.1, max_runs=2)
+        await editor
+
+    asyncio.run(scenario())
+    assert runs == [0, 1]
+    assert "Run failed: inventory exploded" in caplog.text
+    assert "never retrieved" not in caplog.text
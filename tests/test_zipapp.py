@@ -0,0 +1,49 @@
+# pylint: disable=missing-function-docstring
+
+import subprocess
+import sys
+import zipfile
+
+from ansible_execute import zipapp
+
+
+def test_build_produces_runnable_bytecode_only_archive(tmp_path):
+    pyz = zipapp.build(tmp_path / "ansible-execute.pyz")
+
+    names = zipfile.ZipFile(pyz).namelist()
+    assert "__main__.py" in names
+    assert "ansible_execute/main.pyc" in names
+    assert "ansible_execute/schemas/default_config.yml" in names
+    assert "yaml/__init__.pyc" in names
+    assert not [name for name in names if name.endswith(".py") and "/" in name]
+    assert "yaml/cyaml.pyc" not in names
+    assert "ansible_execute/zipapp.pyc" not in names
+
+    result = subprocess.run(
+        [sys.executable, str(pyz), "--generate-config", str(tmp_path / "c.yml")],
+        cwd=tmp_path,
+        capture_output=True,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "logging:" in (tmp_path / "c.yml").read_text()
+
+
+def test_build_is_reproducible_and_can_include_source(tmp_path):
+    first = zipapp.build(tmp_path / "a.pyz").read_bytes()
+    second = zipapp.build(tmp_path / "b.pyz").read_bytes()
+    assert first == second
+
+    with_source = zipapp.build(tmp_path / "c.pyz", include_source=True, compress=True)
+    assert "ansible_execute/main.py" in zipfile.ZipFile(with_source).namelist()
+
+
+def test_cli_builds_and_benchmarks(tmp_path, capsys):
+    pyz = tmp_path / "app.pyz"
+
+    zipapp.main(["build", "-o", str(pyz), "--python", "/usr/bin/python3"])
+    assert pyz.read_bytes().startswith(b"#!/usr/bin/python3\n")
+
+    zipapp.main(["bench", str(pyz), "--runs", "1", "--entry-point", sys.executable])
+    output = capsys.readouterr().out
+    assert "zipapp" in output and "entry_point" in output and "median" in output